@@ -0,0 +1,760 @@
+"""Micro-benchmarks for the hot paths in main.py
+
+Run with: python benchmark.py [name ...]
+"""
+import gc
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import main  # noqa: E402
+
+main.init_display()
+
+
+def _naive_pairs(bullets, enemies):
+    """Reference all-pairs bullet/enemy scan, as check_collisions used to do"""
+    hits = 0
+    n = bullets.count
+    m = enemies.count
+    targets = list(zip(enemies.x[:m].tolist(), enemies.y[:m].tolist(), enemies.radius[:m].tolist()))
+    for bx, by, br in zip(bullets.x[:n].tolist(), bullets.y[:n].tolist(), bullets.radius[:n].tolist()):
+        for ex, ey, er in targets:
+            if math.hypot(bx - ex, by - ey) < br + er:
+                hits += 1
+                break
+    return hits
+
+
+def bench_collisions(counts=(100, 250, 500, 1000, 2000, 4000), repeat=5, naive_limit=1000, density_base=250):
+    """Per-tick cost of Game.check_collisions as entity counts grow.
+
+    "screen" packs all N of each kind onto one screen, so overlapping pairs
+    (and the work they take) grow with N squared. "fixed density" spreads
+    them over a field grown with N to keep density_base per screen's worth,
+    which isolates how the broadphase itself scales.
+    """
+    print("check_collisions: N bullets + N enemies + N enemy bullets")
+    print(f"{'N':>6} {'screen ms':>10} {'us/entity':>10} {'pairs':>7} "
+          f"{'fixed ms':>9} {'us/entity':>10} {'pairs':>7} {'naive ms':>10}")
+    game = main.Game(save_path=None)
+    game.players = [main.Player(main.WIDTH // 2, main.HEIGHT - 100, 0)]
+
+    def populate(n, scale):
+        rng = random.Random(n)
+        width, height = main.WIDTH * scale, main.HEIGHT * scale
+        game.enemies.clear()
+        for _ in range(n):
+            game.enemies.spawn(0, rng.uniform(0, width), rng.uniform(0, height))
+        # Survive every hit so each tick does the same amount of work
+        game.enemies.health[:n] = 10 ** 9
+        for pool, radius, owner in ((game.bullets, main.PLAYER_BULLET_RADIUS, 0),
+                                    (game.enemy_bullets, main.ENEMY_BULLET_RADIUS, main.ENEMY_OWNER)):
+            pool.clear()
+            for _ in range(n):
+                pool.emit(rng.uniform(0, width), rng.uniform(0, height), 0, 0, 10, radius, owner)
+        game.powerups = []
+        game.particles.clear()
+        game.boss = None
+        game.players[0].health = 10 ** 9
+
+    def measure(n, scale):
+        best = float("inf")
+        for _ in range(repeat):
+            populate(n, scale)
+            start = time.perf_counter()
+            game.check_collisions()
+            best = min(best, time.perf_counter() - start)
+        populate(n, scale)
+        m = game.enemies.count
+        pairs = sum(len(targets) for _, targets in
+                    game.bullets.overlaps(game.enemies.x[:m], game.enemies.y[:m], game.enemies.radius[:m]))
+        return best, pairs
+
+    for n in counts:
+        screen, screen_pairs = measure(n, 1.0)
+        fixed, fixed_pairs = measure(n, max(1.0, math.sqrt(n / density_base)))
+        naive = "-"
+        if n <= naive_limit:
+            populate(n, 1.0)
+            start = time.perf_counter()
+            _naive_pairs(game.bullets, game.enemies)
+            naive = f"{(time.perf_counter() - start) * 1000:.3f}"
+        print(f"{n:>6} {screen * 1000:>10.3f} {screen * 1e6 / (3 * n):>10.3f} {screen_pairs:>7} "
+              f"{fixed * 1000:>9.3f} {fixed * 1e6 / (3 * n):>10.3f} {fixed_pairs:>7} {naive:>10}")
+
+
+def bench_bullet_hell(target=10000, ring=72, frames=300):
+    """Boss spiral pattern with 10k+ live enemy bullets: update, collide and draw"""
+    print(f"bullet hell: ring of {ring} per frame until {target}+ live bullets")
+    game = main.Game(save_path=None)
+    game.start_game(1)
+    game.players[0].health = 10 ** 9
+    game.players[0].shield_active = True
+    game.players[0].shield_timer = float("inf")
+    pool = game.enemy_bullets
+    origin = (main.WIDTH / 2, main.HEIGHT / 2)
+    spin = 0.0
+    while len(pool) < target:
+        spin += 0.07
+        pool.emit_many(origin[0], origin[1], [spin + i * 2 * math.pi / ring for i in range(ring)],
+                       2, 10, main.ENEMY_BULLET_RADIUS, main.ENEMY_OWNER)
+        pool.update()
+
+    timings = {"update": 0.0, "collide": 0.0, "draw": 0.0}
+    live = 0
+    for _ in range(frames):
+        spin += 0.07
+        pool.emit_many(origin[0], origin[1], [spin + i * 2 * math.pi / ring for i in range(ring)],
+                       2, 10, main.ENEMY_BULLET_RADIUS, main.ENEMY_OWNER)
+        start = time.perf_counter()
+        pool.update()
+        mid = time.perf_counter()
+        game.check_collisions()
+        end = time.perf_counter()
+        pool.draw(main.screen)
+        timings["update"] += mid - start
+        timings["collide"] += end - mid
+        timings["draw"] += time.perf_counter() - end
+        live += len(pool)
+
+    print(f"  average live bullets: {live / frames:.0f}")
+    for name, total in timings.items():
+        print(f"  {name:>8}: {total * 1000 / frames:.3f} ms/frame")
+    print(f"  {'total':>8}: {sum(timings.values()) * 1000 / frames:.3f} ms/frame "
+          f"(budget {1000 / main.FPS:.1f} ms)")
+
+
+def bench_ship_draw(frames=2000):
+    """Per-player draw cost: cached sprite blit vs immediate-mode polygons"""
+    print("player ship draw, us per player per frame")
+    surface = main.screen
+    player = main.Player(main.WIDTH // 2, main.HEIGHT // 2, 0)
+    angles = [i * 0.013 for i in range(frames)]
+
+    start = time.perf_counter()
+    for angle in angles:
+        main.draw_ship(surface, int(player.x), int(player.y), angle + math.pi / 2)
+    immediate = (time.perf_counter() - start) / frames
+
+    main.ship_sprites.rotated.clear()
+    main.ship_sprites.base = None
+    start = time.perf_counter()
+    for angle in angles:
+        player.angle = angle
+        player.draw(surface)
+    cold = (time.perf_counter() - start) / frames
+
+    start = time.perf_counter()
+    for angle in angles:
+        player.angle = angle
+        player.draw(surface)
+    warm = (time.perf_counter() - start) / frames
+
+    print(f"  immediate mode: {immediate * 1e6:8.1f}")
+    print(f"  cached (cold):  {cold * 1e6:8.1f}")
+    print(f"  cached (warm):  {warm * 1e6:8.1f}")
+
+
+def bench_replay(seed=7):
+    """Replay a recorded scripted run headless as a fixed regression workload"""
+    import simulate
+
+    game = main.Game(headless=True, record_inputs=True)
+    game.start_game(1, seed=seed)
+    controllers = [simulate.ScriptedAI(0, random.Random(seed))]
+    while game.state == "playing":
+        game.step(simulate.build_inputs(game, controllers))
+    log = main.InputLog.from_bytes(game.input_log.to_bytes())
+    expected = (game.wave, game.players[0].score, game.clock.get_ticks())
+
+    replayed = main.Game(headless=True)
+    start = time.perf_counter()
+    replayed.replay(log)
+    elapsed = time.perf_counter() - start
+    actual = (replayed.wave, replayed.players[0].score, replayed.clock.get_ticks())
+
+    print(f"replay: {len(log)} ticks in {len(log.to_bytes())} bytes, "
+          f"{len(log) / elapsed:.0f} ticks/s ({elapsed * 1000:.1f} ms)")
+    print(f"  recorded wave/score/time {expected}")
+    print(f"  replayed wave/score/time {actual} {'OK' if actual == expected else 'DIVERGED'}")
+
+
+class _ObjectParticle:
+    """Reference per-object particle, as create_explosion used to allocate"""
+    def __init__(self, x, y, color, rng):
+        self.x = x
+        self.y = y
+        angle = rng.uniform(0, math.pi * 2)
+        speed = rng.uniform(2, 8)
+        self.vx = math.cos(angle) * speed
+        self.vy = math.sin(angle) * speed
+        self.color = color
+        self.life = rng.randint(15, 30)
+        self.max_life = self.life
+        self.size = rng.randint(2, 5)
+
+    def update(self):
+        self.x += self.vx
+        self.y += self.vy
+        self.vx *= 0.95
+        self.vy *= 0.95
+        self.life -= 1
+        return self.life > 0
+
+    def draw(self, surface):
+        size = int(self.size * (self.life / self.max_life))
+        if size > 0:
+            main.pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), size)
+
+
+def _object_particles(frames, bursts, draw):
+    rng = random.Random(1)
+    particles = []
+    for frame in range(frames):
+        for _ in range(bursts):
+            for _ in range(30):
+                particles.append(_ObjectParticle(400, 300, main.RED, rng))
+        particles = [p for p in particles if p.update()]
+        if draw:
+            for particle in particles:
+                particle.draw(main.screen)
+    return frames * bursts * 30
+
+
+def _system_particles(frames, bursts, draw):
+    system = main.ParticleSystem(main.np.random.default_rng(1))
+    for frame in range(frames):
+        for _ in range(bursts):
+            system.emit(400, 300, main.RED, 30)
+        system.update()
+        if draw:
+            system.draw(main.screen)
+    return 0
+
+
+def bench_particle_churn(frames=300, bursts=40):
+    """GC collections and allocations under sustained multi-kill explosions"""
+    print(f"particles: {bursts} explosions of 30 per frame for {frames} frames (update only)")
+    print(f"{'':>8} {'ms/frame':>10} {'objects':>10} {'gen0':>6} {'gen1':>6} {'gen2':>6} {'peak KiB':>10}")
+    for name, run in (("objects", _object_particles), ("system", _system_particles)):
+        collections = [0, 0, 0]
+
+        def count(phase, info):
+            if phase == "start":
+                collections[info["generation"]] += 1
+
+        gc.collect()
+        gc.callbacks.append(count)
+        start = time.perf_counter()
+        allocated = run(frames, bursts, False)
+        elapsed = time.perf_counter() - start
+        gc.callbacks.remove(count)
+
+        tracemalloc.start()
+        run(frames, bursts, False)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"{name:>8} {elapsed * 1000 / frames:>10.3f} {allocated:>10} {collections[0]:>6} {collections[1]:>6} "
+              f"{collections[2]:>6} {peak / 1024:>10.1f}")
+
+
+def bench_explosions(chain=8, frames=30, repeat=20):
+    """Boss death plus a chain of kills: emit, then update and draw until they fade"""
+    print(f"explosions: boss death (30) + {chain} kills (15 each), us per frame over {frames} frames")
+    colors = [main.PURPLE] + [(200, 50, 80), (255, 200, 50), (150, 50, 200), (255, 150, 50)] * chain
+
+    def objects():
+        rng = random.Random(1)
+        particles = [_ObjectParticle(400, 100, main.PURPLE, rng) for _ in range(30)]
+        for i in range(chain):
+            particles += [_ObjectParticle(100 + i * 80, 300, colors[i + 1], rng) for _ in range(15)]
+        for _ in range(frames):
+            particles = [p for p in particles if p.update()]
+            for particle in particles:
+                particle.draw(main.screen)
+
+    system = main.ParticleSystem(main.np.random.default_rng(1))
+
+    def vectorized():
+        system.clear()
+        system.emit(400, 100, main.PURPLE, 30)
+        for i in range(chain):
+            system.emit(100 + i * 80, 300, colors[i + 1], 15)
+        for _ in range(frames):
+            system.update()
+            system.draw(main.screen)
+
+    for name, run in (("objects", objects), ("system", vectorized)):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            best = min(best, time.perf_counter() - start)
+        print(f"  {name:>8}: {best * 1e6 / frames:8.1f}")
+
+
+def bench_background(frames=1000):
+    """Parallax background per frame, against the full-screen copy it can't avoid"""
+    print("background: us per frame")
+    background = main.ParallaxBackground(random.Random(1)).finish()
+    start = time.perf_counter()
+    for _ in range(frames):
+        main.screen.blit(background.base, (0, 0))
+    floor = (time.perf_counter() - start) / frames
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        background.update()
+        background.draw(main.screen)
+    total = (time.perf_counter() - start) / frames
+    print(f"  nebula copy:     {floor * 1e6:8.1f}")
+    print(f"  full background: {total * 1e6:8.1f}")
+
+
+def bench_startup(repeat=5):
+    """Background startup cost: Game() to the menu, then the build without, cold and warm cache"""
+    import tempfile
+
+    def best(run):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        return min(times) * 1e3
+
+    print("startup: ms")
+    print(f"  Game() to menu:       {best(lambda: main.Game(save_path=None)):8.2f}")
+    print(f"  build, no cache:      {best(lambda: main.ParallaxBackground(random.Random(1)).finish()):8.2f}")
+    with tempfile.TemporaryDirectory() as tmp:
+        roots = iter(range(repeat))
+        cold = best(lambda: main.ParallaxBackground(random.Random(1),
+                                                    main.NebulaCache(os.path.join(tmp, str(next(roots))))).finish())
+        cache = main.NebulaCache(os.path.join(tmp, "0"))
+        warm = best(lambda: main.ParallaxBackground(random.Random(1), cache).finish())
+        background = main.ParallaxBackground(random.Random(1), cache)
+        frames = 1
+        while not background.pump():
+            frames += 1
+    print(f"  build, cold cache:    {cold:8.2f}")
+    print(f"  build, warm cache:    {warm:8.2f}")
+    print(f"  warm frames to ready: {frames:8d} at {main.BACKGROUND_BUDGET_MS} ms per frame")
+
+
+def bench_dirty_rects(frames=300):
+    """Frame cost and presented screen share, full flip vs dirty-rect renderer"""
+    print("Game.draw per state: us per frame, share of the screen presented")
+    print(f"{'':>18} {'full us':>10} {'dirty us':>10} {'dirty area':>11}")
+    games = {dirty: main.Game(seed=5, dirty_rects=dirty, save_path=None) for dirty in (False, True)}
+    for game in games.values():
+        game.background.finish()
+    for state in ("menu", "shop", "join_game", "playing"):
+        row = []
+        for dirty, game in games.items():
+            if state == "playing":
+                game.start_game(1, seed=5)
+                game.clock = main.SimClock(game.clock.get_ticks())
+                game.players[0].shield_active = True
+                game.players[0].shield_timer = float("inf")
+            game.state = state
+            inputs = main.InputState()
+            start = time.perf_counter()
+            for _ in range(frames):
+                game.clock.advance(main.TICK_MS)
+                game.run_tick(inputs)
+                game.draw()
+            row.append((time.perf_counter() - start) / frames)
+        renderer = games[True].renderer
+        area = sum(r.w * r.h for r in renderer.previous) / (main.WIDTH * main.HEIGHT)
+        print(f"{state:>18} {row[0] * 1e6:>10.1f} {row[1] * 1e6:>10.1f} {area:>10.0%}")
+
+
+def _render_hud(game):
+    """Reference HUD text that rasterizes every string each frame, as draw_hud used to"""
+    wave_text = main.font.render(f"Wave: {game.wave}", True, main.WHITE)
+    main.screen.blit(wave_text, (main.WIDTH // 2 - wave_text.get_width() // 2, 10))
+    for i, player in enumerate(game.players):
+        x = 10 + i * 200
+        y = main.HEIGHT - 60
+        main.screen.blit(main.small_font.render(f"P{i + 1}", True, main.CREAM), (x, y - 20))
+        main.screen.blit(main.small_font.render(f"Score: {player.score}", True, main.WHITE), (x, y + 20))
+
+
+def _cached_hud(game):
+    """The same HUD text through main.text_cache"""
+    main.text_cache.draw(main.screen, main.font, f"Wave: {game.wave}", main.WHITE, (main.WIDTH // 2, 10), True)
+    for i, player in enumerate(game.players):
+        x = 10 + i * 200
+        y = main.HEIGHT - 60
+        main.screen.blit(main.text_cache.render(main.small_font, f"P{i + 1}", True, main.CREAM), (x, y - 20))
+        main.text_cache.draw(main.screen, main.small_font, f"Score: {player.score}", main.WHITE, (x, y + 20))
+
+
+def bench_hud(frames=600, players=3, intervals=(1, 10, 60), repeat=5):
+    """HUD text per frame, font.render vs the text cache, as scores change every N frames (best of repeat)"""
+    game = main.Game(seed=5, save_path=None)
+    game.start_game(players, seed=5)
+    print(f"{'score changes':>14} {'font.render us':>15} {'text_cache us':>14} {'cached surfaces':>16}")
+    for interval in intervals:
+        row = []
+        for draw in (_render_hud, _cached_hud):
+            main.text_cache.surfaces.clear()
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for frame in range(frames):
+                    for i, player in enumerate(game.players):
+                        player.score = 10000 + (frame // interval) * 25 + i
+                    draw(game)
+                best = min(best, time.perf_counter() - start)
+            row.append(best / frames)
+        print(f"{'every ' + str(interval):>14} {row[0] * 1e6:>15.1f} {row[1] * 1e6:>14.1f} "
+              f"{len(main.text_cache.surfaces):>16}")
+
+
+def bench_profile(wave=15, frames=600, players=2, trace_path=None):
+    """Where a late-wave frame goes: Profiler percentiles over a scripted run"""
+    profiler = main.Profiler(trace_path=trace_path)
+    profiler.show = True
+    game = main.Game(seed=5, profiler=profiler, save_path=None)
+    game.background.finish()
+    game.start_game(players, seed=5)
+    game.clock = main.SimClock(game.clock.get_ticks())
+    game.wave = wave
+    game.start_wave()
+    for player in game.players:
+        player.shield_active = True
+        player.shield_timer = float("inf")
+    inputs = main.InputState(mouse_pos=(main.WIDTH // 2, 0), mouse_buttons=(True, False, False))
+    for _ in range(frames):
+        profiler.begin_frame()
+        game.clock.advance(main.TICK_MS)
+        game.run_tick(inputs)
+        game.draw()
+        profiler.end_frame(game.entity_counts)
+    profiler.close_trace()
+    print(f"wave {game.wave}, {frames} frames, ms per frame")
+    print(f"{'section':>18} {'p50':>7} {'p95':>7} {'p99':>7}")
+    for name, p50, p95, p99 in profiler.summary():
+        print(f"{name:>18} {p50:>7.3f} {p95:>7.3f} {p99:>7.3f}")
+    print("entities:", " ".join(f"{name}={n}" for name, n in profiler.counts.items()))
+
+
+def bench_quality(frames=300, players=2, bursts=6):
+    """Boss-fight frame cost at each fixed detail level, and how fast the scaler reacts"""
+    print("quality: boss fight with explosions, us per frame")
+    print(f"{'level':>6} {'update':>9} {'draw':>9} {'particles':>10}")
+    for level in range(len(main.QUALITY_LEVELS)):
+        game = main.Game(seed=5, quality=main.QualityScaler(level), save_path=None)
+        game.background.finish()
+        game.start_game(players, seed=5)
+        game.clock = main.SimClock(game.clock.get_ticks())
+        game.wave = 5
+        game.start_wave()
+        for player in game.players:
+            player.shield_active = True
+            player.shield_timer = float("inf")
+        rng = random.Random(level)
+        inputs = main.InputState(mouse_pos=(main.WIDTH // 2, 0), mouse_buttons=(True, False, False))
+        update = draw = 0.0
+        peak = 0
+        for _ in range(frames):
+            for _ in range(bursts):
+                game.create_explosion(rng.uniform(0, main.WIDTH), rng.uniform(0, main.HEIGHT), main.ORANGE)
+            start = time.perf_counter()
+            game.clock.advance(main.TICK_MS)
+            game.run_tick(inputs)
+            middle = time.perf_counter()
+            game.draw()
+            end = time.perf_counter()
+            update += middle - start
+            draw += end - middle
+            peak = max(peak, len(game.particles))
+        print(f"{level:>6} {update * 1e6 / frames:>9.1f} {draw * 1e6 / frames:>9.1f} {peak:>10}")
+
+    scaler = main.QualityScaler()
+    trace = [30.0] * 180 + [5.0] * 900
+    changes = []
+    for frame, work_ms in enumerate(trace):
+        if scaler.record(work_ms):
+            changes.append(f"{frame}:{scaler.level}")
+    print("  scaler on 3 s at 30 ms then 15 s at 5 ms (frame:level):", " ".join(changes))
+
+
+def _dense_scene(players, enemies=60, seed=5):
+    """A fresh seeded boss fight with a full swarm, bullets both ways and explosions going off"""
+    game = main.Game(seed=seed, save_path=None)
+    game.background.finish()
+    game.start_game(players, seed=seed)
+    game.clock = main.SimClock(game.clock.get_ticks())
+    game.wave = 5
+    game.start_wave()
+    for player in game.players:
+        player.shield_active = True
+    rng = random.Random(seed)
+    for _ in range(enemies):
+        game.enemies.spawn(rng.randrange(len(main.ENEMY_KINDS)), rng.uniform(0, main.WIDTH), rng.uniform(0, 300))
+    ring = [i * math.pi * 2 / 36 for i in range(36)]
+    for _ in range(4):
+        game.enemy_bullets.emit_many(rng.uniform(0, main.WIDTH), rng.uniform(0, 200), ring, 3, 10,
+                                     main.ENEMY_BULLET_RADIUS, main.ENEMY_OWNER)
+    for _ in range(6):
+        game.create_explosion(rng.uniform(0, main.WIDTH), rng.uniform(0, main.HEIGHT), main.ORANGE)
+    return game
+
+
+def bench_interpolation(frames=300, players=2, renders=(1, 2, 4), repeat=3):
+    """Draw cost per frame with alpha 1 vs interpolated, each run on a fresh copy of a dense scene (best of repeat)"""
+    inputs = main.InputState(mouse_pos=(main.WIDTH // 2, 0), mouse_buttons=(True, False, False))
+    game = _dense_scene(players)
+    print(f"interpolated draws ({len(game.enemies)} enemies, {len(game.enemy_bullets)} enemy bullets, "
+          f"{len(game.particles)} particles at the start): draw us per frame")
+    print(f"{'draws/tick':>11} {'alpha 1':>9} {'interp':>9} {'overhead':>9}")
+    for per_tick in renders:
+        row = [float("inf"), float("inf")]
+        for _ in range(repeat):
+            for variant, interpolate in enumerate((False, True)):
+                game = _dense_scene(players)
+                elapsed = 0.0
+                for _ in range(frames // per_tick):
+                    game.step(inputs)
+                    start = time.perf_counter()
+                    for i in range(per_tick):
+                        game.draw((i + 0.5) / per_tick if interpolate else 1.0)
+                    elapsed += time.perf_counter() - start
+                row[variant] = min(row[variant], elapsed / (frames // per_tick * per_tick))
+        print(f"{per_tick:>11} {row[0] * 1e6:>9.1f} {row[1] * 1e6:>9.1f} {row[1] / row[0] - 1:>9.0%}")
+
+
+def _naive_targets(positions, players):
+    """Reference per-enemy nearest-player search, as Enemy.update used to do"""
+    for ex, ey in positions:
+        nearest = min(players, key=lambda p: math.hypot(p.x - ex, p.y - ey))
+        dist = math.hypot(nearest.x - ex, nearest.y - ey)
+        angle = math.atan2(nearest.y - ey, nearest.x - ex)
+        math.cos(angle), math.sin(angle), dist
+
+
+def bench_targeting(counts=(10, 50, 100, 300, 1000), players=3, repeat=200):
+    """Nearest-player targeting per tick: per-enemy min()/trig vs one Targeting solve"""
+    np = main.np
+    rng = np.random.default_rng(3)
+    team = [main.Player(*main.START_POSITIONS[i], i) for i in range(players)]
+    targeting = main.Targeting()
+    print(f"{'enemies':>8} {'naive us':>10} {'solve us':>10} {'speedup':>8}")
+    for n in counts:
+        x = rng.uniform(0, main.WIDTH, n)
+        y = rng.uniform(0, main.HEIGHT, n)
+        positions = list(zip(x.tolist(), y.tolist()))
+        start = time.perf_counter()
+        for _ in range(repeat):
+            _naive_targets(positions, team)
+        naive = (time.perf_counter() - start) / repeat
+        start = time.perf_counter()
+        for _ in range(repeat):
+            targeting.solve(x, y, team)
+        solve = (time.perf_counter() - start) / repeat
+        print(f"{n:>8} {naive * 1e6:>10.1f} {solve * 1e6:>10.1f} {naive / solve:>7.1f}x")
+
+
+class _ObjectEnemy:
+    """Reference per-object enemy, as the Enemy subclasses used to run"""
+    def __init__(self, kind, x, y):
+        stats = main.ENEMY_KINDS[kind]
+        self.x, self.y = x, y
+        self.speed = stats["speed"]
+        self.radius = stats["radius"]
+        self.damage = stats["damage"]
+        self.fire_rate = stats["fire_rate"]
+        self.spin = stats["spin"]
+        self.keep_distance = stats["keep_distance"]
+        self.last_shot = 0
+        self.angle = 0
+
+    def update(self, players):
+        nearest = min(players, key=lambda p: math.hypot(p.x - self.x, p.y - self.y))
+        dist = math.hypot(nearest.x - self.x, nearest.y - self.y)
+        angle = math.atan2(nearest.y - self.y, nearest.x - self.x)
+        if not self.keep_distance:
+            self.x += math.cos(angle) * self.speed
+            self.y += math.sin(angle) * self.speed
+        else:
+            if dist < self.keep_distance - 50:
+                self.x -= math.cos(angle) * self.speed
+                self.y -= math.sin(angle) * self.speed
+            elif dist > self.keep_distance + 50:
+                self.x += math.cos(angle) * self.speed
+                self.y += math.sin(angle) * self.speed
+            self.x = max(self.radius, min(main.WIDTH - self.radius, self.x))
+            self.y = max(self.radius, min(main.HEIGHT - self.radius, self.y))
+        self.angle += self.spin
+
+    def try_shoot(self, players, pool, current_time):
+        if current_time - self.last_shot >= self.fire_rate:
+            nearest = min(players, key=lambda p: math.hypot(p.x - self.x, p.y - self.y))
+            dist = math.hypot(nearest.x - self.x, nearest.y - self.y)
+            if dist < 400:
+                self.last_shot = current_time
+                angle = math.atan2(nearest.y - self.y, nearest.x - self.x)
+                pool.emit(self.x, self.y, angle, 5, self.damage, main.ENEMY_BULLET_RADIUS, main.ENEMY_OWNER)
+
+    def draw(self, surface):
+        cx, cy = int(self.x), int(self.y)
+        for reach, color in ((self.radius, (200, 50, 80)), (self.radius - 5, (100, 30, 50))):
+            points = [(cx + math.cos(self.angle + i * math.pi / 3) * reach,
+                       cy + math.sin(self.angle + i * math.pi / 3) * reach) for i in range(6)]
+            main.pygame.draw.polygon(surface, color, points)
+        main.pygame.draw.circle(surface, (255, 50, 50), (cx, cy), 6)
+        main.pygame.draw.circle(surface, main.WHITE, (cx, cy), 3)
+
+
+def bench_swarm(counts=(50, 300, 1000), players=2, frames=60):
+    """Horde update and draw per tick: per-object enemies vs the EnemySwarm"""
+    team = [main.Player(*main.START_POSITIONS[i], i) for i in range(players)]
+    pool = main.BulletPool(main.RED, main.ORANGE, 0, -2)
+    print(f"{'enemies':>8} {'object update':>14} {'swarm update':>13} {'object draw':>12} {'swarm draw':>11}  (us)")
+    for n in counts:
+        rng = random.Random(n)
+        spawns = [(rng.choices(range(len(main.ENEMY_KINDS)), [k["weight"] for k in main.ENEMY_KINDS])[0],
+                   rng.uniform(0, main.WIDTH), rng.uniform(0, main.HEIGHT / 2)) for _ in range(n)]
+        objects = [_ObjectEnemy(*spawn) for spawn in spawns]
+        swarm = main.EnemySwarm()
+        for spawn in spawns:
+            swarm.spawn(*spawn)
+        targeting = main.Targeting()
+
+        row = []
+        for update, draw in ((lambda t: [e.update(team) or e.try_shoot(team, pool, t) for e in objects],
+                              lambda: [e.draw(main.screen) for e in objects]),
+                             (lambda t: swarm.update(team, targeting, pool, t),
+                              lambda: swarm.draw(main.screen))):
+            pool.clear()
+            start = time.perf_counter()
+            for frame in range(frames):
+                update(frame * main.TICK_MS)
+            row.append((time.perf_counter() - start) / frames)
+            start = time.perf_counter()
+            for _ in range(frames):
+                draw()
+            row.append((time.perf_counter() - start) / frames)
+        print(f"{n:>8} {row[0] * 1e6:>14.1f} {row[2] * 1e6:>13.1f} {row[1] * 1e6:>12.1f} {row[3] * 1e6:>11.1f}")
+
+
+def bench_save(saves=200):
+    """Frame-thread cost of saving: old synchronous JSON rewrite vs the SaveStore queue"""
+    import json
+    import tempfile
+
+    data = main.default_save()
+    data["high_scores"] = [{"score": 1000 * i, "wave": i, "players": 1} for i in range(main.MAX_HIGH_SCORES)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "save_2d.json")
+        start = time.perf_counter()
+        for i in range(saves):
+            data["credits"] = i
+            with open(path, "w") as f:
+                json.dump(data, f)
+        sync = (time.perf_counter() - start) / saves
+
+        store = main.SaveStore(os.path.join(tmp, "save_2d.dat"))
+        start = time.perf_counter()
+        for i in range(saves):
+            data["credits"] = i
+            store.save(data)
+        queued = (time.perf_counter() - start) / saves
+        store.close()
+        size = os.path.getsize(store.path)
+    print(f"  synchronous json: {sync * 1e6:8.1f} us per save")
+    print(f"  SaveStore.save:   {queued * 1e6:8.1f} us per save ({store.writes} writes for {saves} saves, "
+          f"{size} bytes)")
+
+
+class _PolledTimer:
+    """Reference timer checked every tick, as power-ups and boss patterns used to be"""
+    def __init__(self, at):
+        self.at = at
+        self.active = True
+
+    def update(self, now):
+        if self.active and now >= self.at:
+            self.active = False
+            return True
+        return False
+
+
+def bench_timers(counts=(10, 100, 1000, 10000), frames=600, span_ms=60000):
+    """Per-tick cost of pending timers: polling each one vs the game's Scheduler"""
+    print(f"timers: {frames} ticks, deadlines spread over {span_ms // 1000} s, us per tick")
+    print(f"{'timers':>7} {'polled':>9} {'scheduler':>10} {'fired':>6}")
+    for n in counts:
+        rng = random.Random(n)
+        deadlines = [rng.uniform(0, span_ms) for _ in range(n)]
+
+        polled = [_PolledTimer(at) for at in deadlines]
+        clock = main.SimClock()
+        start = time.perf_counter()
+        for _ in range(frames):
+            clock.advance(main.TICK_MS)
+            now = clock.get_ticks()
+            for timer in polled:
+                timer.update(now)
+        poll = (time.perf_counter() - start) / frames
+
+        fired = []
+        timers = main.Scheduler()
+        for at in deadlines:
+            timers.call_at(at, fired.append, at)
+        clock = main.SimClock()
+        start = time.perf_counter()
+        for _ in range(frames):
+            clock.advance(main.TICK_MS)
+            timers.run(clock.get_ticks())
+        heap = (time.perf_counter() - start) / frames
+        assert len(fired) == sum(not timer.active for timer in polled)
+        print(f"{n:>7} {poll * 1e6:>9.1f} {heap * 1e6:>10.2f} {len(fired):>6}")
+
+    timers = main.Scheduler()
+    fired = []
+    timers.call_at(1000, fired.append, "due")
+    timers.pause(500)
+    timers.run(1500)
+    timers.resume(2000)
+    timers.run(2400)
+    early = list(fired)
+    timers.run(2500)
+    print(f"  paused 500-2000 ms: a timer due at 1000 ms had fired {early} by 2400 and {fired} by 2500")
+
+
+BENCHMARKS = {
+    "collisions": bench_collisions,
+    "bullet_hell": bench_bullet_hell,
+    "ship_draw": bench_ship_draw,
+    "replay": bench_replay,
+    "particle_churn": bench_particle_churn,
+    "explosions": bench_explosions,
+    "background": bench_background,
+    "startup": bench_startup,
+    "dirty_rects": bench_dirty_rects,
+    "hud": bench_hud,
+    "profile": bench_profile,
+    "quality": bench_quality,
+    "interpolation": bench_interpolation,
+    "targeting": bench_targeting,
+    "swarm": bench_swarm,
+    "save": bench_save,
+    "timers": bench_timers,
+}
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+        print()
@@ -1,18 +1,72 @@
 import pygame
+import numpy as np
 import math
 import random
 import json
+import csv
+import errno
 import asyncio
+import hashlib
+import heapq
+import os
+import queue
+import re
+import selectors
 import socket
+import struct
+import sys
+import tempfile
 import threading
-
-# Initialize Pygame
-pygame.init()
+import time
+import zlib
+from collections import OrderedDict, deque
+from itertools import count, repeat
 
 # Constants
 WIDTH, HEIGHT = 800, 600
 FPS = 60
+TICK_MS = 1000 / FPS
+MAX_CATCHUP_TICKS = 5   # ticks simulated in one frame before the rest of a stall is dropped
+MAX_RENDER_FPS = 240    # draw rate cap; the simulation always ticks at FPS
 DEFAULT_PORT = 5555
+PLAYER_BULLET_RADIUS = 4
+ENEMY_BULLET_RADIUS = 5
+ENEMY_OWNER = -1
+MAX_PLAYERS = 4
+START_POSITIONS = [
+    (WIDTH // 2, HEIGHT - 100),
+    (WIDTH // 3, HEIGHT - 100),
+    (2 * WIDTH // 3, HEIGHT - 100),
+    (WIDTH // 2, HEIGHT - 150)
+]
+SNAPSHOT_INTERVAL = 2   # host ticks between snapshots
+SNAPSHOT_HISTORY = 64   # snapshots kept as delta baselines
+INTERPOLATION_DELAY_MS = 100  # how far behind the newest snapshot clients render
+MAX_INPUT_BACKLOG = 8   # queued remote inputs before the host drops the oldest
+MAX_OUTGOING_BYTES = 1 << 20  # unsent bytes queued for one peer before it is dropped as stalled
+DIRTY_FULL_FRACTION = 0.5  # dirty share of the screen past which a full flip is cheaper
+MAX_DIRTY_RECTS = 400
+PROFILE_WINDOW = 300    # frames behind the profiler's rolling percentiles
+PROFILE_REFRESH = 30    # frames between profiler overlay redraws
+QUALITY_WINDOW = 60     # frames of measured work time behind each quality decision
+QUALITY_DROP = 0.85     # p90 work time, as a share of TICK_MS, past which detail drops a level
+QUALITY_RAISE = 0.5     # p90 share below which detail may come back
+QUALITY_RAISE_WINDOWS = 3  # consecutive quiet windows before a level is raised
+BACKGROUND_BUDGET_MS = 4  # per-frame time spent building the background until it is done
+NEBULA_VARIANTS = 8     # nebula seeds in rotation, so most starts find one in the cache
+POWERUP_DURATION = 8000  # ms a collected power-up stays on
+POWERUP_LIFETIME = 10000  # ms an uncollected power-up drifts before it vanishes
+BOSS_PATTERN_MS = 5000  # ms between boss attack pattern switches
+
+SAVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "save_2d.dat")
+LEGACY_SAVE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "save_2d.json")
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache")
+ATLAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets.atlas")
+UPGRADE_STATS = ["speed", "damage", "fire_rate", "health"]
+MAX_HIGH_SCORES = 10
+
+# Stable ids for replicated entities
+entity_ids = count(1)
 
 # Colors
 BLACK = (0, 0, 0)
@@ -28,47 +82,475 @@ PINK = (255, 100, 150)
 DARK_BLUE = (10, 10, 40)
 CREAM = (255, 248, 220)
 
-# Screen setup
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("Space Shooter 2D")
+# Screen setup, deferred to init_display() so headless games never open a window
+screen = None
 clock = pygame.time.Clock()
 
-# Fonts
-font = pygame.font.Font(None, 36)
-large_font = pygame.font.Font(None, 72)
-small_font = pygame.font.Font(None, 24)
+# Fonts, loaded by init_display() along with the window
+font = None
+large_font = None
+small_font = None
+
+
+TEXT_TOKENS = re.compile(r"\d\d|\d|\D+")  # digit pairs, lone digits and the runs between them
+
+
+class TextCache:
+    """Rendered text kept by (font, text, antialias, color), least recently used evicted.
+
+    draw() splits digit runs out of the text: the words come from the
+    cache and each digit is blitted from a per-font, per-color atlas of
+    the ten digits, straight onto the target. Changing scores and counters
+    therefore never rasterize or allocate a surface, and never push static
+    labels out of the cache.
+    """
+    DIGITS = "0123456789"
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.atlases = {}
+
+    def render(self, font, text, antialias, color):
+        """Drop-in for font.render(text, antialias, color)"""
+        key = (font, text, antialias, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = self.surfaces[key] = font.render(text, antialias, color)
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def atlas(self, font, color):
+        """Strip of the ten digits and the hundred digit pairs, rendered once per font and color.
+
+        Returns (strip, cells), cells mapping each one- and two-digit string
+        to its area of the strip.
+        """
+        key = (font, color)
+        atlas = self.atlases.get(key)
+        if atlas is None:
+            digits = font.render(self.DIGITS, True, color)
+            height = digits.get_height()
+            singles = {}
+            x = 0
+            for digit in self.DIGITS:
+                width = font.size(digit)[0]
+                singles[digit] = pygame.Rect(x, 0, width, height)
+                x += width
+            runs = list(self.DIGITS) + [a + b for a in self.DIGITS for b in self.DIGITS]
+            strip = pygame.Surface((x * 21, height), pygame.SRCALPHA)
+            cells = {}
+            pieces = []
+            x = 0
+            for run in runs:
+                start = x
+                for digit in run:
+                    pieces.append((digits, (x, 0), singles[digit]))
+                    x += singles[digit].w
+                cells[run] = pygame.Rect(start, 0, x - start, height)
+            # Cells never overlap, so a max blend copies each one in exactly, alpha included
+            strip.blits([piece + (pygame.BLEND_RGBA_MAX,) for piece in pieces], False)
+            atlas = self.atlases[key] = (strip, cells)
+        return atlas
+
+    def draw(self, surface, font, text, color, pos, centered=False):
+        """Blit text at pos (or centered on pos[0]); returns the covered rect"""
+        strip, cells = self.atlas(font, color)
+        x, y = pos
+        height = strip.get_height()
+        pieces = []
+        for token in TEXT_TOKENS.findall(text):
+            area = cells.get(token)
+            if area is None:
+                piece = self.render(font, token, True, color)
+                pieces.append((piece, (x, y)))
+                x += piece.get_width()
+                height = max(height, piece.get_height())
+            else:
+                pieces.append((strip, (x, y), area))
+                x += area.w
+        width = x - pos[0]
+        if centered:
+            shift = width // 2
+            pieces = [(piece[0], (piece[1][0] - shift, y)) + piece[2:] for piece in pieces]
+            x -= shift
+        surface.blits(pieces, False)
+        return pygame.Rect(x - width, y, width, height)
 
 
-def create_nebula_background():
-    """Create a nebula-style space background"""
-    surface = pygame.Surface((WIDTH, HEIGHT))
+text_cache = TextCache()
+
+
+def init_display():
+    """Initialize pygame, open the game window and load the fonts; only needed when something is drawn"""
+    global screen, font, large_font, small_font, atlas
+    if screen is None:
+        pygame.init()
+        screen = pygame.display.set_mode((WIDTH, HEIGHT))
+        pygame.display.set_caption("Space Shooter 2D")
+        font = pygame.font.Font(None, 36)
+        large_font = pygame.font.Font(None, 72)
+        small_font = pygame.font.Font(None, 24)
+        atlas = Atlas.load()
+    return screen
+
+
+class WallClock:
+    """Game clock backed by pygame's real-time tick counter"""
+    def get_ticks(self):
+        return pygame.time.get_ticks()
+
+    def advance(self, ms):
+        pass
+
+
+class SimClock:
+    """Manually advanced game clock for headless and fixed-step simulation.
+
+    Time is kept in whole microseconds so recorded runs replay exactly.
+    """
+    def __init__(self, start=0):
+        self.micros = round(start * 1000)
+
+    def get_ticks(self):
+        return self.micros / 1000
+
+    def advance(self, ms):
+        self.micros += round(ms * 1000)
+
+
+class Scheduler:
+    """Callbacks due at game-clock times, kept in a heap.
+
+    run(now) pops and calls only the timers that have come due, so a tick
+    costs nothing for timers still waiting. Ties fire in the order they
+    were scheduled, which keeps replays exact. pause()/resume() shift every
+    pending timer by the paused time; the game has no pause state and does
+    not call them, since the clock only stops when a tick is not stepped.
+    """
+    def __init__(self):
+        self.heap = []
+        self.order = count()
+        self.offset = 0.0       # paused ms so far, subtracted from the clock
+        self.paused_at = None
+        self.now = 0.0          # clock time of the latest run(), for callbacks
+        self.live = 0           # pending timers, not counting cancelled entries
+
+    def __len__(self):
+        return self.live
+
+    def clear(self):
+        """Drop every timer and any pause, ready for a new run"""
+        self.heap = []
+        self.live = 0
+        self.offset = 0.0
+        self.paused_at = None
+
+    def call_at(self, at, callback, *args):
+        """Run callback(*args) once the clock reaches at; returns the timer for cancel()"""
+        timer = [at - self.offset, next(self.order), callback, args]
+        heapq.heappush(self.heap, timer)
+        self.live += 1
+        return timer
+
+    def cancel(self, timer):
+        """Drop a pending timer; it stays in the heap as a dead entry until its time comes"""
+        if timer is not None and timer[2] is not None:
+            timer[2] = None
+            self.live -= 1
+
+    def run(self, now):
+        """Fire every timer due by now, including ones scheduled by callbacks along the way"""
+        if self.paused_at is not None:
+            return
+        self.now = now
+        heap = self.heap
+        now -= self.offset
+        while heap and heap[0][0] <= now:
+            timer = heapq.heappop(heap)
+            callback = timer[2]
+            if callback is not None:
+                timer[2] = None     # fired; a late cancel() must not count it again
+                self.live -= 1
+                callback(*timer[3])
+
+    def pause(self, now):
+        if self.paused_at is None:
+            self.paused_at = now
+
+    def resume(self, now):
+        if self.paused_at is not None:
+            self.offset += now - self.paused_at
+            self.paused_at = None
+
+
+class KeyState:
+    """Set of held keys, indexable like pygame.key.get_pressed()"""
+    def __init__(self, pressed=()):
+        self.pressed = set(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+class InputState:
+    """Keyboard, mouse and event snapshot consumed by one game tick"""
+    def __init__(self, keys=None, mouse_pos=(0, 0), mouse_buttons=(False, False, False), events=()):
+        self.keys = keys if keys is not None else KeyState()
+        self.mouse_pos = mouse_pos
+        self.mouse_buttons = mouse_buttons
+        self.events = events
+
+    @classmethod
+    def poll(cls, events):
+        """Capture the live pygame keyboard and mouse state"""
+        return cls(pygame.key.get_pressed(), pygame.mouse.get_pos(), pygame.mouse.get_pressed(), events)
+
+
+# Keys captured by InputLog, one bit each
+LOGGED_KEYS = [
+    pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d,
+    pygame.K_i, pygame.K_k, pygame.K_j, pygame.K_l,
+    pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT,
+    pygame.K_t, pygame.K_g, pygame.K_f, pygame.K_h,
+    pygame.K_KP8, pygame.K_KP2, pygame.K_KP4, pygame.K_KP6,
+    pygame.K_SPACE, pygame.K_b,
+]
+INPUT_ESCAPE = 0x08
+
+
+def encode_inputs(inputs):
+    """Pack an InputState into (key bits, mouse x, mouse y, flags)"""
+    keys = inputs.keys
+    key_bits = 0
+    for bit, key in enumerate(LOGGED_KEYS):
+        if keys[key]:
+            key_bits |= 1 << bit
+    flags = 0
+    for bit, pressed in enumerate(inputs.mouse_buttons[:3]):
+        if pressed:
+            flags |= 1 << bit
+    for event in inputs.events:
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            flags |= INPUT_ESCAPE
+    mx = max(-32768, min(32767, int(inputs.mouse_pos[0])))
+    my = max(-32768, min(32767, int(inputs.mouse_pos[1])))
+    return key_bits, mx, my, flags
+
+
+def decode_inputs(key_bits, mx, my, flags):
+    pressed = [key for bit, key in enumerate(LOGGED_KEYS) if key_bits >> bit & 1]
+    buttons = (bool(flags & 1), bool(flags & 2), bool(flags & 4))
+    events = [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_ESCAPE)] if flags & INPUT_ESCAPE else []
+    return InputState(KeyState(pressed), (mx, my), buttons, events)
+
+
+class InputLog:
+    """Per-tick input recording of one run, replayable by Game.replay.
+
+    Each tick stores the logged keys, mouse position, button/escape
+    flags and the elapsed game time in microseconds; identical
+    consecutive ticks are run-length encoded. The header carries the
+    shop upgrade levels the run started with (version 1 logs had none).
+    """
+    MAGIC = b"SSIL"
+    VERSION = 2
+    HEADER_V1 = struct.Struct("<4sBBId")  # magic, version, players, seed, start ticks
+    HEADER = struct.Struct("<4sBBId4B")   # ... plus one level per UPGRADE_STATS entry
+    ENTRY = struct.Struct("<IhhBIH")   # keys, mouse x, mouse y, flags, elapsed us, repeat
+
+    def __init__(self, seed, num_players, start_ticks, upgrades=None):
+        self.seed = seed
+        self.num_players = num_players
+        self.start_ticks = start_ticks
+        self.upgrades = dict.fromkeys(UPGRADE_STATS, 0)
+        self.upgrades.update(upgrades or {})
+        self.entries = []
+
+    def __len__(self):
+        return sum(ticks for _, ticks in self.entries)
+
+    def append(self, inputs, elapsed_us):
+        record = encode_inputs(inputs) + (elapsed_us,)
+        last = self.entries[-1] if self.entries else None
+        if last and last[0] == record and last[1] < 0xFFFF:
+            last[1] += 1
+        else:
+            self.entries.append([record, 1])
+
+    def __iter__(self):
+        """Yield (InputState, elapsed microseconds) for every tick"""
+        for record, ticks in self.entries:
+            inputs = decode_inputs(*record[:4])
+            for _ in range(ticks):
+                yield inputs, record[4]
+
+    def to_bytes(self):
+        levels = [min(255, self.upgrades[stat]) for stat in UPGRADE_STATS]
+        parts = [self.HEADER.pack(self.MAGIC, self.VERSION, self.num_players, self.seed, self.start_ticks, *levels)]
+        parts.extend(self.ENTRY.pack(*record, ticks) for record, ticks in self.entries)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version, num_players, seed, start_ticks = cls.HEADER_V1.unpack_from(data)
+        if magic != cls.MAGIC or version not in (1, cls.VERSION):
+            raise ValueError("not a version 1-%d input log" % cls.VERSION)
+        header = cls.HEADER_V1 if version == 1 else cls.HEADER
+        levels = header.unpack_from(data)[5:]
+        log = cls(seed, num_players, start_ticks, dict(zip(UPGRADE_STATS, levels)))
+        for *record, ticks in cls.ENTRY.iter_unpack(data[header.size:]):
+            log.entries.append([tuple(record), ticks])
+        return log
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+def nebula_steps(surface, rng):
+    """Paint a nebula onto surface, yielding after each cloud so the work can be spread over frames"""
     surface.fill((5, 5, 15))
 
     # Draw nebula clouds
     for _ in range(8):
-        cx = random.randint(0, WIDTH)
-        cy = random.randint(0, HEIGHT)
+        cx = rng.randint(0, WIDTH)
+        cy = rng.randint(0, HEIGHT)
         for r in range(150, 10, -5):
             alpha = int(15 * (r / 150))
-            color = random.choice([
+            color = rng.choice([
                 (30 + alpha, 20 + alpha, 60 + alpha),
                 (20 + alpha, 30 + alpha, 50 + alpha),
                 (40 + alpha, 25 + alpha, 55 + alpha),
             ])
-            pygame.draw.circle(surface, color, (cx + random.randint(-20, 20),
-                                                cy + random.randint(-20, 20)), r)
+            pygame.draw.circle(surface, color, (cx + rng.randint(-20, 20),
+                                                cy + rng.randint(-20, 20)), r)
+        yield
 
     # Add stars
     for _ in range(150):
-        x = random.randint(0, WIDTH)
-        y = random.randint(0, HEIGHT)
-        size = random.randint(1, 2)
-        brightness = random.randint(150, 255)
+        x = rng.randint(0, WIDTH)
+        y = rng.randint(0, HEIGHT)
+        size = rng.randint(1, 2)
+        brightness = rng.randint(150, 255)
         pygame.draw.circle(surface, (brightness, brightness, brightness), (x, y), size)
+    yield
+
 
+def create_nebula_background(rng=random):
+    """Create a nebula-style space background"""
+    surface = pygame.Surface((WIDTH, HEIGHT))
+    for _ in nebula_steps(surface, rng):
+        pass
     return surface
 
 
+class NebulaCache:
+    """Generated nebulas on disk, one zlib-compressed RGB file per seed.
+
+    Files live in a directory named by a hash of nebula_steps' code and the
+    screen size, so editing the generator leaves stale images unread.
+    """
+    def __init__(self, root=CACHE_DIR):
+        code = nebula_steps.__code__
+        key = repr((code.co_code, code.co_consts, code.co_names, WIDTH, HEIGHT)).encode()
+        self.path = os.path.join(root, "nebula-" + hashlib.sha1(key).hexdigest()[:16])
+
+    def file(self, seed):
+        return os.path.join(self.path, f"{seed}.rgb.z")
+
+    def name(self, seed):
+        """Atlas entry for a nebula pre-rendered at build time"""
+        return f"{os.path.basename(self.path)}/{seed}"
+
+    def load(self, seed):
+        """Cached or bundled nebula for seed, or None on a miss"""
+        try:
+            with open(self.file(seed), "rb") as f:
+                pixels = zlib.decompress(f.read())
+            return pygame.image.frombuffer(pixels, (WIDTH, HEIGHT), "RGB")
+        except FileNotFoundError:
+            return atlas.get(self.name(seed))
+        except (OSError, zlib.error, ValueError) as e:
+            print(f"Nebula cache error: {e}")
+            return None
+
+    def store(self, seed, surface):
+        path = self.file(seed)
+        temp = path + ".tmp"
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            with open(temp, "wb") as f:
+                f.write(zlib.compress(pygame.image.tobytes(surface, "RGB"), 1))
+            os.replace(temp, path)
+        except OSError as e:
+            print(f"Nebula cache error: {e}")
+
+
+class Atlas:
+    """Sprites pre-rendered by webbuild.py and shipped in the web bundle.
+
+    A header, a JSON index of name -> (offset, width, height, format) and
+    one zlib blob of raw pixels. Trees without an atlas get an empty one
+    and render everything at run time.
+    """
+    MAGIC = b"SATL"
+    HEADER = struct.Struct("<4sI")
+
+    def __init__(self, surfaces=None):
+        self.surfaces = surfaces or {}
+
+    def get(self, name):
+        return self.surfaces.get(name)
+
+    @classmethod
+    def encode(cls, surfaces):
+        index = {}
+        pixels = bytearray()
+        for name, surface in surfaces.items():
+            fmt = "RGBA" if surface.get_flags() & pygame.SRCALPHA else "RGB"
+            index[name] = (len(pixels), surface.get_width(), surface.get_height(), fmt)
+            pixels += pygame.image.tobytes(surface, fmt)
+        header = json.dumps(index, separators=(",", ":")).encode()
+        return cls.HEADER.pack(cls.MAGIC, len(header)) + header + zlib.compress(bytes(pixels), 9)
+
+    @classmethod
+    def decode(cls, blob):
+        magic, size = cls.HEADER.unpack_from(blob)
+        if magic != cls.MAGIC:
+            raise ValueError("not a sprite atlas")
+        start = cls.HEADER.size
+        index = json.loads(blob[start:start + size])
+        pixels = memoryview(zlib.decompress(blob[start + size:]))
+        surfaces = {}
+        for name, (offset, width, height, fmt) in index.items():
+            end = offset + width * height * len(fmt)
+            surfaces[name] = pygame.image.frombuffer(pixels[offset:end], (width, height), fmt)
+        return cls(surfaces)
+
+    @classmethod
+    def load(cls, path=ATLAS_PATH):
+        try:
+            with open(path, "rb") as f:
+                return cls.decode(f.read())
+        except FileNotFoundError:
+            return cls()
+        except (OSError, struct.error, zlib.error, ValueError) as e:
+            print(f"Atlas error: {e}")
+            return cls()
+
+
+atlas = Atlas()
+
+
 def create_planet():
     """Create a planet surface"""
     size = 60
@@ -86,137 +568,680 @@ def create_planet():
     return surface
 
 
-class SpaceDebris:
-    """Colorful space debris floating in background"""
-    def __init__(self):
-        self.x = random.randint(0, WIDTH)
-        self.y = random.randint(-50, HEIGHT)
-        self.speed = random.uniform(0.3, 1.5)
-        self.size = random.randint(2, 6)
-        self.color = random.choice([
-            CYAN, PINK, YELLOW, PURPLE, ORANGE, (100, 200, 255), (255, 150, 200)
-        ])
-        self.shape = random.choice(['rect', 'diamond'])
-        self.angle = random.uniform(0, math.pi * 2)
-        self.rotation_speed = random.uniform(-0.05, 0.05)
+class ParallaxBackground:
+    """Nebula, planet, scrolling star layers and tumbling debris.
+
+    The nebula is baked once. Each star layer is baked into a surface two
+    screens tall and scrolled by blitting a window of it. Debris is one
+    Surface.blits batch of cached rotation frames. For dirty-rect
+    rendering the stars hold still in backdrop() and only debris moves.
+
+    All of it is generated by build() in small steps that pump() runs a
+    few milliseconds per frame, with a plain backdrop standing in until it
+    is done. The nebula is one of NEBULA_VARIANTS seeds, read back from
+    the NebulaCache when it has been generated before.
+    """
+    STAR_LAYERS = (0.3, 0.5, 0.7)
+    STARS = 50
+    DEBRIS = 40
+    DEBRIS_COLORS = [CYAN, PINK, YELLOW, PURPLE, ORANGE, (100, 200, 255), (255, 150, 200)]
+    DEBRIS_STEPS = 16
+
+    def __init__(self, rng=random, cache=None):
+        self.rng = rng
+        self.cache = cache
+        self.planet_pos = (WIDTH - 160, 20)
+        # Plain backdrop shown until build() has produced the real one
+        self.base = pygame.Surface((WIDTH, HEIGHT))
+        self.base.fill((5, 5, 15))
+        self.layers = []
+        self.offsets = [0.0] * len(self.STAR_LAYERS)
+        self.static = None
+        self.ready = False
+        self.steps = self.build()
+
+    def build(self):
+        """Generate every asset, yielding between pieces so pump() can spread the work over frames"""
+        rng = self.rng
+        seed = rng.randrange(NEBULA_VARIANTS)
+        base = self.cache.load(seed) if self.cache else None
+        if base is None:
+            base = pygame.Surface((WIDTH, HEIGHT))
+            yield from nebula_steps(base, random.Random(seed))
+            if self.cache:
+                self.cache.store(seed, base)
+                yield
+        if pygame.display.get_surface() is not None:
+            base = base.convert()
+
+        # The planet has no partial alpha, so a colorkeyed RLE copy blits much faster
+        planet = atlas.get("planet") or create_planet()
+        self.planet = pygame.Surface(planet.get_size())
+        self.planet.blit(planet, (0, 0))
+        self.planet.set_colorkey(BLACK, pygame.RLEACCEL)
+
+        per_layer = self.STARS // len(self.STAR_LAYERS)
+        layers = []
+        for _ in self.STAR_LAYERS:
+            layers.append(self.bake_stars(per_layer))
+            yield
+
+        # Debris: (color, size, shape) styles plus per-piece motion
+        self.styles = []
+        style_ids = []
+        for _ in range(self.DEBRIS):
+            style = (rng.choice(self.DEBRIS_COLORS), rng.randint(2, 6), rng.choice(["rect", "diamond"]))
+            if style not in self.styles:
+                self.styles.append(style)
+            style_ids.append(self.styles.index(style))
+        self.style_ids = np.array(style_ids)
+        self.spin = np.array([self.styles[i][2] == "rect" for i in style_ids])
+        self.half = np.array([self.styles[i][1] for i in style_ids])
+        self.debris_x = np.array([rng.randint(0, WIDTH) for _ in range(self.DEBRIS)], np.float64)
+        self.debris_y = np.array([rng.randint(-50, HEIGHT) for _ in range(self.DEBRIS)], np.float64)
+        self.speed = np.array([rng.uniform(0.3, 1.5) for _ in range(self.DEBRIS)])
+        self.angle = np.array([rng.uniform(0, math.pi * 2) for _ in range(self.DEBRIS)])
+        self.rotation_speed = np.array([rng.uniform(-0.05, 0.05) for _ in range(self.DEBRIS)])
+        # frames[style_id * DEBRIS_STEPS + step]
+        self.frames = []
+        for style in self.styles:
+            self.frames.extend(self.render_frame(style, step) for step in range(self.DEBRIS_STEPS))
+            yield
+
+        self.base = base
+        self.layers = layers
+        self.static = None
+        self.ready = True
+
+    def pump(self, budget_ms=BACKGROUND_BUDGET_MS):
+        """Run build() for up to budget_ms; True once the background is complete"""
+        deadline = time.perf_counter() + budget_ms / 1000
+        for _ in self.steps:
+            if time.perf_counter() >= deadline:
+                break
+        return self.ready
 
-    def update(self):
-        self.y += self.speed
-        self.angle += self.rotation_speed
-        if self.y > HEIGHT + 10:
-            self.y = -10
-            self.x = random.randint(0, WIDTH)
+    def finish(self):
+        """Build whatever is left in one go"""
+        for _ in self.steps:
+            pass
+        return self
 
-    def draw(self, surface):
-        if self.shape == 'rect':
-            # Rotated rectangle
-            points = []
-            for i in range(4):
-                a = self.angle + i * math.pi / 2
-                px = self.x + math.cos(a) * self.size
-                py = self.y + math.sin(a) * self.size
-                points.append((px, py))
-            pygame.draw.polygon(surface, self.color, points)
+    def bake_stars(self, count):
+        layer = pygame.Surface((WIDTH, HEIGHT * 2))
+        layer.set_colorkey(BLACK, pygame.RLEACCEL)
+        for _ in range(count):
+            x = self.rng.randint(0, WIDTH)
+            y = self.rng.randint(0, HEIGHT)
+            size = self.rng.randint(1, 2)
+            brightness = self.rng.randint(150, 255)
+            for copy_y in (y, y + HEIGHT):
+                pygame.draw.circle(layer, (brightness, brightness, brightness), (x, copy_y), size)
+        return layer
+
+    def render_frame(self, style, step):
+        """Debris sprite for a style at a quarter-turn rotation step"""
+        color, size, shape = style
+        sprite = pygame.Surface((size * 2 + 1, size * 2 + 1))
+        sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+        if shape == "rect":
+            # A square looks the same every quarter turn
+            base = step * (math.pi / 2) / self.DEBRIS_STEPS
+            points = [(size + math.cos(base + i * math.pi / 2) * size,
+                       size + math.sin(base + i * math.pi / 2) * size) for i in range(4)]
         else:
-            # Diamond shape
-            points = [
-                (self.x, self.y - self.size),
-                (self.x + self.size, self.y),
-                (self.x, self.y + self.size),
-                (self.x - self.size, self.y)
-            ]
-            pygame.draw.polygon(surface, self.color, points)
-
-
-class Star:
-    """Background star for parallax effect"""
-    def __init__(self):
-        self.x = random.randint(0, WIDTH)
-        self.y = random.randint(0, HEIGHT)
-        self.speed = random.uniform(0.2, 0.8)
-        self.size = random.randint(1, 2)
-        brightness = random.randint(150, 255)
-        self.color = (brightness, brightness, brightness)
+            points = [(size, 0), (size * 2, size), (size, size * 2), (0, size)]
+        pygame.draw.polygon(sprite, color, points)
+        return sprite
 
     def update(self):
-        self.y += self.speed
-        if self.y > HEIGHT:
-            self.y = 0
-            self.x = random.randint(0, WIDTH)
-
-    def draw(self, surface):
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.size)
-
-
-class Particle:
-    """Explosion particle effect"""
-    def __init__(self, x, y, color):
-        self.x = x
-        self.y = y
-        angle = random.uniform(0, math.pi * 2)
-        speed = random.uniform(2, 8)
-        self.vx = math.cos(angle) * speed
-        self.vy = math.sin(angle) * speed
-        self.color = color
-        self.life = random.randint(15, 30)
-        self.max_life = self.life
-        self.size = random.randint(2, 5)
-
-    def update(self):
-        self.x += self.vx
-        self.y += self.vy
-        self.vx *= 0.95
-        self.vy *= 0.95
-        self.life -= 1
-        return self.life > 0
-
-    def draw(self, surface):
-        alpha = int(255 * (self.life / self.max_life))
-        size = int(self.size * (self.life / self.max_life))
-        if size > 0:
-            pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), size)
-
+        if not self.ready:
+            return
+        for i, speed in enumerate(self.STAR_LAYERS):
+            self.offsets[i] = (self.offsets[i] + speed) % HEIGHT
 
-class Bullet:
-    """Player bullet"""
-    def __init__(self, x, y, angle, damage=10, speed=12, color=CYAN, owner=0):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.speed = speed
-        self.damage = damage
-        self.color = color
-        self.owner = owner
-        self.radius = 4
+        self.debris_y += self.speed
+        self.angle += self.rotation_speed
+        for i in np.flatnonzero(self.debris_y > HEIGHT + 10).tolist():
+            self.debris_y[i] = -10
+            self.debris_x[i] = self.rng.randint(0, WIDTH)
+
+    def backdrop(self):
+        """Nebula, unscrolled stars and planet flattened into one static surface"""
+        if not self.ready:
+            return self.base
+        if self.static is None:
+            self.static = self.base.copy()
+            for layer in self.layers:
+                self.static.blit(layer, (0, 0), (0, HEIGHT, WIDTH, HEIGHT))
+            self.static.blit(self.planet, self.planet_pos)
+        return self.static
+
+    def draw_debris(self, surface, dirty=None, count=None, alpha=1.0):
+        if not self.ready:
+            return
+        n = self.DEBRIS if count is None else count
+        back = 1.0 - alpha
+        quarter = math.pi / 2
+        angle = self.angle[:n] - self.rotation_speed[:n] * back
+        steps = ((angle % quarter) * (self.DEBRIS_STEPS / quarter)).astype(np.int64) % self.DEBRIS_STEPS
+        steps[~self.spin[:n]] = 0
+        frames = map(self.frames.__getitem__, (self.style_ids[:n] * self.DEBRIS_STEPS + steps).tolist())
+        xs = (self.debris_x[:n].astype(np.int64) - self.half[:n]).tolist()
+        ys = ((self.debris_y[:n] - self.speed[:n] * back).astype(np.int64) - self.half[:n]).tolist()
+        rects = surface.blits(zip(frames, zip(xs, ys)), dirty is not None)
+        if dirty is not None:
+            dirty.extend(rects)
+
+    def draw(self, surface, stars=None, debris=None, alpha=1.0):
+        """Full redraw; stars and debris cap the star layers and debris pieces drawn"""
+        surface.blit(self.base, (0, 0))
+        if not self.ready:
+            return
+        back = 1.0 - alpha
+        for layer, offset, speed in zip(self.layers[:stars], self.offsets, self.STAR_LAYERS):
+            offset = (offset - speed * back) % HEIGHT
+            surface.blit(layer, (0, 0), (0, HEIGHT - int(offset), WIDTH, HEIGHT))
+        self.draw_debris(surface, count=debris, alpha=alpha)
+        surface.blit(self.planet, self.planet_pos)
+
+
+class ParticleSystem:
+    """Explosion particles stored as parallel NumPy arrays.
+
+    Particles are drawn in one Surface.blits call from sprites cached per
+    (color, radius, alpha level), so they shrink and fade out as they die.
+    """
+    COLUMNS = ("x", "y", "vx", "vy", "life", "max_life", "size", "color")
+    DTYPES = (np.float64, np.float64, np.float64, np.float64, np.int16, np.int16, np.int16, np.int16)
+    DAMPING = 0.95
+    MAX_SIZE = 5
+    ALPHA_LEVELS = 8
+
+    def __init__(self, rng=None, capacity=512):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.count = 0
+        self.capacity = capacity
+        for name, dtype in zip(self.COLUMNS, self.DTYPES):
+            setattr(self, name, np.zeros(capacity, dtype))
+        self.palette = {}
+        self.colors = []
+        self.sprites = {}
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def _reserve(self, extra):
+        needed = self.count + extra
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            grown = np.zeros(capacity, old.dtype)
+            grown[:self.count] = old[:self.count]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def emit(self, x, y, color, count):
+        """Burst count particles outward from (x, y)"""
+        rng = self.rng
+        color = tuple(color)
+        color_index = self.palette.get(color)
+        if color_index is None:
+            color_index = self.palette[color] = len(self.colors)
+            self.colors.append(color)
+        self._reserve(count)
+        i, j = self.count, self.count + count
+        angles = rng.uniform(0, math.pi * 2, count)
+        speeds = rng.uniform(2, 8, count)
+        self.x[i:j] = x
+        self.y[i:j] = y
+        self.vx[i:j] = np.cos(angles) * speeds
+        self.vy[i:j] = np.sin(angles) * speeds
+        self.life[i:j] = self.max_life[i:j] = rng.integers(15, 31, count)
+        self.size[i:j] = rng.integers(2, self.MAX_SIZE + 1, count)
+        self.color[i:j] = color_index
+        self.count = j
 
     def update(self):
-        self.x += math.cos(self.angle) * self.speed
-        self.y += math.sin(self.angle) * self.speed
-        return 0 <= self.x <= WIDTH and 0 <= self.y <= HEIGHT
-
-    def draw(self, surface):
-        pygame.draw.circle(surface, WHITE, (int(self.x), int(self.y)), self.radius + 2)
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), self.radius)
-
-
-class EnemyBullet:
-    """Enemy bullet"""
-    def __init__(self, x, y, angle, speed=6, damage=10):
-        self.x = x
-        self.y = y
-        self.angle = angle
-        self.speed = speed
-        self.damage = damage
-        self.radius = 5
+        n = self.count
+        if not n:
+            return
+        self.x[:n] += self.vx[:n]
+        self.y[:n] += self.vy[:n]
+        self.vx[:n] *= self.DAMPING
+        self.vy[:n] *= self.DAMPING
+        life = self.life[:n]
+        life -= 1
+        keep = life > 0
+        kept = int(np.count_nonzero(keep))
+        if kept == n:
+            return
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[:kept] = column[:n][keep]
+        self.count = kept
+
+    def _sprite(self, key):
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            rest, level = divmod(key, self.ALPHA_LEVELS)
+            color_index, radius = divmod(rest, self.MAX_SIZE + 1)
+            color = self.colors[color_index]
+            sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1))
+            sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+            if level < self.ALPHA_LEVELS - 1:
+                sprite.set_alpha((level + 1) * 255 // self.ALPHA_LEVELS)
+            pygame.draw.circle(sprite, color, (radius, radius), radius)
+            self.sprites[key] = sprite
+        return sprite
+
+    def draw(self, surface, dirty=None, alpha=1.0):
+        n = self.count
+        if not n:
+            return
+        fade = self.life[:n] / self.max_life[:n]
+        radius = (self.size[:n] * fade).astype(np.int64)
+        level = np.minimum((fade * self.ALPHA_LEVELS).astype(np.int64), self.ALPHA_LEVELS - 1)
+        keys = (self.color[:n] * (self.MAX_SIZE + 1) + radius) * self.ALPHA_LEVELS + level
+        visible = radius > 0
+        if not visible.any():
+            return
+        # The last tick moved each particle by vx / DAMPING; ones emitted since haven't moved
+        back = np.where(self.life[:n][visible] < self.max_life[:n][visible], (1.0 - alpha) / self.DAMPING, 0.0)
+        xs = (self.x[:n][visible] - self.vx[:n][visible] * back - radius[visible]).astype(np.int32).tolist()
+        ys = (self.y[:n][visible] - self.vy[:n][visible] * back - radius[visible]).astype(np.int32).tolist()
+        sprites = self.sprites
+        batch = [sprites.get(key) or self._sprite(key) for key in keys[visible].tolist()]
+        rects = surface.blits(zip(batch, zip(xs, ys)), dirty is not None)
+        if dirty is not None:
+            dirty.extend(rects)
+
+
+class BulletPool:
+    """Bullets stored as parallel NumPy arrays, updated and tested in bulk"""
+    COLUMNS = ("x", "y", "vx", "vy", "damage", "radius", "owner", "eid")
+    DTYPES = (np.float64, np.float64, np.float64, np.float64, np.int32, np.int32, np.int16, np.uint32)
+    DENSE_PAIRS = 32768
+    DENSE_TARGETS = 8
+
+    def __init__(self, outer_color, inner_color, outer_pad=0, inner_pad=-2, capacity=256):
+        self.outer_color = outer_color
+        self.inner_color = inner_color
+        self.outer_pad = outer_pad
+        self.inner_pad = inner_pad
+        self.count = 0
+        self.capacity = capacity
+        self.next_eid = 1
+        for name, dtype in zip(self.COLUMNS, self.DTYPES):
+            setattr(self, name, np.zeros(capacity, dtype))
+        self.sprites = {}
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def _reserve(self, extra):
+        needed = self.count + extra
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            grown = np.zeros(capacity, old.dtype)
+            grown[:self.count] = old[:self.count]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def emit(self, x, y, angle, speed, damage, radius, owner):
+        self._reserve(1)
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.vx[i] = math.cos(angle) * speed
+        self.vy[i] = math.sin(angle) * speed
+        self.damage[i] = damage
+        self.radius[i] = radius
+        self.owner[i] = owner
+        self.eid[i] = self.next_eid
+        self.next_eid += 1
+        self.count = i + 1
+
+    def emit_many(self, x, y, angles, speed, damage, radius, owner):
+        """Emit one bullet per entry of angles from a shared origin"""
+        angles = np.asarray(angles, np.float64)
+        n = len(angles)
+        self._reserve(n)
+        i, j = self.count, self.count + n
+        self.x[i:j] = x
+        self.y[i:j] = y
+        self.vx[i:j] = np.cos(angles) * speed
+        self.vy[i:j] = np.sin(angles) * speed
+        self.damage[i:j] = damage
+        self.radius[i:j] = radius
+        self.owner[i:j] = owner
+        self.eid[i:j] = np.arange(self.next_eid, self.next_eid + n)
+        self.next_eid += n
+        self.count = j
+
+    def _compact(self, keep):
+        n = self.count
+        kept = int(np.count_nonzero(keep))
+        if kept == n:
+            return
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[:kept] = column[:n][keep]
+        self.count = kept
 
     def update(self):
-        self.x += math.cos(self.angle) * self.speed
-        self.y += math.sin(self.angle) * self.speed
-        return 0 <= self.x <= WIDTH and 0 <= self.y <= HEIGHT
+        """Move every bullet and drop the ones that left the screen"""
+        n = self.count
+        if not n:
+            return
+        x, y = self.x[:n], self.y[:n]
+        x += self.vx[:n]
+        y += self.vy[:n]
+        self._compact((x >= 0) & (x <= WIDTH) & (y >= 0) & (y <= HEIGHT))
 
-    def draw(self, surface):
-        pygame.draw.circle(surface, RED, (int(self.x), int(self.y)), self.radius)
-        pygame.draw.circle(surface, ORANGE, (int(self.x), int(self.y)), self.radius - 2)
+    def kill(self, indices):
+        if not indices:
+            return
+        keep = np.ones(self.count, bool)
+        keep[list(indices)] = False
+        self._compact(keep)
+
+    def records(self, tick, previous):
+        """Replication records by eid.
+
+        Bullets fly straight, so a bullet's record (its position at the
+        first snapshot that saw it, plus velocity) never changes and is
+        reused from previous; deltas only carry spawned and dead bullets.
+        """
+        n = self.count
+        x, y, vx, vy = self.x, self.y, self.vx, self.vy
+        radius, owner = self.radius, self.owner
+        records = {}
+        for i, eid in enumerate(self.eid[:n].tolist()):
+            record = previous.get(eid)
+            if record is None:
+                record = BULLET_RECORD.pack(eid, tick, x[i], y[i], vx[i], vy[i], radius[i], owner[i])
+            records[eid] = record
+        return records
+
+    def restore(self, records, tick):
+        """Replace the pool with replicated records fired by tick, extrapolated to it"""
+        data = np.frombuffer(b"".join(records), BULLET_RECORD_DTYPE)
+        data = data[data["tick"] <= tick]
+        n = len(data)
+        self.count = 0
+        self._reserve(n)
+        age = tick - data["tick"].astype(np.float64)
+        self.x[:n] = data["x"] + data["vx"] * age
+        self.y[:n] = data["y"] + data["vy"] * age
+        self.vx[:n] = data["vx"]
+        self.vy[:n] = data["vy"]
+        self.damage[:n] = 0
+        self.radius[:n] = data["radius"]
+        self.owner[:n] = data["owner"]
+        self.eid[:n] = data["eid"]
+        self.count = n
+
+    def overlaps(self, tx, ty, tr):
+        """Circle-test every bullet against every target at once.
+
+        Small batches use a dense bullet x target distance matrix; larger
+        ones bucket targets into a uniform grid (sorted cell keys) so only
+        bullets in the 3x3 neighbouring cells are paired with a target.
+        Returns (bullet index, overlapping target indices) for each bullet
+        touching at least one target, both in ascending order.
+        """
+        n = self.count
+        if not n or not len(tx):
+            return []
+        tx = np.asarray(tx, np.float64)
+        ty = np.asarray(ty, np.float64)
+        tr = np.asarray(tr, np.float64)
+        x, y, r = self.x[:n], self.y[:n], self.radius[:n]
+
+        if len(tx) <= self.DENSE_TARGETS or n * len(tx) <= self.DENSE_PAIRS:
+            dx = x[:, None] - tx
+            dy = y[:, None] - ty
+            reach = r[:, None] + tr
+            bi, ti = np.nonzero(dx * dx + dy * dy < reach * reach)
+        else:
+            bi, ti = self._grid_pairs(x, y, r, tx, ty, tr)
+            dx = x[bi] - tx[ti]
+            dy = y[bi] - ty[ti]
+            reach = r[bi] + tr[ti]
+            touching = dx * dx + dy * dy < reach * reach
+            bi, ti = bi[touching], ti[touching]
+            order = np.argsort(bi * len(tx) + ti)
+            bi, ti = bi[order], ti[order]
+
+        if not len(bi):
+            return []
+        # Group with plain list slices: per-group numpy views cost more than the pairs they hold
+        breaks = (np.flatnonzero(np.diff(bi)) + 1).tolist()
+        targets = ti.tolist()
+        bounds = zip([0] + breaks, breaks + [len(targets)])
+        return list(zip(bi[[0] + breaks].tolist(), [targets[a:b] for a, b in bounds]))
+
+    @staticmethod
+    def _grid_pairs(x, y, r, tx, ty, tr):
+        """Candidate (bullet, target) pairs sharing a neighbouring grid cell"""
+        # Cells at least as wide as the largest reach keep every hit within 3x3
+        cell = float(tr.max() + r.max())
+        bias = 1 << 15
+        tkeys = (np.floor(tx / cell).astype(np.int64) + bias) << 16 | (np.floor(ty / cell).astype(np.int64) + bias)
+        order = np.argsort(tkeys, kind="stable")
+        tkeys = tkeys[order]
+        bcx = np.floor(x / cell).astype(np.int64) + bias
+        bcy = np.floor(y / cell).astype(np.int64) + bias
+        bullet_ids = np.arange(len(x))
+
+        bis, tis = [], []
+        for ox in (-1, 0, 1):
+            for oy in (-1, 0, 1):
+                keys = (bcx + ox) << 16 | (bcy + oy)
+                lo = np.searchsorted(tkeys, keys, "left")
+                counts = np.searchsorted(tkeys, keys, "right") - lo
+                total = int(counts.sum())
+                if not total:
+                    continue
+                starts = np.cumsum(counts) - counts
+                offsets = np.arange(total) - np.repeat(starts, counts)
+                bis.append(np.repeat(bullet_ids, counts))
+                tis.append(order[np.repeat(lo, counts) + offsets])
+        if not bis:
+            empty = np.zeros(0, np.int64)
+            return empty, empty
+        return np.concatenate(bis), np.concatenate(tis)
+
+    def _sprite(self, radius):
+        cached = self.sprites.get(radius)
+        if cached is None:
+            outer = radius + self.outer_pad
+            inner = radius + self.inner_pad
+            size = max(outer, inner)
+            # Colorkeyed RLE sprites blit several times faster than per-pixel alpha
+            sprite = pygame.Surface((size * 2 + 1, size * 2 + 1))
+            sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+            pygame.draw.circle(sprite, self.outer_color, (size, size), outer)
+            pygame.draw.circle(sprite, self.inner_color, (size, size), inner)
+            cached = self.sprites[radius] = (sprite, size)
+        return cached
+
+    def draw(self, surface, dirty=None, alpha=1.0):
+        """Blit every bullet, alpha of the way along its last tick's flight"""
+        n = self.count
+        if not n:
+            return
+        back = 1.0 - alpha
+        xs = (self.x[:n] - self.vx[:n] * back).astype(np.int32)
+        ys = (self.y[:n] - self.vy[:n] * back).astype(np.int32)
+        radii = self.radius[:n]
+        for radius in np.unique(radii).tolist():
+            sprite, offset = self._sprite(radius)
+            mask = radii == radius
+            bx, by = xs[mask] - offset, ys[mask] - offset
+            rects = surface.blits(zip(repeat(sprite), zip(bx.tolist(), by.tolist())), dirty is not None)
+            if dirty is not None:
+                dirty.extend(rects)
+
+
+# Exact colors from the reference image
+SHIP_WHITE = (245, 245, 250)
+SHIP_GRAY1 = (220, 220, 230)  # Lightest gray
+SHIP_GRAY2 = (190, 190, 200)
+SHIP_GRAY3 = (160, 160, 175)
+SHIP_GRAY4 = (130, 130, 145)
+SHIP_GRAY5 = (100, 100, 115)  # Darkest gray
+SHIP_GOLD_BRIGHT = (230, 190, 60)
+SHIP_GOLD_MED = (200, 160, 40)
+SHIP_GOLD_DARK = (170, 130, 30)
+SHIP_BLUE_LIGHT = (100, 160, 230)
+SHIP_BLUE_MED = (60, 120, 200)
+SHIP_BLUE_DARK = (40, 90, 170)
+SHIP_RED = (200, 50, 50)
+SHIP_EXHAUST = (255, 220, 100)
+
+# Cockpit outlines as unrotated (x, y) offsets
+SHIP_COCKPIT = [(math.cos(i * math.pi * 2 / 16) * 5, -14 + math.sin(i * math.pi * 2 / 16) * 10) for i in range(16)]
+SHIP_COCKPIT_MID = [(math.cos(i * math.pi * 2 / 16) * 4, -14 + math.sin(i * math.pi * 2 / 16) * 8) for i in range(16)]
+SHIP_COCKPIT_GLASS = [(-1 + math.cos(i * math.pi * 2 / 12) * 2, -16 + math.sin(i * math.pi * 2 / 12) * 5) for i in range(12)]
+
+# Half-extent of the ship art, used to size the cached sprite
+SHIP_EXTENT = 33
+
+
+def draw_ship(surface, cx, cy, a):
+    """Draw the exact pixel-art spacecraft from reference, rotated by a"""
+    cos_a, sin_a = math.cos(a), math.sin(a)
+
+    def rp(px, py):
+        return (cx + px * cos_a - py * sin_a, cy + px * sin_a + py * cos_a)
+
+    # === MAIN FUSELAGE (center body) ===
+    # Outer white/light gray body
+    pygame.draw.polygon(surface, SHIP_GRAY1, [rp(0,-30), rp(-5,-22), rp(-6,-5), rp(-4,15), rp(0,20), rp(4,15), rp(6,-5), rp(5,-22)])
+    # Left side shading
+    pygame.draw.polygon(surface, SHIP_GRAY2, [rp(0,-30), rp(-5,-22), rp(-6,-5), rp(-4,15), rp(0,15), rp(0,-30)])
+    # Center stripe highlight
+    pygame.draw.polygon(surface, SHIP_WHITE, [rp(-1,-28), rp(-2,-5), rp(-1,12), rp(1,12), rp(2,-5), rp(1,-28)])
+
+    # === LEFT WING - Multiple layers ===
+    # Outermost wing (darkest)
+    pygame.draw.polygon(surface, SHIP_GRAY5, [rp(-6,-8), rp(-12,0), rp(-22,12), rp(-26,22), rp(-22,26), rp(-16,24), rp(-10,18), rp(-6,8)])
+    # Middle wing layer
+    pygame.draw.polygon(surface, SHIP_GRAY4, [rp(-6,-4), rp(-10,2), rp(-18,14), rp(-20,22), rp(-16,22), rp(-12,16), rp(-6,6)])
+    # Inner wing layer
+    pygame.draw.polygon(surface, SHIP_GRAY3, [rp(-5,0), rp(-8,4), rp(-14,14), rp(-14,20), rp(-10,18), rp(-6,10)])
+
+    # === RIGHT WING - Multiple layers ===
+    # Outermost wing (lighter for shading)
+    pygame.draw.polygon(surface, SHIP_GRAY3, [rp(6,-8), rp(12,0), rp(22,12), rp(26,22), rp(22,26), rp(16,24), rp(10,18), rp(6,8)])
+    # Middle wing layer
+    pygame.draw.polygon(surface, SHIP_GRAY2, [rp(6,-4), rp(10,2), rp(18,14), rp(20,22), rp(16,22), rp(12,16), rp(6,6)])
+    # Inner wing layer
+    pygame.draw.polygon(surface, SHIP_GRAY1, [rp(5,0), rp(8,4), rp(14,14), rp(14,20), rp(10,18), rp(6,10)])
+
+    # === GOLD ACCENTS ON WINGS ===
+    # Left wing gold stripe
+    pygame.draw.polygon(surface, SHIP_GOLD_DARK, [rp(-20,16), rp(-22,22), rp(-18,24), rp(-16,18)])
+    # Right wing gold stripe
+    pygame.draw.polygon(surface, SHIP_GOLD_BRIGHT, [rp(20,16), rp(22,22), rp(18,24), rp(16,18)])
+
+    # === RED ACCENT (left wing tip) ===
+    pygame.draw.polygon(surface, SHIP_RED, [rp(-24,20), rp(-26,22), rp(-24,24), rp(-22,22)])
+
+    # === SIDE ENGINE PODS (gold/yellow tubes) ===
+    # Left engine pod
+    pygame.draw.polygon(surface, SHIP_GOLD_DARK, [rp(-7,4), rp(-9,6), rp(-9,22), rp(-7,24), rp(-5,22), rp(-5,6)])
+    pygame.draw.polygon(surface, SHIP_GOLD_MED, [rp(-6,6), rp(-7,8), rp(-7,20), rp(-6,22), rp(-5,20), rp(-5,8)])
+    # Right engine pod
+    pygame.draw.polygon(surface, SHIP_GOLD_BRIGHT, [rp(7,4), rp(9,6), rp(9,22), rp(7,24), rp(5,22), rp(5,6)])
+    pygame.draw.polygon(surface, SHIP_GOLD_MED, [rp(6,6), rp(7,8), rp(7,20), rp(6,22), rp(5,20), rp(5,8)])
+
+    # === MAIN ENGINE EXHAUST (bottom center - yellow) ===
+    pygame.draw.polygon(surface, SHIP_GOLD_DARK, [rp(-4,16), rp(-4,28), rp(0,32), rp(4,28), rp(4,16)])
+    pygame.draw.polygon(surface, SHIP_GOLD_BRIGHT, [rp(-2,18), rp(-2,26), rp(0,30), rp(2,26), rp(2,18)])
+    pygame.draw.polygon(surface, SHIP_EXHAUST, [rp(-1,20), rp(0,28), rp(1,20)])
+
+    # === COCKPIT (blue oval at top) ===
+    # Cockpit base (dark blue)
+    pygame.draw.polygon(surface, SHIP_BLUE_DARK, [rp(px, py) for px, py in SHIP_COCKPIT])
+    # Cockpit mid layer
+    pygame.draw.polygon(surface, SHIP_BLUE_MED, [rp(px, py) for px, py in SHIP_COCKPIT_MID])
+    # Cockpit highlight
+    pygame.draw.polygon(surface, SHIP_BLUE_LIGHT, [rp(px, py) for px, py in SHIP_COCKPIT_GLASS])
+
+    # === DETAIL LINES ===
+    # Wing panel lines
+    pygame.draw.line(surface, SHIP_GRAY5, rp(-8,0), rp(-16,16), 1)
+    pygame.draw.line(surface, SHIP_GRAY5, rp(-10,4), rp(-18,18), 1)
+    pygame.draw.line(surface, SHIP_GRAY4, rp(8,0), rp(16,16), 1)
+    pygame.draw.line(surface, SHIP_GRAY4, rp(10,4), rp(18,18), 1)
+
+
+class ShipSpriteCache:
+    """Ship art rendered once, then rotated lazily into quantized headings"""
+    def __init__(self, steps=72, max_entries=96):
+        self.steps = steps
+        self.max_entries = max_entries
+        self.base = None
+        self.rotated = OrderedDict()
+
+    def render_base(self):
+        size = SHIP_EXTENT * 2 + 1
+        surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        draw_ship(surface, SHIP_EXTENT, SHIP_EXTENT, 0)
+        return surface
+
+    def get(self, a):
+        """Return the sprite for rotation a, rendering it on first use"""
+        step = round(a * self.steps / (math.pi * 2)) % self.steps
+        sprite = self.rotated.get(step)
+        if sprite is not None:
+            self.rotated.move_to_end(step)
+            return sprite
+
+        if self.base is None:
+            self.base = atlas.get("ship") or self.render_base()
+        # pygame rotates counter-clockwise, the ship art rotates clockwise
+        sprite = pygame.transform.rotate(self.base, -step * 360 / self.steps)
+        self.rotated[step] = sprite
+        if len(self.rotated) > self.max_entries:
+            self.rotated.popitem(last=False)
+        return sprite
+
+
+ship_sprites = ShipSpriteCache()
+
+
+def lerp_position(entity, alpha):
+    """Where entity is drawn alpha of the way from its previous tick's position to the current one"""
+    return (entity.prev_x + (entity.x - entity.prev_x) * alpha,
+            entity.prev_y + (entity.y - entity.prev_y) * alpha)
+
+
+# Player attribute each timed power-up switches on
+POWERUP_FLAGS = {
+    "shield": "shield_active",
+    "rapid_fire": "rapid_fire",
+    "spread_shot": "spread_shot",
+    "damage_boost": "damage_boost",
+}
 
 
 class Player:
@@ -224,6 +1249,8 @@ class Player:
     def __init__(self, x, y, player_num=0):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.player_num = player_num
         self.angle = -math.pi / 2
         self.speed = 5
@@ -234,6 +1261,7 @@ class Player:
         self.last_shot = 0
         self.score = 0
         self.radius = 20
+        self.eid = next(entity_ids)
 
         # Ship colors - cream/white main color
         self.colors = [CREAM, (200, 255, 200), (255, 200, 150), (200, 200, 255)]
@@ -248,6 +1276,7 @@ class Player:
         self.spread_shot_timer = 0
         self.damage_boost = False
         self.damage_boost_timer = 0
+        self.expiries = {}      # power-up flag -> its pending expiry timer
 
         # Upgrades
         self.speed_level = 0
@@ -255,7 +1284,17 @@ class Player:
         self.fire_rate_level = 0
         self.health_level = 0
 
-    def update(self, keys, mouse_pos=None, local_player_num=0):
+    def apply_upgrades(self, levels):
+        """Take shop upgrade levels (stat -> level) at the start of a run"""
+        self.speed_level = levels.get("speed", 0)
+        self.damage_level = levels.get("damage", 0)
+        self.fire_rate_level = levels.get("fire_rate", 0)
+        self.health_level = levels.get("health", 0)
+        self.max_health = 100 + self.health_level * 20
+        self.health = self.max_health
+
+    def move(self, keys, mouse_pos, local_player_num):
+        """Steer and aim from one tick of input; also used for client-side prediction"""
         dx, dy = 0, 0
         aim_dx, aim_dy = 0, 0
 
@@ -301,36 +1340,28 @@ class Player:
         if aim_dx != 0 or aim_dy != 0:
             self.angle = math.atan2(aim_dy, aim_dx)
 
-        current_time = pygame.time.get_ticks()
-        if self.shield_active and current_time > self.shield_timer:
-            self.shield_active = False
-        if self.rapid_fire and current_time > self.rapid_fire_timer:
-            self.rapid_fire = False
-        if self.spread_shot and current_time > self.spread_shot_timer:
-            self.spread_shot = False
-        if self.damage_boost and current_time > self.damage_boost_timer:
-            self.damage_boost = False
-
-    def shoot(self):
-        current_time = pygame.time.get_ticks()
+    def expire_powerup(self, flag):
+        setattr(self, flag, False)
+        del self.expiries[flag]
+
+    def shoot(self, pool, current_time):
         actual_fire_rate = self.fire_rate - self.fire_rate_level * 20
         if self.rapid_fire:
             actual_fire_rate //= 2
 
         if current_time - self.last_shot >= actual_fire_rate:
             self.last_shot = current_time
-            bullets = []
             damage = self.damage + self.damage_level * 5
             if self.damage_boost:
                 damage *= 2
 
             if self.spread_shot:
                 for offset in [-0.3, 0, 0.3]:
-                    bullets.append(Bullet(self.x, self.y, self.angle + offset, damage, 12, CYAN, self.player_num))
-            else:
-                bullets.append(Bullet(self.x, self.y, self.angle, damage, 12, CYAN, self.player_num))
-            return bullets
-        return []
+                    pool.emit(self.x, self.y, self.angle + offset, 12, damage, PLAYER_BULLET_RADIUS, self.player_num)
+                return 3
+            pool.emit(self.x, self.y, self.angle, 12, damage, PLAYER_BULLET_RADIUS, self.player_num)
+            return 1
+        return 0
 
     def take_damage(self, amount):
         if not self.shield_active:
@@ -338,275 +1369,479 @@ class Player:
             return True
         return False
 
-    def apply_powerup(self, powerup_type):
-        current_time = pygame.time.get_ticks()
-        duration = 8000
-
-        if powerup_type == "shield":
-            self.shield_active = True
-            self.shield_timer = current_time + duration
-        elif powerup_type == "rapid_fire":
-            self.rapid_fire = True
-            self.rapid_fire_timer = current_time + duration
-        elif powerup_type == "spread_shot":
-            self.spread_shot = True
-            self.spread_shot_timer = current_time + duration
-        elif powerup_type == "damage_boost":
-            self.damage_boost = True
-            self.damage_boost_timer = current_time + duration
-        elif powerup_type == "health":
+    def apply_powerup(self, powerup_type, current_time, timers):
+        """Switch a power-up on and (re)schedule its expiry on the game's timers"""
+        if powerup_type == "health":
             self.health = min(self.max_health, self.health + 30)
+            return
 
-    def draw(self, surface):
-        """Draw the exact pixel-art spacecraft from reference"""
-        cx, cy = int(self.x), int(self.y)
-
-        # Exact colors from the reference image
-        WHITE = (245, 245, 250)
-        GRAY1 = (220, 220, 230)  # Lightest gray
-        GRAY2 = (190, 190, 200)
-        GRAY3 = (160, 160, 175)
-        GRAY4 = (130, 130, 145)
-        GRAY5 = (100, 100, 115)  # Darkest gray
-        GOLD_BRIGHT = (230, 190, 60)
-        GOLD_MED = (200, 160, 40)
-        GOLD_DARK = (170, 130, 30)
-        BLUE_LIGHT = (100, 160, 230)
-        BLUE_MED = (60, 120, 200)
-        BLUE_DARK = (40, 90, 170)
-        RED = (200, 50, 50)
-
-        a = self.angle + math.pi / 2
-
-        def rp(px, py):
-            cos_a, sin_a = math.cos(a), math.sin(a)
-            return (cx + px * cos_a - py * sin_a, cy + px * sin_a + py * cos_a)
-
-        # === MAIN FUSELAGE (center body) ===
-        # Outer white/light gray body
-        pygame.draw.polygon(surface, GRAY1, [rp(0,-30), rp(-5,-22), rp(-6,-5), rp(-4,15), rp(0,20), rp(4,15), rp(6,-5), rp(5,-22)])
-        # Left side shading
-        pygame.draw.polygon(surface, GRAY2, [rp(0,-30), rp(-5,-22), rp(-6,-5), rp(-4,15), rp(0,15), rp(0,-30)])
-        # Center stripe highlight
-        pygame.draw.polygon(surface, WHITE, [rp(-1,-28), rp(-2,-5), rp(-1,12), rp(1,12), rp(2,-5), rp(1,-28)])
-
-        # === LEFT WING - Multiple layers ===
-        # Outermost wing (darkest)
-        pygame.draw.polygon(surface, GRAY5, [rp(-6,-8), rp(-12,0), rp(-22,12), rp(-26,22), rp(-22,26), rp(-16,24), rp(-10,18), rp(-6,8)])
-        # Middle wing layer
-        pygame.draw.polygon(surface, GRAY4, [rp(-6,-4), rp(-10,2), rp(-18,14), rp(-20,22), rp(-16,22), rp(-12,16), rp(-6,6)])
-        # Inner wing layer
-        pygame.draw.polygon(surface, GRAY3, [rp(-5,0), rp(-8,4), rp(-14,14), rp(-14,20), rp(-10,18), rp(-6,10)])
-
-        # === RIGHT WING - Multiple layers ===
-        # Outermost wing (lighter for shading)
-        pygame.draw.polygon(surface, GRAY3, [rp(6,-8), rp(12,0), rp(22,12), rp(26,22), rp(22,26), rp(16,24), rp(10,18), rp(6,8)])
-        # Middle wing layer
-        pygame.draw.polygon(surface, GRAY2, [rp(6,-4), rp(10,2), rp(18,14), rp(20,22), rp(16,22), rp(12,16), rp(6,6)])
-        # Inner wing layer
-        pygame.draw.polygon(surface, GRAY1, [rp(5,0), rp(8,4), rp(14,14), rp(14,20), rp(10,18), rp(6,10)])
-
-        # === GOLD ACCENTS ON WINGS ===
-        # Left wing gold stripe
-        pygame.draw.polygon(surface, GOLD_DARK, [rp(-20,16), rp(-22,22), rp(-18,24), rp(-16,18)])
-        # Right wing gold stripe
-        pygame.draw.polygon(surface, GOLD_BRIGHT, [rp(20,16), rp(22,22), rp(18,24), rp(16,18)])
-
-        # === RED ACCENT (left wing tip) ===
-        pygame.draw.polygon(surface, RED, [rp(-24,20), rp(-26,22), rp(-24,24), rp(-22,22)])
-
-        # === SIDE ENGINE PODS (gold/yellow tubes) ===
-        # Left engine pod
-        pygame.draw.polygon(surface, GOLD_DARK, [rp(-7,4), rp(-9,6), rp(-9,22), rp(-7,24), rp(-5,22), rp(-5,6)])
-        pygame.draw.polygon(surface, GOLD_MED, [rp(-6,6), rp(-7,8), rp(-7,20), rp(-6,22), rp(-5,20), rp(-5,8)])
-        # Right engine pod
-        pygame.draw.polygon(surface, GOLD_BRIGHT, [rp(7,4), rp(9,6), rp(9,22), rp(7,24), rp(5,22), rp(5,6)])
-        pygame.draw.polygon(surface, GOLD_MED, [rp(6,6), rp(7,8), rp(7,20), rp(6,22), rp(5,20), rp(5,8)])
-
-        # === MAIN ENGINE EXHAUST (bottom center - yellow) ===
-        pygame.draw.polygon(surface, GOLD_DARK, [rp(-4,16), rp(-4,28), rp(0,32), rp(4,28), rp(4,16)])
-        pygame.draw.polygon(surface, GOLD_BRIGHT, [rp(-2,18), rp(-2,26), rp(0,30), rp(2,26), rp(2,18)])
-        pygame.draw.polygon(surface, (255,220,100), [rp(-1,20), rp(0,28), rp(1,20)])
-
-        # === COCKPIT (blue oval at top) ===
-        # Cockpit base (dark blue)
-        cockpit = []
-        for i in range(16):
-            ang = i * math.pi * 2 / 16
-            cockpit.append(rp(math.cos(ang) * 5, -14 + math.sin(ang) * 10))
-        pygame.draw.polygon(surface, BLUE_DARK, cockpit)
-        # Cockpit mid layer
-        cockpit2 = []
-        for i in range(16):
-            ang = i * math.pi * 2 / 16
-            cockpit2.append(rp(math.cos(ang) * 4, -14 + math.sin(ang) * 8))
-        pygame.draw.polygon(surface, BLUE_MED, cockpit2)
-        # Cockpit highlight
-        cockpit3 = []
-        for i in range(12):
-            ang = i * math.pi * 2 / 12
-            cockpit3.append(rp(-1 + math.cos(ang) * 2, -16 + math.sin(ang) * 5))
-        pygame.draw.polygon(surface, BLUE_LIGHT, cockpit3)
-
-        # === DETAIL LINES ===
-        # Wing panel lines
-        pygame.draw.line(surface, GRAY5, rp(-8,0), rp(-16,16), 1)
-        pygame.draw.line(surface, GRAY5, rp(-10,4), rp(-18,18), 1)
-        pygame.draw.line(surface, GRAY4, rp(8,0), rp(16,16), 1)
-        pygame.draw.line(surface, GRAY4, rp(10,4), rp(18,18), 1)
+        flag = POWERUP_FLAGS[powerup_type]
+        expires = current_time + POWERUP_DURATION
+        setattr(self, flag, True)
+        setattr(self, powerup_type + "_timer", expires)
+        if flag in self.expiries:
+            timers.cancel(self.expiries[flag])
+        self.expiries[flag] = timers.call_at(expires, self.expire_powerup, flag)
+
+    def draw(self, surface, detail=True, alpha=1.0):
+        """Blit the cached spacecraft sprite for the current heading, plus power-up letters when detail is on"""
+        x, y = lerp_position(self, alpha)
+        cx, cy = int(x), int(y)
+        sprite = ship_sprites.get(self.angle + math.pi / 2)
+        surface.blit(sprite, sprite.get_rect(center=(cx, cy)))
 
         # Shield effect
         if self.shield_active:
             pygame.draw.circle(surface, (100, 200, 255), (cx, cy), 35, 3)
 
+        if not detail:
+            return pygame.Rect(cx - 36, cy - 36, 73, 73)
+
         # Power-up indicators
         indicators = []
         if self.rapid_fire: indicators.append(("R", YELLOW))
         if self.spread_shot: indicators.append(("S", PURPLE))
-        if self.damage_boost: indicators.append(("D", RED))
+        if self.damage_boost: indicators.append(("D", SHIP_RED))
         for i, (text, color) in enumerate(indicators):
-            txt = small_font.render(text, True, color)
+            txt = text_cache.render(small_font, text, True, color)
             surface.blit(txt, (cx - 10 + i * 15, cy - 40))
+        return pygame.Rect(cx - 36, cy - 41, 73, 78)
 
 
-class Enemy:
-    """Robot-style enemy"""
-    def __init__(self, x, y):
-        self.x = x
-        self.y = y
-        self.health = 30
-        self.max_health = 30
-        self.damage = 10
-        self.speed = 2
-        self.radius = 18
-        self.color = (200, 50, 80)  # Red-pink robot
-        self.points = 100
-        self.last_shot = 0
-        self.fire_rate = 2000
-        self.angle = 0
-
-    def update(self, players):
-        if not players:
-            return True
-
-        nearest = min(players, key=lambda p: math.hypot(p.x - self.x, p.y - self.y))
-        angle = math.atan2(nearest.y - self.y, nearest.x - self.x)
-        self.x += math.cos(angle) * self.speed
-        self.y += math.sin(angle) * self.speed
-        self.angle += 0.05
-        return True
-
-    def try_shoot(self, players):
-        if not players:
-            return None
-
-        current_time = pygame.time.get_ticks()
-        if current_time - self.last_shot >= self.fire_rate:
-            nearest = min(players, key=lambda p: math.hypot(p.x - self.x, p.y - self.y))
-            dist = math.hypot(nearest.x - self.x, nearest.y - self.y)
-            if dist < 400:
-                self.last_shot = current_time
-                angle = math.atan2(nearest.y - self.y, nearest.x - self.x)
-                return EnemyBullet(self.x, self.y, angle, 5, self.damage)
-        return None
-
-    def draw(self, surface):
-        cx, cy = int(self.x), int(self.y)
-
-        # Robot body - hexagonal shape
-        points = []
-        for i in range(6):
-            a = self.angle + i * math.pi / 3
-            px = cx + math.cos(a) * self.radius
-            py = cy + math.sin(a) * self.radius
-            points.append((px, py))
-        pygame.draw.polygon(surface, self.color, points)
-
-        # Inner body
-        inner_points = []
-        for i in range(6):
-            a = self.angle + i * math.pi / 3
-            px = cx + math.cos(a) * (self.radius - 5)
-            py = cy + math.sin(a) * (self.radius - 5)
-            inner_points.append((px, py))
-        pygame.draw.polygon(surface, (100, 30, 50), inner_points)
-
-        # Robot eye
-        pygame.draw.circle(surface, (255, 50, 50), (cx, cy), 6)
-        pygame.draw.circle(surface, WHITE, (cx, cy), 3)
-
-        # Health bar
-        if self.health < self.max_health:
-            bar_width = self.radius * 2
-            bar_height = 4
-            health_pct = self.health / self.max_health
-            pygame.draw.rect(surface, RED, (cx - bar_width//2, cy - self.radius - 10, bar_width, bar_height))
-            pygame.draw.rect(surface, GREEN, (cx - bar_width//2, cy - self.radius - 10, bar_width * health_pct, bar_height))
-
-
-class FastEnemy(Enemy):
-    def __init__(self, x, y):
-        super().__init__(x, y)
-        self.health = 20
-        self.max_health = 20
-        self.speed = 4
-        self.radius = 14
-        self.color = (255, 200, 50)  # Yellow
-        self.points = 75
-        self.fire_rate = 3000
-
-
-class HeavyEnemy(Enemy):
-    def __init__(self, x, y):
-        super().__init__(x, y)
-        self.health = 80
-        self.max_health = 80
-        self.speed = 1
-        self.radius = 28
-        self.color = (150, 50, 200)  # Purple
-        self.points = 200
-        self.damage = 20
-        self.fire_rate = 1500
-
-
-class SniperEnemy(Enemy):
-    def __init__(self, x, y):
-        super().__init__(x, y)
-        self.health = 25
-        self.max_health = 25
-        self.speed = 1.5
-        self.radius = 16
-        self.color = (255, 150, 50)  # Orange
-        self.points = 150
-        self.fire_rate = 1200
-        self.preferred_distance = 300
-
-    def update(self, players):
-        if not players:
-            return True
-
-        nearest = min(players, key=lambda p: math.hypot(p.x - self.x, p.y - self.y))
-        dist = math.hypot(nearest.x - self.x, nearest.y - self.y)
-        angle = math.atan2(nearest.y - self.y, nearest.x - self.x)
+class Targeting:
+    """Nearest living player for every enemy, solved once per tick.
 
-        if dist < self.preferred_distance - 50:
-            self.x -= math.cos(angle) * self.speed
-            self.y -= math.sin(angle) * self.speed
-        elif dist > self.preferred_distance + 50:
-            self.x += math.cos(angle) * self.speed
-            self.y += math.sin(angle) * self.speed
+    solve() takes the enemy positions as arrays and finds, in a handful of
+    NumPy ops over an enemies x players distance matrix, each enemy's
+    nearest player (an index into players), the distance to it and the
+    unit vector towards it.
+    """
+    def __init__(self):
+        self.players = []
+        self.nearest = np.zeros(0, np.intp)
+        self.dist = np.zeros(0)
+        self.dir_x = np.zeros(0)
+        self.dir_y = np.zeros(0)
+
+    def solve(self, x, y, players):
+        n = len(x)
+        self.players = players
+        if not players or not n:
+            self.nearest = np.zeros(n, np.intp)
+            self.dist = np.zeros(n)
+            self.dir_x = np.zeros(n)
+            self.dir_y = np.zeros(n)
+            return
 
-        self.x = max(self.radius, min(WIDTH - self.radius, self.x))
-        self.y = max(self.radius, min(HEIGHT - self.radius, self.y))
-        self.angle += 0.08
-        return True
+        dx = np.array([p.x for p in players], float) - x[:, None]
+        dy = np.array([p.y for p in players], float) - y[:, None]
+        dist_sq = dx * dx + dy * dy
+        nearest = dist_sq.argmin(axis=1)
+        rows = np.arange(n)
+        dx = dx[rows, nearest]
+        dy = dy[rows, nearest]
+        dist = np.sqrt(dist_sq[rows, nearest])
+
+        # Standing on the player keeps atan2(0, 0)'s heading: straight along +x
+        moving = dist > 0
+        safe = np.where(moving, dist, 1.0)
+        self.nearest = nearest
+        self.dist = dist
+        self.dir_x = np.where(moving, dx / safe, 1.0)
+        self.dir_y = np.where(moving, dy / safe, 0.0)
+
+
+# Enemy kinds, indexed by EnemySwarm.kind; keep_distance 0 means chase
+ENEMY_KINDS = [
+    {"name": "robot", "health": 30, "speed": 2, "radius": 18, "color": (200, 50, 80),  # Red-pink robot
+     "points": 100, "damage": 10, "fire_rate": 2000, "spin": 0.05, "keep_distance": 0, "weight": 40},
+    {"name": "fast", "health": 20, "speed": 4, "radius": 14, "color": (255, 200, 50),  # Yellow
+     "points": 75, "damage": 10, "fire_rate": 3000, "spin": 0.05, "keep_distance": 0, "weight": 30},
+    {"name": "heavy", "health": 80, "speed": 1, "radius": 28, "color": (150, 50, 200),  # Purple
+     "points": 200, "damage": 20, "fire_rate": 1500, "spin": 0.05, "keep_distance": 0, "weight": 15},
+    {"name": "sniper", "health": 25, "speed": 1.5, "radius": 16, "color": (255, 150, 50),  # Orange
+     "points": 150, "damage": 10, "fire_rate": 1200, "spin": 0.08, "keep_distance": 300, "weight": 15},
+]
+ENEMY_FIRE_RANGE = 400
+ENEMY_KEEP_SLACK = 50   # snipers hold still within this of their preferred distance
+HEX_STEPS = 30          # cached enemy sprite rotations per sixth of a turn
+
+
+def enemy_kind_column(key, dtype=np.float64):
+    return np.array([kind[key] for kind in ENEMY_KINDS], dtype)
+
+
+class EnemySwarm:
+    """All non-boss enemies as parallel NumPy arrays, steered and fired in bulk.
+
+    Per-kind stats come from ENEMY_KINDS; the per-enemy columns hold what
+    changes or is read every tick. Chasers fly at their nearest player,
+    kinds with a keep_distance back off or close in to hold it and stay
+    on screen, and every enemy fires at its target once its fire rate
+    allows and the target is in range.
+    """
+    COLUMNS = ("kind", "x", "y", "prev_x", "prev_y", "health", "speed", "radius", "fire_rate", "last_shot",
+               "angle", "eid")
+    DTYPES = (np.int8, np.float64, np.float64, np.float64, np.float64, np.int32, np.float64, np.int32,
+              np.float64, np.float64, np.float64, np.uint32)
+    MAX_HEALTH = enemy_kind_column("health", np.int32)
+    SPEED = enemy_kind_column("speed")
+    RADIUS = enemy_kind_column("radius", np.int32)
+    FIRE_RATE = enemy_kind_column("fire_rate")
+    POINTS = enemy_kind_column("points", np.int32)
+    DAMAGE = enemy_kind_column("damage", np.int32)
+    SPIN = enemy_kind_column("spin")
+    KEEP_DISTANCE = enemy_kind_column("keep_distance")
+
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.capacity = capacity
+        for name, dtype in zip(self.COLUMNS, self.DTYPES):
+            setattr(self, name, np.zeros(capacity, dtype))
+        self.sprites = {}
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def _reserve(self, extra):
+        needed = self.count + extra
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            grown = np.zeros(capacity, old.dtype)
+            grown[:self.count] = old[:self.count]
+            setattr(self, name, grown)
+        self.capacity = capacity
+
+    def spawn(self, kind, x, y):
+        stats = ENEMY_KINDS[kind]
+        self._reserve(1)
+        i = self.count
+        self.kind[i] = kind
+        self.x[i] = self.prev_x[i] = x
+        self.y[i] = self.prev_y[i] = y
+        self.health[i] = stats["health"]
+        self.speed[i] = stats["speed"]
+        self.radius[i] = stats["radius"]
+        self.fire_rate[i] = stats["fire_rate"]
+        self.last_shot[i] = 0
+        self.angle[i] = 0
+        self.eid[i] = next(entity_ids)
+        self.count = i + 1
+        return i
+
+    def kill(self, indices):
+        if not indices:
+            return
+        n = self.count
+        keep = np.ones(n, bool)
+        keep[list(indices)] = False
+        kept = int(np.count_nonzero(keep))
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[:kept] = column[:n][keep]
+        self.count = kept
+
+    def update(self, players, targeting, pool, current_time):
+        """Steer every enemy towards (or away from) its nearest player, then fire"""
+        n = self.count
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        if not n or not players:
+            return
+        x, y = self.x[:n], self.y[:n]
+        targeting.solve(x, y, players)
+        kind = self.kind[:n]
+
+        step = self.speed[:n].copy()
+        keep = self.KEEP_DISTANCE[kind]
+        keepers = keep > 0
+        if keepers.any():
+            dist = targeting.dist[keepers]
+            held = keep[keepers]
+            step[keepers] *= np.where(dist < held - ENEMY_KEEP_SLACK, -1.0,
+                                      np.where(dist > held + ENEMY_KEEP_SLACK, 1.0, 0.0))
+        x += targeting.dir_x * step
+        y += targeting.dir_y * step
+        if keepers.any():
+            radius = self.radius[:n][keepers]
+            x[keepers] = np.clip(x[keepers], radius, WIDTH - radius)
+            y[keepers] = np.clip(y[keepers], radius, HEIGHT - radius)
+        self.angle[:n] += self.SPIN[kind]
+
+        # Only the few enemies off cooldown measure their shot, in spawn order
+        ready = np.flatnonzero(current_time - self.last_shot[:n] >= self.fire_rate[:n])
+        if not len(ready):
+            return
+        nearest = targeting.nearest
+        for i in ready.tolist():
+            target = players[nearest[i]]
+            ex, ey = float(x[i]), float(y[i])
+            if math.hypot(target.x - ex, target.y - ey) < ENEMY_FIRE_RANGE:
+                self.last_shot[i] = current_time
+                angle = math.atan2(target.y - ey, target.x - ex)
+                pool.emit(ex, ey, angle, 5, int(self.DAMAGE[kind[i]]), ENEMY_BULLET_RADIUS, ENEMY_OWNER)
+
+    def records(self):
+        """Replication records by eid, quantized in bulk"""
+        n = self.count
+        data = np.zeros(n, ENEMY_RECORD_DTYPE)
+        data["eid"] = self.eid[:n]
+        data["kind"] = self.kind[:n]
+        data["x"] = np.clip(np.round(self.x[:n] * POSITION_SCALE), -32768, 32767)
+        data["y"] = np.clip(np.round(self.y[:n] * POSITION_SCALE), -32768, 32767)
+        data["angle"] = np.round(self.angle[:n] * ANGLE_SCALE).astype(np.int64) & 0xFFFF
+        data["health"] = np.clip(self.health[:n], -32768, 32767)
+        raw = data.tobytes()
+        size = ENEMY_RECORD.size
+        return {eid: raw[i * size:(i + 1) * size] for i, eid in enumerate(self.eid[:n].tolist())}
+
+    def restore(self, records, targets, t):
+        """Replace the swarm with replicated records, posed t of the way toward targets.
+
+        Enemies already on screen keep their last pose as prev_x, prev_y.
+        """
+        m = self.count
+        order = np.argsort(self.eid[:m])
+        known_eid = self.eid[:m][order]
+        known_x = self.x[:m][order]
+        known_y = self.y[:m][order]
+        n = len(records)
+        self.count = 0
+        self._reserve(n)
+        if not n:
+            return
+        data = np.frombuffer(b"".join(records.values()), ENEMY_RECORD_DTYPE)
+        ahead = np.frombuffer(b"".join(targets.get(eid, record) for eid, record in records.items()),
+                              ENEMY_RECORD_DTYPE)
+        kind = data["kind"].astype(np.intp)
+        x = data["x"].astype(np.float64)
+        y = data["y"].astype(np.float64)
+        angle = data["angle"].astype(np.float64)
+        if t:
+            x += (ahead["x"] - x) * t
+            y += (ahead["y"] - y) * t
+            angle += (((ahead["angle"].astype(np.int64) - data["angle"] + 32768) & 0xFFFF) - 32768) * t
+        self.kind[:n] = kind
+        self.x[:n] = x / POSITION_SCALE
+        self.y[:n] = y / POSITION_SCALE
+        self.angle[:n] = angle / ANGLE_SCALE
+        self.health[:n] = data["health"]
+        self.speed[:n] = self.SPEED[kind]
+        self.radius[:n] = self.RADIUS[kind]
+        self.fire_rate[:n] = self.FIRE_RATE[kind]
+        self.last_shot[:n] = 0
+        self.eid[:n] = data["eid"]
+        self.prev_x[:n] = self.x[:n]
+        self.prev_y[:n] = self.y[:n]
+        if m:
+            at = np.minimum(np.searchsorted(known_eid, data["eid"]), m - 1)
+            known = known_eid[at] == data["eid"]
+            self.prev_x[:n][known] = known_x[at[known]]
+            self.prev_y[:n][known] = known_y[at[known]]
+        self.count = n
+
+    def _sprite(self, kind, step):
+        """Robot hull for one kind at one of HEX_STEPS headings, rendered on first use"""
+        key = kind * HEX_STEPS + step
+        cached = self.sprites.get(key)
+        if cached is None:
+            stats = ENEMY_KINDS[kind]
+            radius = stats["radius"]
+            angle = step * (math.pi / 3) / HEX_STEPS
+            sprite = pygame.Surface((radius * 2 + 1, radius * 2 + 1))
+            sprite.set_colorkey(BLACK, pygame.RLEACCEL)
+            c = radius
+
+            # Robot body - hexagonal shape, then the inner body
+            for reach, color in ((radius, stats["color"]), (radius - 5, (100, 30, 50))):
+                points = []
+                for i in range(6):
+                    a = angle + i * math.pi / 3
+                    points.append((c + math.cos(a) * reach, c + math.sin(a) * reach))
+                pygame.draw.polygon(sprite, color, points)
+
+            # Robot eye
+            pygame.draw.circle(sprite, (255, 50, 50), (c, c), 6)
+            pygame.draw.circle(sprite, WHITE, (c, c), 3)
+            cached = self.sprites[key] = sprite
+        return cached
+
+    def draw(self, surface, dirty=None, alpha=1.0):
+        n = self.count
+        if not n:
+            return
+        kind = self.kind[:n]
+        radius = self.radius[:n]
+        prev_x, prev_y = self.prev_x[:n], self.prev_y[:n]
+        cx = (prev_x + (self.x[:n] - prev_x) * alpha).astype(np.int32)
+        cy = (prev_y + (self.y[:n] - prev_y) * alpha).astype(np.int32)
+        # A hexagon repeats every sixth of a turn
+        steps = np.round(self.angle[:n] % (math.pi / 3) * (HEX_STEPS * 3 / math.pi)).astype(np.intp) % HEX_STEPS
+        sprites = [self._sprite(k, s) for k, s in zip(kind.tolist(), steps.tolist())]
+        rects = surface.blits(zip(sprites, zip((cx - radius).tolist(), (cy - radius).tolist())), dirty is not None)
+        if dirty is not None:
+            dirty.extend(rects)
+
+        # Health bars over damaged enemies
+        health = self.health[:n]
+        max_health = self.MAX_HEALTH[kind]
+        for i in np.flatnonzero(health < max_health).tolist():
+            r = int(radius[i])
+            bar = (int(cx[i]) - r, int(cy[i]) - r - 10, r * 2, 4)
+            pygame.draw.rect(surface, RED, bar)
+            pygame.draw.rect(surface, GREEN, (bar[0], bar[1], r * 2 * int(health[i]) / int(max_health[i]), 4))
+            if dirty is not None:
+                dirty.append(pygame.Rect(bar))
+
+
+# Wave rules used when waves.json is missing or invalid: the classic 5 + 2 * wave
+# enemies, one a second from a random side, and a boss every fifth wave
+WAVES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "waves.json")
+DEFAULT_WAVES = {
+    "boss_every": 5,
+    "default": {"groups": [{"count": [5, 2], "interval": 1000}]},
+    "waves": {}
+}
+ENEMY_KIND_IDS = {kind["name"]: i for i, kind in enumerate(ENEMY_KINDS)}
+FORMATIONS = ("scatter", "line", "v", "ring")
+SIDES = ("top", "left", "right")
+
+
+class WaveTable:
+    """Declarative wave definitions, expanded into a spawn timeline per wave.
+
+    A wave is a list of spawn groups plus an optional boss. Each group
+    spawns `count` enemies (an int, or [base, per_wave] for base +
+    per_wave * wave) in bursts of `burst`, the first at `at` ms into the
+    wave and then every `interval` ms, laid out in a formation from a
+    side and drawn from `weights` (kind name -> weight) or a single
+    `kind`. Waves not listed use "default", or a boss-only wave every
+    `boss_every` waves.
+    """
+    GROUP_DEFAULTS = {"count": 1, "burst": 1, "interval": 1000, "formation": "scatter", "side": "random",
+                      "weights": {kind["name"]: kind["weight"] for kind in ENEMY_KINDS}}
+
+    def __init__(self, table):
+        self.boss_every = int(table.get("boss_every", 0))
+        self.default = self.parse_wave(table.get("default", {"groups": []}))
+        self.waves = {int(number): self.parse_wave(wave) for number, wave in table.get("waves", {}).items()}
+
+    @classmethod
+    def load(cls, path=WAVES_PATH):
+        """Read a .json or .toml table, falling back to DEFAULT_WAVES"""
+        try:
+            if path.endswith(".toml"):
+                import tomllib
+                with open(path, "rb") as f:
+                    return cls(tomllib.load(f))
+            with open(path, "r") as f:
+                return cls(json.load(f))
+        except (OSError, ValueError, TypeError, KeyError, ImportError) as e:
+            print(f"Wave table error: {e}")
+            return cls(DEFAULT_WAVES)
+
+    def parse_wave(self, wave):
+        groups = []
+        for group in wave.get("groups", []):
+            group = dict(self.GROUP_DEFAULTS, **group)
+            if "kind" in group:
+                group["weights"] = {group["kind"]: 1}
+            kinds = [ENEMY_KIND_IDS[name] for name in group["weights"]]
+            weights = [float(w) for w in group["weights"].values()]
+            if group["formation"] not in FORMATIONS:
+                raise ValueError(f"unknown formation {group['formation']!r}")
+            if group["side"] not in SIDES + ("random",):
+                raise ValueError(f"unknown side {group['side']!r}")
+            count = group["count"]
+            base, per_wave = (count, 0) if isinstance(count, int) else count
+            groups.append({
+                "base": int(base), "per_wave": float(per_wave), "burst": max(1, int(group["burst"])),
+                "interval": float(group["interval"]), "at": float(group.get("at", group["interval"])),
+                "formation": group["formation"], "side": group["side"], "kinds": kinds, "weights": weights
+            })
+        return {"boss": bool(wave.get("boss", False)), "groups": groups}
+
+    def wave(self, number):
+        wave = self.waves.get(number)
+        if wave is not None:
+            return wave
+        if self.boss_every and number % self.boss_every == 0:
+            return {"boss": True, "groups": []}
+        return self.default
+
+    def plan(self, number, rng):
+        """(boss, [(at_ms, kind, x, y), ...] sorted by time) for wave number"""
+        wave = self.wave(number)
+        timeline = []
+        for group in wave["groups"]:
+            remaining = group["base"] + int(group["per_wave"] * number)
+            at = group["at"]
+            while remaining > 0:
+                size = min(group["burst"], remaining)
+                kinds = rng.choices(group["kinds"], weights=group["weights"], k=size)
+                for kind, (x, y) in zip(kinds, self.formation(group, size, rng)):
+                    timeline.append((at, kind, x, y))
+                remaining -= size
+                at += group["interval"]
+        timeline.sort(key=lambda spawn: spawn[0])
+        return wave["boss"], timeline
+
+    @staticmethod
+    def formation(group, size, rng):
+        """Off-screen spawn points for one burst"""
+        formation = group["formation"]
+        side = group["side"]
+        if side == "random" and formation != "scatter":
+            side = rng.choice(SIDES)
+        if formation == "ring":
+            start = rng.uniform(0, math.pi * 2)
+            reach = math.hypot(WIDTH, HEIGHT) / 2 + 30
+            return [(WIDTH / 2 + math.cos(start + i * math.pi * 2 / size) * reach,
+                     HEIGHT / 2 + math.sin(start + i * math.pi * 2 / size) * reach) for i in range(size)]
+        if formation == "scatter":
+            points = []
+            for _ in range(size):
+                edge = rng.choice(SIDES) if side == "random" else side
+                if edge == "top":
+                    points.append((rng.randint(50, WIDTH - 50), -30))
+                elif edge == "left":
+                    points.append((-30, rng.randint(50, HEIGHT // 2)))
+                else:
+                    points.append((WIDTH + 30, rng.randint(50, HEIGHT // 2)))
+            return points
+
+        # Line and V: offsets along the edge (across) and away from the screen (back)
+        if formation == "line":
+            span = (WIDTH if side == "top" else HEIGHT // 2) - 100
+            offsets = [(50 + span * (i + 0.5) / size, 0) for i in range(size)]
+        else:
+            length = WIDTH if side == "top" else HEIGHT // 2
+            apex = rng.uniform(150, length - 150) if length > 300 else length / 2
+            offsets = [(apex + (i + 1) // 2 * 40 * (1 if i % 2 else -1), (i + 1) // 2 * 30) for i in range(size)]
+        if side == "top":
+            return [(across, -30 - back) for across, back in offsets]
+        if side == "left":
+            return [(-30 - back, across) for across, back in offsets]
+        return [(WIDTH + 30 + back, across) for across, back in offsets]
 
 
 class Boss:
     """Boss enemy"""
+    FAN_ANGLES = [math.pi / 2 + (i - 2) * 0.3 for i in range(5)]
+
     def __init__(self, wave):
         self.x = WIDTH // 2
         self.y = -100
+        self.prev_x = self.x
+        self.prev_y = self.y
         self.target_y = 100
         self.health = 500 + wave * 100
         self.max_health = self.health
@@ -619,53 +1854,56 @@ class Boss:
         self.angle = 0
         self.attack_pattern = 0
         self.pattern_timer = 0
+        self.pattern_switch = None
+        self.eid = next(entity_ids)
 
-    def update(self, players):
+    def update(self, players, current_time, timers):
         if self.entering:
             self.y += 2
             if self.y >= self.target_y:
                 self.entering = False
+                self.pattern_switch = timers.call_at(max(current_time, self.pattern_timer + BOSS_PATTERN_MS),
+                                                     self.switch_pattern, timers)
             return True
 
         self.angle += 0.02
         self.x = WIDTH // 2 + math.sin(self.angle) * 200
-
-        current_time = pygame.time.get_ticks()
-        if current_time - self.pattern_timer > 5000:
-            self.attack_pattern = (self.attack_pattern + 1) % 3
-            self.pattern_timer = current_time
-
         return True
 
-    def try_shoot(self, players):
+    def switch_pattern(self, timers):
+        """Timer callback: move to the next attack pattern and schedule the one after"""
+        self.attack_pattern = (self.attack_pattern + 1) % 3
+        self.pattern_timer = timers.now
+        self.pattern_switch = timers.call_at(self.pattern_timer + BOSS_PATTERN_MS, self.switch_pattern, timers)
+
+    def try_shoot(self, players, pool, current_time):
         if self.entering or not players:
-            return []
+            return False
 
-        current_time = pygame.time.get_ticks()
-        bullets = []
+        muzzle_y = self.y + self.radius
 
         if self.attack_pattern == 0:
             if current_time - self.last_shot >= 300:
                 self.last_shot = current_time
-                for i in range(5):
-                    angle = math.pi / 2 + (i - 2) * 0.3
-                    bullets.append(EnemyBullet(self.x, self.y + self.radius, angle, 4, 15))
+                pool.emit_many(self.x, muzzle_y, self.FAN_ANGLES, 4, 15, ENEMY_BULLET_RADIUS, ENEMY_OWNER)
+                return True
         elif self.attack_pattern == 1:
             if current_time - self.last_shot >= 500:
                 self.last_shot = current_time
-                for p in players:
-                    angle = math.atan2(p.y - self.y, p.x - self.x)
-                    bullets.append(EnemyBullet(self.x, self.y + self.radius, angle, 6, 20))
+                angles = [math.atan2(p.y - self.y, p.x - self.x) for p in players]
+                pool.emit_many(self.x, muzzle_y, angles, 6, 20, ENEMY_BULLET_RADIUS, ENEMY_OWNER)
+                return True
         else:
             if current_time - self.last_shot >= 100:
                 self.last_shot = current_time
-                angle = self.angle * 5
-                bullets.append(EnemyBullet(self.x, self.y + self.radius, angle, 3, 10))
+                pool.emit(self.x, muzzle_y, self.angle * 5, 3, 10, ENEMY_BULLET_RADIUS, ENEMY_OWNER)
+                return True
 
-        return bullets
+        return False
 
-    def draw(self, surface):
-        cx, cy = int(self.x), int(self.y)
+    def draw(self, surface, alpha=1.0):
+        x, y = lerp_position(self, alpha)
+        cx, cy = int(x), int(y)
 
         # Boss body - large robot
         pygame.draw.circle(surface, (200, 50, 100), (cx, cy), self.radius)
@@ -696,18 +1934,25 @@ class Boss:
         pygame.draw.rect(surface, GREEN, (bar_x, bar_y, bar_width * health_pct, bar_height))
         pygame.draw.rect(surface, WHITE, (bar_x - 2, bar_y - 2, bar_width + 4, bar_height + 4), 2)
 
-        boss_text = font.render("BOSS", True, WHITE)
-        surface.blit(boss_text, (WIDTH // 2 - boss_text.get_width() // 2, bar_y + bar_height + 5))
+        boss_text = text_cache.render(font, "BOSS", True, WHITE)
+        text_rect = surface.blit(boss_text, (WIDTH // 2 - boss_text.get_width() // 2, bar_y + bar_height + 5))
+        reach = self.radius + 4
+        body = pygame.Rect(cx - reach, cy - reach, reach * 2 + 1, reach * 2 + 1)
+        return body.union((bar_x - 2, bar_y - 2, bar_width + 4, bar_height + 4)).union(text_rect)
 
 
 class PowerUp:
     """Collectible power-up"""
-    def __init__(self, x, y, powerup_type=None):
+    TYPES = ["shield", "rapid_fire", "spread_shot", "damage_boost", "health"]
+
+    def __init__(self, x, y, spawn_time, powerup_type=None, rng=random):
         self.x = x
         self.y = y
+        self.prev_x = x
+        self.prev_y = y
         self.radius = 15
-        self.types = ["shield", "rapid_fire", "spread_shot", "damage_boost", "health"]
-        self.type = powerup_type or random.choice(self.types)
+        self.types = self.TYPES
+        self.type = powerup_type or rng.choice(self.types)
         self.colors = {
             "shield": CYAN,
             "rapid_fire": YELLOW,
@@ -717,161 +1962,1009 @@ class PowerUp:
         }
         self.color = self.colors[self.type]
         self.angle = 0
-        self.lifetime = 10000
-        self.spawn_time = pygame.time.get_ticks()
+        self.lifetime = POWERUP_LIFETIME
+        self.spawn_time = spawn_time
+        self.despawn = None     # host's lifetime timer
+        self.eid = next(entity_ids)
 
     def update(self):
+        """Drift one tick; False once off screen (running out of lifetime is a timer)"""
         self.angle += 0.1
         self.y += 0.5
-        return pygame.time.get_ticks() - self.spawn_time < self.lifetime and self.y < HEIGHT
+        return self.y < HEIGHT
 
-    def draw(self, surface):
+    def draw(self, surface, alpha=1.0):
+        x, y = lerp_position(self, alpha)
         pulse = abs(math.sin(self.angle)) * 5
-        pygame.draw.circle(surface, self.color, (int(self.x), int(self.y)), int(self.radius + pulse))
-        pygame.draw.circle(surface, WHITE, (int(self.x), int(self.y)), self.radius, 2)
+        pygame.draw.circle(surface, self.color, (int(x), int(y)), int(self.radius + pulse))
+        pygame.draw.circle(surface, WHITE, (int(x), int(y)), self.radius, 2)
 
         icons = {"shield": "S", "rapid_fire": "R", "spread_shot": "W", "damage_boost": "D", "health": "+"}
-        icon = small_font.render(icons[self.type], True, WHITE)
-        surface.blit(icon, (self.x - icon.get_width() // 2, self.y - icon.get_height() // 2))
+        icon = text_cache.render(small_font, icons[self.type], True, WHITE)
+        surface.blit(icon, (x - icon.get_width() // 2, y - icon.get_height() // 2))
+        reach = self.radius + 6
+        return pygame.Rect(int(x) - reach, int(y) - reach, reach * 2 + 1, reach * 2 + 1)
+
+
+class SpatialHash:
+    """Uniform grid broadphase for circle collisions"""
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def clear(self):
+        self.cells.clear()
+
+    def insert(self, index, x, y, radius):
+        cs = self.cell_size
+        x0, x1 = int((x - radius) // cs), int((x + radius) // cs)
+        y0, y1 = int((y - radius) // cs), int((y + radius) // cs)
+        cells = self.cells
+        for gx in range(x0, x1 + 1):
+            for gy in range(y0, y1 + 1):
+                bucket = cells.get((gx, gy))
+                if bucket is None:
+                    cells[(gx, gy)] = [index]
+                else:
+                    bucket.append(index)
+
+    def build(self, objects):
+        """Rebuild the grid from objects exposing x, y and radius"""
+        self.cells.clear()
+        for i, obj in enumerate(objects):
+            self.insert(i, obj.x, obj.y, obj.radius)
+
+    def query(self, x, y, radius):
+        """Return sorted indices of objects whose cells overlap the circle"""
+        cs = self.cell_size
+        x0, x1 = int((x - radius) // cs), int((x + radius) // cs)
+        y0, y1 = int((y - radius) // cs), int((y + radius) // cs)
+        cells = self.cells
+        if x0 == x1 and y0 == y1:
+            return cells.get((x0, y0), ())
+        found = set()
+        for gx in range(x0, x1 + 1):
+            for gy in range(y0, y1 + 1):
+                bucket = cells.get((gx, gy))
+                if bucket:
+                    found.update(bucket)
+        return sorted(found)
+
+
+# Wire protocol: every message travels as one frame of
+#   u32 body length | u8 message type id | body
+FRAME_HEADER = struct.Struct("<IB")
+MAX_FRAME_BODY = 1 << 22
+
+MESSAGE_TYPES = {}
+MESSAGE_IDS = {}
+
+
+class ProtocolError(Exception):
+    """Malformed or unknown frame on a game connection"""
+
+
+class MessageType:
+    """A registered wire message: type id, name and body codec"""
+    def __init__(self, type_id, name, encode, decode):
+        self.type_id = type_id
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+def register_message(type_id, name, fields=None, fmt=None, encode=None, decode=None):
+    """Register a message type.
+
+    Fixed-layout messages pass field names and a struct format; messages
+    with variable bodies pass encode(msg) -> bytes and decode(bytes) -> dict
+    instead.
+    """
+    if fmt is not None:
+        layout = struct.Struct("<" + fmt)
+
+        def encode(msg):
+            return layout.pack(*[msg[field] for field in fields])
+
+        def decode(body):
+            return dict(zip(fields, layout.unpack(body)))
+
+    if type_id in MESSAGE_IDS or name in MESSAGE_TYPES:
+        raise ValueError(f"message {type_id}/{name} already registered")
+    message_type = MessageType(type_id, name, encode, decode)
+    MESSAGE_TYPES[name] = message_type
+    MESSAGE_IDS[type_id] = message_type
+    return message_type
+
+
+def encode_message(msg):
+    """Frame a message dict whose "type" names a registered message"""
+    message_type = MESSAGE_TYPES[msg["type"]]
+    body = message_type.encode(msg)
+    return FRAME_HEADER.pack(len(body), message_type.type_id) + body
+
+
+class FrameDecoder:
+    """Reassembles whole frames from a TCP byte stream.
+
+    Handles frames split across reads and several frames per read.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        buffer = self.buffer
+        buffer += data
+        messages = []
+        offset = 0
+        header_size = FRAME_HEADER.size
+        while len(buffer) - offset >= header_size:
+            length, type_id = FRAME_HEADER.unpack_from(buffer, offset)
+            if length > MAX_FRAME_BODY:
+                raise ProtocolError(f"frame of {length} bytes exceeds limit")
+            end = offset + header_size + length
+            if len(buffer) < end:
+                break
+            message_type = MESSAGE_IDS.get(type_id)
+            if message_type is None:
+                raise ProtocolError(f"unknown message type {type_id}")
+            msg = message_type.decode(bytes(buffer[offset + header_size:end]))
+            msg["type"] = message_type.name
+            messages.append(msg)
+            offset = end
+        if offset:
+            del buffer[:offset]
+        return messages
+
+
+register_message(1, "hello", ("player_num",), "B")
+register_message(2, "input", ("seq", "keys", "mouse_x", "mouse_y", "flags"), "IIhhB")
+
+
+# Replicated state: every entity kind packs into a fixed-size record led by
+# its u32 eid. Positions are fixed point (1/8 px), angles 16-bit turns.
+POSITION_SCALE = 8
+ANGLE_SCALE = 65536 / (2 * math.pi)
+WORLD_RECORD = struct.Struct("<IHB")            # eid 0, wave, game over
+PLAYER_RECORD = struct.Struct("<IBhhHhhIB")     # player_num, x, y, angle, health, max_health, score, powerups
+ENEMY_RECORD = struct.Struct("<IBhhHh")         # type, x, y, angle, health
+BOSS_RECORD = struct.Struct("<IhhHiiB")         # x, y, angle, health, max_health, entering
+POWERUP_RECORD = struct.Struct("<IBhhH")        # type, x, y, angle
+BULLET_RECORD = struct.Struct("<IIffffBb")      # tick, x, y at that tick, vx, vy, radius, owner
+ENEMY_RECORD_DTYPE = np.dtype([("eid", "<u4"), ("kind", "u1"), ("x", "<i2"), ("y", "<i2"), ("angle", "<u2"),
+                               ("health", "<i2")])
+BULLET_RECORD_DTYPE = np.dtype([("eid", "<u4"), ("tick", "<u4"), ("x", "<f4"), ("y", "<f4"),
+                                ("vx", "<f4"), ("vy", "<f4"), ("radius", "u1"), ("owner", "i1")])
+SNAPSHOT_KINDS = [
+    ("world", WORLD_RECORD),
+    ("players", PLAYER_RECORD),
+    ("enemies", ENEMY_RECORD),
+    ("boss", BOSS_RECORD),
+    ("powerups", POWERUP_RECORD),
+    ("bullets", BULLET_RECORD),
+    ("enemy_bullets", BULLET_RECORD),
+]
+SNAPSHOT_HEADER = struct.Struct("<IIIB")        # tick, baseline tick (0: none), last input seq applied, kinds present
+SNAPSHOT_KIND_HEADER = struct.Struct("<BII")    # kind, removed count, changed count
+
+
+# Offset of the (x, y, angle) triple within each moving entity's record
+POSE = struct.Struct("<hhH")
+POSE_OFFSETS = {"players": 5, "enemies": 5, "boss": 4, "powerups": 5}
+
+
+def quantize(v):
+    return max(-32768, min(32767, round(v * POSITION_SCALE)))
+
+
+def quantize_angle(a):
+    return round(a * ANGLE_SCALE) & 0xFFFF
+
+
+def interpolate_pose(name, record, other, t):
+    """x, y and angle of a record, blended t of the way toward other's"""
+    offset = POSE_OFFSETS[name]
+    x, y, angle = POSE.unpack_from(record, offset)
+    if other is not None and t:
+        ox, oy, oangle = POSE.unpack_from(other, offset)
+        x += (ox - x) * t
+        y += (oy - y) * t
+        angle += (((oangle - angle + 32768) & 0xFFFF) - 32768) * t
+    return x / POSITION_SCALE, y / POSITION_SCALE, angle / ANGLE_SCALE
+
+
+class Snapshot:
+    """Replicated world state at one host tick: kind -> {eid: record}"""
+    def __init__(self, tick, entities=None):
+        self.tick = tick
+        self.entities = entities if entities is not None else {name: {} for name, _ in SNAPSHOT_KINDS}
+
+    def delta(self, baseline):
+        """(removed eids, changed records) per kind since baseline; everything if None"""
+        removed, changed = {}, {}
+        for name, records in self.entities.items():
+            base = baseline.entities[name] if baseline else {}
+            removed[name] = [eid for eid in base if eid not in records]
+            changed[name] = [record for eid, record in records.items() if base.get(eid) != record]
+        return removed, changed
+
+    def patched(self, tick, removed, changed):
+        """A new Snapshot: this one with a received delta applied"""
+        entities = {}
+        for name, records in self.entities.items():
+            records = dict(records)
+            for eid in removed.get(name, ()):
+                records.pop(eid, None)
+            for record in changed.get(name, ()):
+                records[int.from_bytes(record[:4], "little")] = record
+            entities[name] = records
+        return Snapshot(tick, entities)
+
+
+def encode_snapshot(msg):
+    parts = [b""]
+    kinds = 0
+    for kind, (name, _) in enumerate(SNAPSHOT_KINDS):
+        removed = msg["removed"].get(name, ())
+        changed = msg["changed"].get(name, ())
+        if not removed and not changed:
+            continue
+        kinds += 1
+        parts.append(SNAPSHOT_KIND_HEADER.pack(kind, len(removed), len(changed)))
+        parts.append(struct.pack(f"<{len(removed)}I", *removed))
+        parts.extend(changed)
+    parts[0] = SNAPSHOT_HEADER.pack(msg["tick"], msg["baseline"], msg["input_seq"], kinds)
+    return b"".join(parts)
+
+
+def decode_snapshot(body):
+    try:
+        tick, baseline, input_seq, kinds = SNAPSHOT_HEADER.unpack_from(body)
+        offset = SNAPSHOT_HEADER.size
+        removed, changed = {}, {}
+        for _ in range(kinds):
+            kind, num_removed, num_changed = SNAPSHOT_KIND_HEADER.unpack_from(body, offset)
+            offset += SNAPSHOT_KIND_HEADER.size
+            name, layout = SNAPSHOT_KINDS[kind]
+            removed[name] = list(struct.unpack_from(f"<{num_removed}I", body, offset))
+            offset += 4 * num_removed
+            end = offset + num_changed * layout.size
+            if end > len(body):
+                raise ProtocolError("truncated snapshot")
+            changed[name] = [body[i:i + layout.size] for i in range(offset, end, layout.size)]
+            offset = end
+    except (struct.error, IndexError) as e:
+        raise ProtocolError(f"bad snapshot: {e}")
+    return {"tick": tick, "baseline": baseline, "input_seq": input_seq,
+            "removed": removed, "changed": changed}
+
+
+register_message(3, "snapshot", encode=encode_snapshot, decode=decode_snapshot)
+register_message(4, "ack", ("tick",), "I")
+
+
+class Connection:
+    """A peer socket with its frame decoder and unsent output"""
+    def __init__(self, sock, addr, peer_id, deadline=None):
+        self.sock = sock
+        self.addr = addr
+        self.peer_id = peer_id
+        self.decoder = FrameDecoder()
+        self.outgoing = bytearray()
+        self.deadline = deadline    # monotonic time a pending connect gives up; None once connected
 
 
 class NetworkManager:
-    """Handles online multiplayer networking"""
+    """Handles online multiplayer networking.
+
+    Every socket is non-blocking and registered with one selector that
+    poll() services once per game tick, so nothing spins while idle and
+    the host can hold as many peers as the selector allows.
+    """
     def __init__(self):
         self.socket = None
+        self.selector = None
         self.connected = False
         self.is_host = False
         self.clients = []
         self.messages = []
-        self.lock = threading.Lock()
+        self.next_peer_id = 1
 
-    def host_game(self, port=DEFAULT_PORT):
+    def host_game(self, port=DEFAULT_PORT, backlog=64):
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.socket.bind(('', port))
-            self.socket.listen(3)
+            self.socket.listen(backlog)
             self.socket.setblocking(False)
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.socket, selectors.EVENT_READ, None)
             self.is_host = True
             self.connected = True
-            threading.Thread(target=self._accept_clients, daemon=True).start()
             return True
         except Exception as e:
             print(f"Host error: {e}")
             return False
 
-    def join_game(self, host_ip, port=DEFAULT_PORT):
+    def join_game(self, host_ip, port=DEFAULT_PORT, timeout=5):
+        """Start connecting to a host; poll() completes the connect, or drops it after timeout seconds"""
         try:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((host_ip, port))
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self.socket.setblocking(False)
+            result = self.socket.connect_ex((host_ip, port))
+            if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+                raise OSError(result, os.strerror(result))
+            self.selector = selectors.DefaultSelector()
+            conn = Connection(self.socket, (host_ip, port), self.next_peer_id, time.monotonic() + timeout)
+            self.next_peer_id += 1
+            self.clients.append(conn)
+            self.selector.register(self.socket, selectors.EVENT_WRITE, conn)
             self.is_host = False
             self.connected = True
-            threading.Thread(target=self._receive_messages, daemon=True).start()
             return True
         except Exception as e:
             print(f"Join error: {e}")
+            if self.socket:
+                self.socket.close()
+                self.socket = None
             return False
 
-    def _accept_clients(self):
-        while self.connected:
+    def _register(self, sock, addr):
+        conn = Connection(sock, addr, self.next_peer_id)
+        self.next_peer_id += 1
+        self.clients.append(conn)
+        self.selector.register(sock, selectors.EVENT_READ, conn)
+        return conn
+
+    def _connected(self, conn):
+        """The pending connect finished: start reading, or drop the host if it failed"""
+        error = conn.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if error:
+            print(f"Join error: {os.strerror(error)}")
+            self._drop(conn)
+            return
+        conn.deadline = None
+        self._flush(conn)
+
+    def poll(self, timeout=0):
+        """Accept, read and flush whatever sockets are ready; never blocks by default"""
+        if not self.connected:
+            return
+        for conn in self.clients[:]:
+            if conn.deadline is not None and time.monotonic() > conn.deadline:
+                print("Join error: timed out")
+                self._drop(conn)
+        if not self.connected:
+            return
+        for key, mask in self.selector.select(timeout):
+            conn = key.data
+            if conn is None:
+                self._accept()
+                continue
+            if conn.deadline is not None:
+                self._connected(conn)
+                continue
+            if mask & selectors.EVENT_READ:
+                self._read(conn)
+            if mask & selectors.EVENT_WRITE and conn in self.clients:
+                self._flush(conn)
+
+    def _accept(self):
+        while True:
             try:
                 client, addr = self.socket.accept()
-                client.setblocking(False)
-                self.clients.append(client)
-                threading.Thread(target=self._handle_client, args=(client,), daemon=True).start()
-            except BlockingIOError:
-                pass
-            except:
-                break
+            except (BlockingIOError, InterruptedError):
+                return
+            client.setblocking(False)
+            client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = self._register(client, addr)
+            self.messages.append({"type": "join", "peer": conn.peer_id})
 
-    def _handle_client(self, client):
-        while self.connected:
-            try:
-                data = client.recv(4096)
-                if data:
-                    with self.lock:
-                        self.messages.append(json.loads(data.decode()))
-            except BlockingIOError:
-                pass
-            except:
-                break
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            self._drop(conn)
+            return
+        if not data:
+            self._drop(conn)
+            return
+        try:
+            messages = conn.decoder.feed(data)
+        except ProtocolError as e:
+            print(f"Dropping peer {conn.addr}: {e}")
+            self._drop(conn)
+            return
+        for msg in messages:
+            msg["peer"] = conn.peer_id
+        self.messages.extend(messages)
 
-    def _receive_messages(self):
-        while self.connected:
-            try:
-                data = self.socket.recv(4096)
-                if data:
-                    with self.lock:
-                        self.messages.append(json.loads(data.decode()))
-            except BlockingIOError:
-                pass
-            except:
-                break
+    def _flush(self, conn):
+        try:
+            sent = conn.sock.send(conn.outgoing)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self._drop(conn)
+            return
+        del conn.outgoing[:sent]
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if conn.outgoing else 0)
+        self.selector.modify(conn.sock, events, conn)
 
-    def send(self, msg):
-        if not self.connected:
+    def _drop(self, conn):
+        if conn not in self.clients:
             return
-        data = json.dumps(msg).encode()
+        self.clients.remove(conn)
         try:
-            if self.is_host:
-                for client in self.clients[:]:
-                    try:
-                        client.send(data)
-                    except:
-                        self.clients.remove(client)
-            else:
-                self.socket.send(data)
-        except:
+            self.selector.unregister(conn.sock)
+            conn.sock.close()
+        except (KeyError, ValueError, OSError):
             pass
+        if self.is_host:
+            self.messages.append({"type": "leave", "peer": conn.peer_id})
+        else:
+            self.connected = False
+
+    def kick(self, peer_id):
+        for conn in self.clients[:]:
+            if conn.peer_id == peer_id:
+                self._drop(conn)
+
+    def send(self, msg, peer_id=None):
+        """Queue a message to every peer (or just peer_id) and start flushing it"""
+        if not self.connected:
+            return
+        data = encode_message(msg)
+        for conn in self.clients[:]:
+            if peer_id is not None and conn.peer_id != peer_id:
+                continue
+            if len(conn.outgoing) + len(data) > MAX_OUTGOING_BYTES:
+                print(f"Dropping peer {conn.addr}: {len(conn.outgoing)} bytes unsent")
+                self._drop(conn)
+                continue
+            idle = not conn.outgoing
+            conn.outgoing += data
+            if idle and conn.deadline is None:
+                self._flush(conn)
 
     def get_messages(self):
-        with self.lock:
-            msgs = self.messages[:]
-            self.messages.clear()
+        msgs = self.messages
+        self.messages = []
         return msgs
 
     def disconnect(self):
         self.connected = False
+        for conn in self.clients[:]:
+            self._drop(conn)
         try:
+            if self.selector:
+                if self.is_host and self.socket:
+                    self.selector.unregister(self.socket)
+                self.selector.close()
             if self.socket:
                 self.socket.close()
-            for client in self.clients:
-                client.close()
-        except:
+        except (KeyError, ValueError, OSError):
+            pass
+        self.selector = None
+        self.socket = None
+        self.messages = []
+
+
+class DirtyRenderer:
+    """Presents only the screen areas that changed since the last frame.
+
+    Everything drawn in a frame is marked; the next frame first restores
+    those rects from the static backdrop, then display.update() gets last
+    frame's rects plus this frame's. Past a dirty-area or rect-count
+    threshold it falls back to a full redraw and flip.
+    """
+    def __init__(self, full_fraction=DIRTY_FULL_FRACTION, max_rects=MAX_DIRTY_RECTS):
+        self.full_area = full_fraction * WIDTH * HEIGHT
+        self.max_rects = max_rects
+        self.previous = []
+        self.current = []
+        self.full = True
+
+    def invalidate(self):
+        self.full = True
+
+    def too_dirty(self, rects):
+        if len(rects) > self.max_rects:
+            return True
+        return sum(r.w * r.h for r in rects) > self.full_area
+
+    def begin(self, surface, backdrop):
+        if self.full or self.too_dirty(self.previous):
+            surface.blit(backdrop, (0, 0))
+            self.full = True
+        else:
+            for rect in self.previous:
+                surface.blit(backdrop, rect, rect)
+        self.current = []
+
+    def mark(self, rect):
+        self.current.append(rect)
+        return rect
+
+    def present(self):
+        rects = self.previous + self.current
+        if self.full or self.too_dirty(rects):
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+        self.previous = self.current
+        self.full = False
+
+
+class Profiler:
+    """Frame timings of the main loop, split into named sections.
+
+    Each lap() charges the time since the previous one to a section, so a
+    frame is covered end to end with one clock read per section. Rolling
+    p50/p95/p99 over the last `window` frames feed the F3 overlay. With a
+    trace path every frame is also written out, as a CSV row or, for any
+    other extension, as Chrome trace events (chrome://tracing, Perfetto).
+    Nothing is timed while the overlay is hidden and no trace is open.
+    """
+    SECTIONS = [
+        "events", "update.network", "update.background",
+        "update.timers", "update.players", "update.enemies", "update.boss", "update.bullets",
+        "update.powerups", "update.particles", "update.collisions", "update.playing",
+        "draw.background", "draw.particles", "draw.powerups", "draw.enemies", "draw.boss",
+        "draw.bullets", "draw.players", "draw.hud", "draw.playing", "draw.profiler", "draw.present",
+        "idle"
+    ]
+    COUNTS = ["players", "enemies", "boss", "bullets", "enemy_bullets", "powerups", "particles"]
+
+    def __init__(self, window=PROFILE_WINDOW, trace_path=None):
+        self.window = window
+        self.history = {}
+        self.counts = {}
+        self.laps = []
+        self.frames = 0
+        self.frame_start = 0.0
+        self.last = 0.0
+        self.show = False
+        self.enabled = False
+        self.trace = None
+        self.writer = None
+        self.trace_start = 0.0
+        self.overlay = None
+        if trace_path:
+            self.open_trace(trace_path)
+
+    def toggle(self):
+        """Show or hide the overlay from the next frame on"""
+        self.show = not self.show
+        self.overlay = None
+
+    def open_trace(self, path):
+        try:
+            self.trace = open(path, "w", newline="")
+        except OSError as e:
+            print(f"Profiler trace error: {e}")
+            return
+        self.trace_start = time.perf_counter()
+        if path.endswith(".csv"):
+            self.writer = csv.writer(self.trace)
+            self.writer.writerow(["frame", "frame_ms"] + self.SECTIONS + ["other"] + self.COUNTS)
+        else:
+            self.trace.write("[\n")
+
+    def close_trace(self):
+        if self.trace is None:
+            return
+        if self.writer is None:
+            self.trace.write("\n]\n")
+        self.trace.close()
+        self.trace = None
+        self.writer = None
+
+    def begin_frame(self):
+        self.enabled = self.show or self.trace is not None
+        if self.enabled:
+            self.frame_start = self.last = time.perf_counter()
+            self.laps = []
+
+    def lap(self, name):
+        """Charge the time since the previous lap to section `name`"""
+        if self.enabled:
+            now = time.perf_counter()
+            self.laps.append((name, self.last, now))
+            self.last = now
+
+    def end_frame(self, entity_counts):
+        """Close the frame; entity_counts() is only called while profiling"""
+        if not self.enabled:
+            return
+        end = time.perf_counter()
+        sections = {}
+        for name, start, stop in self.laps:
+            sections[name] = sections.get(name, 0.0) + (stop - start) * 1000
+        sections["frame"] = (end - self.frame_start) * 1000
+        sections["busy"] = sections["frame"] - sections.get("idle", 0.0)
+        for name, ms in sections.items():
+            history = self.history.get(name)
+            if history is None:
+                history = self.history[name] = deque(maxlen=self.window)
+            history.append(ms)
+        self.counts = entity_counts()
+        if self.trace is not None:
+            self.write_frame(sections, end)
+        self.frames += 1
+
+    def write_frame(self, sections, end):
+        if self.writer is not None:
+            other = sum((stop - start) * 1000 for name, start, stop in self.laps if name not in self.SECTIONS)
+            self.writer.writerow([self.frames, round(sections["frame"], 4)]
+                                 + [round(sections.get(name, 0.0), 4) for name in self.SECTIONS]
+                                 + [round(other, 4)] + [self.counts.get(name, 0) for name in self.COUNTS])
+            return
+        origin = self.trace_start
+        events = [{"name": "frame", "ph": "X", "pid": 1, "tid": 1,
+                   "ts": round((self.frame_start - origin) * 1e6, 1),
+                   "dur": round((end - self.frame_start) * 1e6, 1), "args": {"frame": self.frames}}]
+        for name, start, stop in self.laps:
+            events.append({"name": name, "cat": name.split(".")[0], "ph": "X", "pid": 1, "tid": 1,
+                           "ts": round((start - origin) * 1e6, 1), "dur": round((stop - start) * 1e6, 1)})
+        events.append({"name": "entities", "ph": "C", "pid": 1, "tid": 1,
+                       "ts": round((end - origin) * 1e6, 1), "args": self.counts})
+        self.trace.write("" if self.frames == 0 else ",\n")
+        self.trace.write(",\n".join(json.dumps(event) for event in events))
+
+    def percentiles(self, name):
+        """p50, p95, p99 of a section's rolling window (nearest rank)"""
+        values = sorted(self.history[name])
+        last = len(values) - 1
+        return values[last // 2], values[last * 95 // 100], values[last * 99 // 100]
+
+    def summary(self):
+        """(section, p50, p95, p99) rows, most expensive p95 first"""
+        rows = [(name, *self.percentiles(name)) for name in self.history]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def draw(self, surface):
+        """Blit the overlay, rebuilt every PROFILE_REFRESH frames; returns its rect"""
+        if not self.show or not self.history:
+            return None
+        if self.overlay is None or self.frames % PROFILE_REFRESH == 0:
+            self.overlay = self.render_overlay()
+        return surface.blit(self.overlay, (WIDTH - self.overlay.get_width() - 10, 40))
+
+    def render_overlay(self, rows=16):
+        table = [(("section", "p50", "p95", "p99"), YELLOW)]
+        for name, p50, p95, p99 in self.summary()[:rows]:
+            color = RED if name not in ("frame", "idle") and p95 > TICK_MS else WHITE
+            table.append(((name, f"{p50:.2f}", f"{p95:.2f}", f"{p99:.2f}"), color))
+        # Names repeat every refresh and go through the text cache; the times are new each time
+        cells = [[text_cache.render(small_font, row[0], True, color)]
+                 + [small_font.render(cell, True, color) for cell in row[1:]] for row, color in table]
+        widths = [max(row[i].get_width() for row in cells) + 12 for i in range(4)]
+        counts = small_font.render(" ".join(f"{name}={n}" for name, n in self.counts.items()), True, CYAN)
+        height = small_font.get_linesize()
+        panel = pygame.Surface((max(sum(widths), counts.get_width()) + 12, height * (len(cells) + 1) + 8),
+                               pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        for i, row in enumerate(cells):
+            x = 6
+            for j, cell in enumerate(row):
+                # Section names left-aligned, times right-aligned
+                panel.blit(cell, (x if j == 0 else x + widths[j] - cell.get_width(), 4 + i * height))
+                x += widths[j]
+        panel.blit(counts, (6, 4 + len(cells) * height))
+        return panel
+
+
+# Detail levels, best first. particles: share of explosion particles
+# emitted; stars, debris: star layers and debris pieces drawn; hud_interval:
+# frames between HUD text refreshes; ship_detail: power-up letters on ships
+QUALITY_LEVELS = [
+    {"particles": 1.0, "stars": 3, "debris": 40, "hud_interval": 1, "ship_detail": True},
+    {"particles": 0.6, "stars": 3, "debris": 24, "hud_interval": 2, "ship_detail": True},
+    {"particles": 0.35, "stars": 2, "debris": 12, "hud_interval": 4, "ship_detail": False},
+    {"particles": 0.2, "stars": 1, "debris": 0, "hud_interval": 8, "ship_detail": False},
+]
+
+
+class QualityScaler:
+    """Detail level picked from measured frame work time.
+
+    record() takes each frame's work time: events, simulation and drawing,
+    timed before clock.tick, so neither its sleep nor the wait for the
+    browser's next animation frame (the await after it under pygbag) is
+    counted. At the end of every window of
+    QUALITY_WINDOW frames the p90 is compared against the frame budget:
+    one slow window drops a level, QUALITY_RAISE_WINDOWS quiet ones in a
+    row raise it again. A fixed level never changes.
+    """
+    def __init__(self, level=None, window=QUALITY_WINDOW, budget_ms=TICK_MS):
+        self.adaptive = level is None
+        self.level = level or 0
+        self.settings = QUALITY_LEVELS[self.level]
+        self.window = window
+        self.budget_ms = budget_ms
+        self.samples = []
+        self.quiet = 0
+
+    def record(self, work_ms):
+        """Add a frame's work time; True when the level changed"""
+        if not self.adaptive:
+            return False
+        self.samples.append(work_ms)
+        if len(self.samples) < self.window:
+            return False
+        values = sorted(self.samples)
+        self.samples = []
+        p90 = values[(len(values) - 1) * 9 // 10]
+        if p90 > self.budget_ms * QUALITY_DROP:
+            self.quiet = 0
+            return self.set_level(self.level + 1)
+        if p90 < self.budget_ms * QUALITY_RAISE:
+            self.quiet += 1
+            if self.quiet >= QUALITY_RAISE_WINDOWS:
+                self.quiet = 0
+                return self.set_level(self.level - 1)
+        else:
+            self.quiet = 0
+        return False
+
+    def set_level(self, level):
+        level = min(max(level, 0), len(QUALITY_LEVELS) - 1)
+        if level == self.level:
+            return False
+        self.level = level
+        self.settings = QUALITY_LEVELS[level]
+        return True
+
+
+def default_save():
+    return {
+        "credits": 0,
+        "upgrades": dict.fromkeys(UPGRADE_STATS, 0),
+        "high_scores": [],
+        "stats": {"games": 0, "best_wave": 0, "total_score": 0, "kills": 0, "boss_kills": 0, "play_ms": 0}
+    }
+
+
+def migrate_save_v0(data):
+    """Version 0 is the old save_2d.json, which only held credits"""
+    return {"credits": int(data.get("credits", 0))}
+
+
+# Upgrades a save of the keyed version to the next one
+SAVE_MIGRATIONS = {0: migrate_save_v0}
+
+
+class SaveStore:
+    """Versioned save file, written atomically behind the frame loop.
+
+    The file is a small header (magic, schema version, CRC-32 of the
+    body) followed by zlib-compressed JSON. Each write goes to a temp
+    file of its own that replaces the save with os.replace, so a crash,
+    or a second game saving at the same time, leaves either the old save
+    or a complete new one. save() only queues a copy; a writer thread
+    keeps the newest queued copy and drops the rest. Where
+    threads are unavailable (the browser build) it writes inline. Older
+    schema versions are upgraded through SAVE_MIGRATIONS on load.
+    """
+    MAGIC = b"SSAV"
+    VERSION = 1
+    HEADER = struct.Struct("<4sHI")  # magic, schema version, crc32 of the body
+
+    def __init__(self, path=SAVE_PATH, legacy_path=LEGACY_SAVE_PATH, threaded=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        if threaded is None:
+            threaded = sys.platform != "emscripten"
+        self.queue = queue.Queue() if threaded else None
+        self.writer = None
+        self.writes = 0
+
+    @classmethod
+    def encode(cls, text):
+        """File bytes for a save already serialized to JSON text"""
+        body = zlib.compress(text.encode())
+        return cls.HEADER.pack(cls.MAGIC, cls.VERSION, zlib.crc32(body)) + body
+
+    @classmethod
+    def decode(cls, blob):
+        """(schema version, data) from a save file's bytes"""
+        if len(blob) < cls.HEADER.size:
+            raise ValueError("truncated save")
+        magic, version, crc = cls.HEADER.unpack_from(blob)
+        body = blob[cls.HEADER.size:]
+        if magic != cls.MAGIC or zlib.crc32(body) != crc:
+            raise ValueError("corrupt save")
+        if version > cls.VERSION:
+            raise ValueError("save from a newer version (%d)" % version)
+        return version, json.loads(zlib.decompress(body))
+
+    @classmethod
+    def migrate(cls, version, data):
+        while version < cls.VERSION:
+            data = SAVE_MIGRATIONS[version](data)
+            version += 1
+        save = default_save()
+        for key, value in data.items():
+            if isinstance(value, dict) and isinstance(save.get(key), dict):
+                save[key].update(value)
+            else:
+                save[key] = value
+        return save
+
+    def load(self):
+        """The saved data, migrated to the current schema; defaults if there is none"""
+        try:
+            with open(self.path, "rb") as f:
+                return self.migrate(*self.decode(f.read()))
+        except FileNotFoundError:
             pass
+        except (OSError, ValueError, KeyError, zlib.error) as e:
+            print(f"Save error: {e}")
+            # Keep the unreadable file for recovery instead of overwriting it on the next save
+            try:
+                os.replace(self.path, self.path + ".bad")
+            except OSError:
+                pass
+            return default_save()
+        try:
+            with open(self.legacy_path, "r") as f:
+                return self.migrate(0, json.load(f))
+        except FileNotFoundError:
+            return default_save()
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Save error: {e}")
+            return default_save()
+
+    def save(self, data):
+        """Persist a snapshot of data without blocking the caller on disk"""
+        # Serializing here freezes the snapshot; compression and I/O happen on the writer
+        text = json.dumps(data, separators=(",", ":"))
+        if self.queue is None:
+            self.write(text)
+            return
+        if self.writer is None:
+            self.writer = threading.Thread(target=self.run_writer, name="save-writer", daemon=True)
+            self.writer.start()
+        self.queue.put(text)
+
+    def run_writer(self):
+        while True:
+            data = self.queue.get()
+            # Only the newest snapshot matters; skip any that queued up behind it
+            while data is not None:
+                try:
+                    newer = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if newer is None:
+                    self.write(data)
+                    return
+                data = newer
+            if data is None:
+                return
+            self.write(data)
+
+    def write(self, text):
+        # A temp file of our own, so two games sharing one save never write into each other's
+        folder, name = os.path.split(self.path)
+        temp = None
+        try:
+            handle, temp = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=folder or None)
+            with os.fdopen(handle, "wb") as f:
+                f.write(self.encode(text))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp, self.path)
+            self.writes += 1
+        except OSError as e:
+            print(f"Save error: {e}")
+            if temp is not None:
+                try:
+                    os.remove(temp)
+                except OSError:
+                    pass
+
+    def close(self):
+        """Flush pending writes and stop the writer thread"""
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
 
 
 class Game:
-    """Main game class"""
-    def __init__(self):
+    """Main game class.
+
+    A headless game never touches the display, skips background effects
+    and persistence, and runs on a SimClock advanced by step(). Any game
+    made with save_path=None skips persistence too.
+
+    Gameplay randomness comes from self.rng, reseeded for every run, and
+    cosmetic effects from self.fx_rng, so the two never perturb each
+    other. With record_inputs set, each run's inputs are kept in
+    self.input_log (and written to record_dir when it ends).
+
+    Online, the host is authoritative: it runs the simulation with its
+    peers' inputs and sends each of them the delta between the current
+    Snapshot and the last one they acked. Clients only send inputs and
+    rebuild their world from the snapshots they receive.
+    """
+    def __init__(self, headless=False, clock=None, seed=None, record_inputs=False, record_dir=None,
+                 interp_delay=INTERPOLATION_DELAY_MS, dirty_rects=False, profiler=None, waves=None,
+                 quality=None, save_path=SAVE_PATH):
+        self.headless = headless
+        self.clock = clock or (SimClock() if headless else WallClock())
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        self.rng = random.Random(self.seed)
+        self.fx_rng = random.Random(self.seed ^ 0x5EEDF00D)
+        self.run_seed = self.seed
+        self.record_inputs = record_inputs or record_dir is not None
+        self.record_dir = record_dir
+        self.input_log = None
+        self.log_ticks = 0
         self.state = "menu"
         self.players = []
-        self.enemies = []
+        self.enemies = EnemySwarm()
         self.boss = None
-        self.bullets = []
-        self.enemy_bullets = []
+        self.bullets = BulletPool(WHITE, CYAN, 2, 0)
+        self.enemy_bullets = BulletPool(RED, ORANGE, 0, -2)
         self.powerups = []
-        self.particles = []
-        self.stars = [Star() for _ in range(50)]
-        self.debris = [SpaceDebris() for _ in range(40)]
+        self.particles = ParticleSystem(np.random.default_rng(self.seed ^ 0x5EEDF00D))
 
-        # Create background
-        self.background = create_nebula_background()
-        self.planet = create_planet()
-        self.planet_x = WIDTH - 100
-        self.planet_y = 80
+        self.background = None if headless else ParallaxBackground(self.fx_rng, NebulaCache())
+        self.renderer = DirtyRenderer() if dirty_rects and not headless else None
+        self.drawn_state = None
+        self.overlay = None
+        self.profiler = profiler or Profiler()
+        self.quality = quality or QualityScaler()
+        self.hud_text = None
+        self.hud_block = None
 
         self.wave = 1
         self.wave_timer = 0
-        self.enemies_to_spawn = 0
-        self.spawn_timer = 0
+        self.waves = waves or WaveTable.load()
+        self.pending_spawns = 0
+
+        # Power-up expiry, power-up despawns, boss pattern switches and wave spawns, on the game clock
+        self.timers = Scheduler()
+
+        # Nearest-player solve for the enemy AI, rebuilt every tick
+        self.targeting = Targeting()
+
+        # Collision broadphase grid, rebuilt every tick
+        self.powerup_grid = SpatialHash()
 
         self.num_local_players = 1
         self.network = NetworkManager()
         self.online_mode = False
-
+        self.tick = 0
+        self.snapshots = OrderedDict()
+        self.peer_players = {}
+        self.peer_acks = {}
+        self.remote_inputs = {}
+        self.remote_last = {}
+        self.remote_seqs = {}
+        self.replicas = {}
+        self.local_player = None
+        self.input_seq = 0
+        self.pending_inputs = deque()
+        self.predicted = None
+        self.interp_delay = interp_delay
+        self.render_tick = 0.0
+
+        # No save_path (or headless) means credits, upgrades and scores are never loaded or written
+        self.store = None if headless or save_path is None else SaveStore(save_path)
         self.credits = 0
+        self.upgrades = dict.fromkeys(UPGRADE_STATS, 0)
+        self.high_scores = []
+        self.stats = default_save()["stats"]
+        self.run_kills = 0
+        self.run_boss_kills = 0
+        self.run_start = 0
         self.load_data()
 
         self.shop_items = [
@@ -885,97 +2978,174 @@ class Game:
         self.ip_input = ""
 
     def load_data(self):
-        try:
-            with open("save_2d.json", "r") as f:
-                data = json.load(f)
-                self.credits = data.get("credits", 0)
-        except:
-            self.credits = 0
+        if self.store is None:
+            return
+        data = self.store.load()
+        self.credits = data["credits"]
+        self.upgrades.update(data["upgrades"])
+        self.high_scores = data["high_scores"]
+        self.stats = data["stats"]
 
     def save_data(self):
-        try:
-            with open("save_2d.json", "w") as f:
-                json.dump({"credits": self.credits}, f)
-        except:
-            pass
+        if self.store is None:
+            return
+        self.store.save({"credits": self.credits, "upgrades": self.upgrades,
+                         "high_scores": self.high_scores, "stats": self.stats})
+
+    def finish_run(self, scores):
+        """Bank credits, stats and a high-score entry for this machine's players when a run ends"""
+        total_score = sum(scores)
+        self.credits += total_score // 10
+        stats = self.stats
+        stats["games"] += 1
+        stats["best_wave"] = max(stats["best_wave"], self.wave)
+        stats["total_score"] += total_score
+        stats["kills"] += self.run_kills
+        stats["boss_kills"] += self.run_boss_kills
+        stats["play_ms"] += int(self.clock.get_ticks() - self.run_start)
+        self.high_scores.append({"score": total_score, "wave": self.wave, "players": len(scores)})
+        self.high_scores.sort(key=lambda entry: entry["score"], reverse=True)
+        del self.high_scores[MAX_HIGH_SCORES:]
+        self.save_data()
+
+    def start_game(self, num_players=1, online=False, seed=None, upgrades=None):
+        self.run_seed = seed if seed is not None else self.rng.randrange(1 << 32)
+        self.rng = random.Random(self.run_seed)
+        # Shop upgrades apply to ships simulated here; an online client's ship is the host's to simulate
+        if upgrades is None:
+            upgrades = self.upgrades if not online or self.network.is_host else {}
+        if self.record_inputs:
+            self.log_ticks = self.clock.get_ticks()
+            self.input_log = InputLog(self.run_seed, num_players, self.log_ticks, upgrades)
 
-    def start_game(self, num_players=1, online=False):
         self.state = "playing"
         self.wave = 1
         self.num_local_players = num_players
         self.online_mode = online
 
         self.players = []
-        start_positions = [
-            (WIDTH // 2, HEIGHT - 100),
-            (WIDTH // 3, HEIGHT - 100),
-            (2 * WIDTH // 3, HEIGHT - 100),
-            (WIDTH // 2, HEIGHT - 150)
-        ]
-
         for i in range(num_players):
-            x, y = start_positions[i]
-            self.players.append(Player(x, y, i))
-
-        self.enemies = []
+            x, y = START_POSITIONS[i]
+            player = Player(x, y, i)
+            player.apply_upgrades(upgrades)
+            self.players.append(player)
+        self.run_start = self.clock.get_ticks()
+        self.run_kills = 0
+        self.run_boss_kills = 0
+
+        self.tick = 0
+        self.snapshots.clear()
+        self.peer_acks.clear()
+        self.remote_inputs.clear()
+        self.remote_last.clear()
+        self.remote_seqs.clear()
+        self.replicas = {}
+        self.input_seq = 0
+        self.pending_inputs.clear()
+        self.predicted = None
+        self.render_tick = 0.0
+        if online:
+            for peer_id in list(self.peer_players):
+                self.add_remote_player(peer_id)
+
+        self.timers.clear()
+        self.enemies.clear()
         self.boss = None
-        self.bullets = []
-        self.enemy_bullets = []
+        self.bullets.clear()
+        self.enemy_bullets.clear()
         self.powerups = []
-        self.particles = []
+        self.particles.clear()
+        self.hud_text = None
         self.start_wave()
 
     def start_wave(self):
-        self.wave_timer = pygame.time.get_ticks()
-
-        if self.wave % 5 == 0:
-            self.boss = Boss(self.wave)
-            self.enemies_to_spawn = 0
-        else:
-            self.boss = None
-            self.enemies_to_spawn = 5 + self.wave * 2
-
-        self.spawn_timer = pygame.time.get_ticks()
-
-    def spawn_enemy(self):
-        if self.enemies_to_spawn <= 0:
-            return
-
-        side = random.choice(["top", "left", "right"])
-        if side == "top":
-            x = random.randint(50, WIDTH - 50)
-            y = -30
-        elif side == "left":
-            x = -30
-            y = random.randint(50, HEIGHT // 2)
-        else:
-            x = WIDTH + 30
-            y = random.randint(50, HEIGHT // 2)
-
-        enemy_type = random.choices(
-            [Enemy, FastEnemy, HeavyEnemy, SniperEnemy],
-            weights=[40, 30, 15, 15]
-        )[0]
-
-        self.enemies.append(enemy_type(x, y))
-        self.enemies_to_spawn -= 1
+        """Schedule the whole wave's spawn timeline from its own seeded stream"""
+        self.wave_timer = self.clock.get_ticks()
+        boss, timeline = self.waves.plan(self.wave, random.Random(self.run_seed * 1000003 + self.wave))
+        self.boss = Boss(self.wave) if boss else None
+        for at, kind, x, y in timeline:
+            self.timers.call_at(self.wave_timer + at, self.spawn_enemy, kind, x, y)
+        self.pending_spawns = len(timeline)
+
+    def spawn_enemy(self, kind, x, y):
+        """Timer callback for one entry of the wave timeline"""
+        self.enemies.spawn(kind, x, y)
+        self.pending_spawns -= 1
+
+    def despawn_powerup(self, powerup):
+        """Timer callback: an uncollected power-up's lifetime is over"""
+        if powerup in self.powerups:
+            self.powerups.remove(powerup)
 
     def create_explosion(self, x, y, color, count=15):
-        for _ in range(count):
-            self.particles.append(Particle(x, y, color))
+        self.particles.emit(x, y, color, max(1, round(count * self.quality.settings["particles"])))
 
     def update(self, events):
-        keys = pygame.key.get_pressed()
-        mouse_pos = pygame.mouse.get_pos()
-        mouse_buttons = pygame.mouse.get_pressed()
+        """Run one real-time frame from the live pygame input state"""
+        self.run_tick(InputState.poll(events))
+
+    def step(self, inputs):
+        """Advance the clock by one fixed timestep and simulate it"""
+        self.clock.advance(TICK_MS)
+        self.run_tick(inputs)
+
+    def replay(self, log):
+        """Re-run a recorded InputLog tick by tick at full speed.
+
+        The game needs a SimClock (e.g. headless=True); the clock is moved
+        to the recorded start time and advanced by each tick's elapsed time.
+        """
+        self.clock.micros = round(log.start_ticks * 1000)
+        self.start_game(log.num_players, seed=log.seed, upgrades=log.upgrades)
+        for inputs, elapsed_us in log:
+            if self.state != "playing":
+                break
+            self.clock.advance(elapsed_us / 1000)
+            self.run_tick(inputs)
 
-        # Update background elements
-        for star in self.stars:
-            star.update()
-        for debris in self.debris:
-            debris.update()
+    def record_tick(self, inputs):
+        now = self.clock.get_ticks()
+        self.input_log.append(inputs, round((now - self.log_ticks) * 1000))
+        self.log_ticks = now
 
-        if self.state == "menu":
+    def finish_recording(self):
+        if self.input_log is not None and self.record_dir:
+            try:
+                os.makedirs(self.record_dir, exist_ok=True)
+                self.input_log.save(os.path.join(self.record_dir, f"run_{self.run_seed}.ssil"))
+            except OSError as e:
+                print(f"Input log error: {e}")
+
+    def remember_positions(self):
+        """Keep each drawn object's position from before this tick to interpolate from"""
+        for entity in self.players + self.powerups + ([self.boss] if self.boss else []):
+            entity.prev_x = entity.x
+            entity.prev_y = entity.y
+
+    def run_tick(self, inputs):
+        profiler = self.profiler
+        if not self.headless:
+            self.remember_positions()
+        if self.network.connected:
+            self.network.poll()
+            profiler.lap("update.network")
+        if self.input_log is not None and self.state == "playing":
+            self.record_tick(inputs)
+
+        events = inputs.events
+        keys = inputs.keys
+        mouse_pos = inputs.mouse_pos
+        mouse_buttons = inputs.mouse_buttons
+
+        # Update background elements, finishing the build a slice per frame
+        if self.background:
+            if not self.background.ready and self.background.pump() and self.renderer:
+                self.renderer.invalidate()
+            self.background.update()
+        profiler.lap("update.background")
+
+        state = self.state
+        if state == "menu":
             self.update_menu(events, keys)
         elif self.state == "playing":
             self.update_playing(events, keys, mouse_pos, mouse_buttons)
@@ -987,6 +3157,7 @@ class Game:
             self.update_multiplayer_menu(events, keys)
         elif self.state == "join_game":
             self.update_join_game(events, keys)
+        profiler.lap("update." + state)
 
     def update_menu(self, events, keys):
         options = ["Single Player", "Local Co-op (2P)", "Local Co-op (3P)", "Online Multiplayer", "Shop", "Quit"]
@@ -1025,6 +3196,8 @@ class Game:
                     self.menu_selection = (self.menu_selection + 1) % len(options)
                 elif event.key == pygame.K_RETURN:
                     if self.menu_selection == 0:
+                        self.network.disconnect()
+                        self.peer_players.clear()
                         if self.network.host_game():
                             self.start_game(1, online=True)
                     elif self.menu_selection == 1:
@@ -1041,6 +3214,8 @@ class Game:
         for event in events:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN and self.ip_input:
+                    self.network.disconnect()
+                    self.peer_players.clear()
                     if self.network.join_game(self.ip_input):
                         self.start_game(1, online=True)
                 elif event.key == pygame.K_BACKSPACE:
@@ -1062,139 +3237,481 @@ class Game:
                     item = self.shop_items[self.shop_selection]
                     if self.credits >= item["cost"]:
                         self.credits -= item["cost"]
+                        self.upgrades[item["stat"]] += 1
                         self.save_data()
                 elif event.key == pygame.K_ESCAPE:
                     self.state = "menu"
                     self.menu_selection = 0
 
     def update_playing(self, events, keys, mouse_pos, mouse_buttons):
-        current_time = pygame.time.get_ticks()
+        current_time = self.clock.get_ticks()
 
         for event in events:
             if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 self.state = "menu"
+                self.finish_recording()
+                self.leave_online()
                 return
 
-        # Update players
+        if self.online_mode and not self.network.is_host:
+            self.update_client(InputState(keys, mouse_pos, mouse_buttons, events))
+            return
+
+        profiler = self.profiler
+        self.tick += 1
+        if self.online_mode:
+            self.receive_peer_messages()
+            profiler.lap("update.network")
+
+        # Fire due timers: power-up expiry and despawns, boss pattern switches, enemy spawns
+        self.timers.run(current_time)
+        profiler.lap("update.timers")
+
+        # Update players; remote players steer with the primary (WASD + mouse) controls
         for i, player in enumerate(self.players):
             if player.health > 0:
-                player.update(keys, mouse_pos, i)
+                slot, player_keys, player_mouse, player_buttons = i, keys, mouse_pos, mouse_buttons
+                if player.player_num >= self.num_local_players:
+                    remote = self.next_remote_input(player.player_num)
+                    slot, player_keys, player_mouse, player_buttons = \
+                        0, remote.keys, remote.mouse_pos, remote.mouse_buttons
+                player.move(player_keys, player_mouse, slot)
 
                 should_shoot = False
-                if i == 0:
-                    should_shoot = mouse_buttons[0]
-                elif i == 1:
-                    should_shoot = keys[pygame.K_SPACE]
-                elif i == 2:
-                    should_shoot = keys[pygame.K_b]
+                if slot == 0:
+                    should_shoot = player_buttons[0]
+                elif slot == 1:
+                    should_shoot = player_keys[pygame.K_SPACE]
+                elif slot == 2:
+                    should_shoot = player_keys[pygame.K_b]
 
                 if should_shoot:
-                    new_bullets = player.shoot()
-                    self.bullets.extend(new_bullets)
-
-        # Spawn enemies
-        if self.enemies_to_spawn > 0 and current_time - self.spawn_timer > 1000:
-            self.spawn_enemy()
-            self.spawn_timer = current_time
+                    player.shoot(self.bullets, current_time)
+        profiler.lap("update.players")
 
         # Update enemies
         alive_players = [p for p in self.players if p.health > 0]
-        for enemy in self.enemies[:]:
-            enemy.update(alive_players)
-            bullet = enemy.try_shoot(alive_players)
-            if bullet:
-                self.enemy_bullets.append(bullet)
+        self.enemies.update(alive_players, self.targeting, self.enemy_bullets, current_time)
+        profiler.lap("update.enemies")
 
         # Update boss
         if self.boss:
-            self.boss.update(alive_players)
-            new_bullets = self.boss.try_shoot(alive_players)
-            self.enemy_bullets.extend(new_bullets)
+            self.boss.update(alive_players, current_time, self.timers)
+            self.boss.try_shoot(alive_players, self.enemy_bullets, current_time)
+        profiler.lap("update.boss")
 
         # Update bullets
-        self.bullets = [b for b in self.bullets if b.update()]
-        self.enemy_bullets = [b for b in self.enemy_bullets if b.update()]
+        self.bullets.update()
+        self.enemy_bullets.update()
+        profiler.lap("update.bullets")
 
         # Update power-ups
         self.powerups = [p for p in self.powerups if p.update()]
+        profiler.lap("update.powerups")
 
         # Update particles
-        self.particles = [p for p in self.particles if p.update()]
+        self.particles.update()
+        profiler.lap("update.particles")
 
         # Check collisions
         self.check_collisions()
+        profiler.lap("update.collisions")
 
         # Check wave complete
-        if not self.enemies and not self.boss and self.enemies_to_spawn <= 0:
+        if not self.enemies and not self.boss and not self.pending_spawns:
             self.wave += 1
             self.start_wave()
 
         # Check game over
         if not alive_players:
             self.state = "game_over"
-            total_score = sum(p.score for p in self.players)
-            self.credits += total_score // 10
-            self.save_data()
+            # Remote players bank their own runs on their own machines
+            self.finish_run([p.score for p in self.players if p.player_num < self.num_local_players])
+            self.finish_recording()
+
+        if self.online_mode:
+            self.broadcast_snapshot()
+            if self.state == "game_over":
+                self.leave_online()
+
+    def leave_online(self):
+        """Close the session once a run ends, so nothing outlives it into an offline run"""
+        if self.online_mode:
+            self.network.disconnect()
+            self.peer_players.clear()
+
+    def add_remote_player(self, peer_id):
+        """Host side: give a newly joined peer a free ship slot"""
+        taken = {p.player_num for p in self.players}
+        free = [num for num in range(MAX_PLAYERS) if num not in taken]
+        if not free:
+            self.network.kick(peer_id)
+            return
+        num = free[0]
+        x, y = START_POSITIONS[num]
+        self.players.append(Player(x, y, num))
+        self.peer_players[peer_id] = num
+        self.network.send({"type": "hello", "player_num": num}, peer_id)
+
+    def remove_remote_player(self, peer_id):
+        num = self.peer_players.pop(peer_id, None)
+        self.peer_acks.pop(peer_id, None)
+        if num is None:
+            return
+        self.remote_inputs.pop(num, None)
+        self.remote_last.pop(num, None)
+        self.remote_seqs.pop(num, None)
+        self.players = [p for p in self.players if p.player_num != num]
+
+    def receive_peer_messages(self):
+        """Host side: admit and drop peers, collect their inputs and acks"""
+        for msg in self.network.get_messages():
+            peer_id = msg["peer"]
+            if msg["type"] == "join":
+                self.add_remote_player(peer_id)
+            elif msg["type"] == "leave":
+                self.remove_remote_player(peer_id)
+            elif msg["type"] == "input":
+                num = self.peer_players.get(peer_id)
+                if num is not None:
+                    inbox = self.remote_inputs.setdefault(num, deque())
+                    inbox.append((msg["seq"], decode_inputs(
+                        msg["keys"], msg["mouse_x"], msg["mouse_y"], msg["flags"])))
+                    if len(inbox) > MAX_INPUT_BACKLOG:
+                        inbox.popleft()
+            elif msg["type"] == "ack":
+                self.peer_acks[peer_id] = msg["tick"]
+
+    def next_remote_input(self, num):
+        """Host side: consume one queued input per tick, holding the last one when starved"""
+        inbox = self.remote_inputs.get(num)
+        if inbox:
+            seq, inputs = inbox.popleft()
+            self.remote_seqs[num] = seq
+            self.remote_last[num] = inputs
+            return inputs
+        return self.remote_last.get(num) or InputState()
+
+    def capture_snapshot(self, previous):
+        """Pack the replicated world state for this tick"""
+        snapshot = Snapshot(self.tick)
+        entities = snapshot.entities
+        entities["world"][0] = WORLD_RECORD.pack(0, self.wave, self.state == "game_over")
+
+        players = entities["players"]
+        for p in self.players:
+            powerups = p.shield_active | p.rapid_fire << 1 | p.spread_shot << 2 | p.damage_boost << 3
+            players[p.eid] = PLAYER_RECORD.pack(
+                p.eid, p.player_num, quantize(p.x), quantize(p.y), quantize_angle(p.angle),
+                int(p.health), int(p.max_health), p.score, powerups)
+
+        entities["enemies"] = self.enemies.records()
+
+        boss = self.boss
+        if boss:
+            entities["boss"][boss.eid] = BOSS_RECORD.pack(
+                boss.eid, quantize(boss.x), quantize(boss.y), quantize_angle(boss.angle),
+                int(boss.health), int(boss.max_health), boss.entering)
+
+        powerups = entities["powerups"]
+        for p in self.powerups:
+            powerups[p.eid] = POWERUP_RECORD.pack(
+                p.eid, PowerUp.TYPES.index(p.type), quantize(p.x), quantize(p.y), quantize_angle(p.angle))
+
+        for name in ("bullets", "enemy_bullets"):
+            previous_records = previous.entities[name] if previous else {}
+            entities[name] = getattr(self, name).records(self.tick, previous_records)
+        return snapshot
+
+    def broadcast_snapshot(self):
+        """Host side: send every peer the delta from the last snapshot it acked"""
+        if not self.peer_players:
+            return
+        if self.tick % SNAPSHOT_INTERVAL and self.state == "playing":
+            return
+        previous = next(reversed(self.snapshots.values()), None)
+        snapshot = self.capture_snapshot(previous)
+        self.snapshots[self.tick] = snapshot
+        while len(self.snapshots) > SNAPSHOT_HISTORY:
+            self.snapshots.popitem(last=False)
+
+        # Peers acking the same baseline share one encoded delta
+        deltas = {}
+        for peer_id in self.peer_players:
+            baseline = self.snapshots.get(self.peer_acks.get(peer_id))
+            baseline_tick = baseline.tick if baseline else 0
+            msg = deltas.get(baseline_tick)
+            if msg is None:
+                removed, changed = snapshot.delta(baseline)
+                msg = deltas[baseline_tick] = {"type": "snapshot", "tick": snapshot.tick,
+                                               "baseline": baseline_tick,
+                                               "removed": removed, "changed": changed}
+            input_seq = self.remote_seqs.get(self.peer_players[peer_id], 0)
+            self.network.send(dict(msg, input_seq=input_seq), peer_id)
+
+    def update_client(self, inputs):
+        """Online client: predict the local ship, render everything else interpolated.
+
+        Inputs are applied to the local ship as soon as they are sent and
+        kept until the host reports them applied; each new snapshot resets
+        the ship to its authoritative state and replays the unacked ones.
+        Other entities are drawn interp_delay behind the newest snapshot,
+        blended between the two buffered snapshots around that time.
+        """
+        if not self.network.connected:
+            self.state = "menu"
+            return
 
-    def check_collisions(self):
-        for bullet in self.bullets[:]:
-            for enemy in self.enemies[:]:
-                dist = math.hypot(bullet.x - enemy.x, bullet.y - enemy.y)
-                if dist < bullet.radius + enemy.radius:
-                    enemy.health -= bullet.damage
-                    if bullet in self.bullets:
-                        self.bullets.remove(bullet)
-
-                    if enemy.health <= 0:
-                        self.create_explosion(enemy.x, enemy.y, enemy.color)
-                        for p in self.players:
-                            p.score += enemy.points
+        key_bits, mx, my, flags = encode_inputs(inputs)
+        self.input_seq += 1
+        self.network.send({"type": "input", "seq": self.input_seq, "keys": key_bits,
+                           "mouse_x": mx, "mouse_y": my, "flags": flags})
+        self.pending_inputs.append((self.input_seq, inputs))
+
+        latest = acked_seq = None
+        for msg in self.network.get_messages():
+            if msg["type"] == "hello":
+                self.local_player = msg["player_num"]
+            elif msg["type"] == "snapshot":
+                if msg["baseline"]:
+                    baseline = self.snapshots.get(msg["baseline"])
+                    if baseline is None:
+                        continue
+                else:
+                    baseline = Snapshot(0)
+                latest = baseline.patched(msg["tick"], msg["removed"], msg["changed"])
+                acked_seq = msg["input_seq"]
+                self.snapshots[latest.tick] = latest
+                while len(self.snapshots) > SNAPSHOT_HISTORY:
+                    self.snapshots.popitem(last=False)
+                self.network.send({"type": "ack", "tick": latest.tick})
+
+        if not self.snapshots:
+            return
+        if latest is not None:
+            self.reconcile(latest, acked_seq)
+        elif self.predicted is not None:
+            self.predicted.move(inputs.keys, inputs.mouse_pos, 0)
+
+        newest = next(reversed(self.snapshots))
+        self.tick = newest
+        target = newest - self.interp_delay / TICK_MS
+        self.render_tick += 1
+        if abs(self.render_tick - target) > SNAPSHOT_INTERVAL * 4:
+            self.render_tick = target
+        else:
+            self.render_tick += (target - self.render_tick) * 0.05
+        self.interpolate(self.render_tick)
+        self.particles.update()
+
+        if latest is not None:
+            self.apply_world(latest)
+
+    def reconcile(self, snapshot, acked_seq):
+        """Reset the predicted ship to the host's state and replay unacked inputs"""
+        pending = self.pending_inputs
+        while pending and pending[0][0] <= acked_seq:
+            pending.popleft()
+
+        record = None
+        for candidate in snapshot.entities["players"].values():
+            if candidate[4] == self.local_player:
+                record = candidate
+        if record is None:
+            self.predicted = None
+            return
 
-                        if random.random() < 0.2:
-                            self.powerups.append(PowerUp(enemy.x, enemy.y))
+        if self.predicted is None:
+            self.predicted = Player(0, 0, self.local_player)
+        predicted = self.predicted
+        predicted.x, predicted.y, predicted.angle = interpolate_pose("players", record, None, 0)
+        for _, inputs in pending:
+            predicted.move(inputs.keys, inputs.mouse_pos, 0)
+
+    def interpolate(self, render_tick):
+        """Client side: rebuild the world as it was at render_tick, reusing objects by eid"""
+        before = after = None
+        for snapshot in self.snapshots.values():
+            if snapshot.tick <= render_tick:
+                before = snapshot
+            else:
+                after = snapshot
+                break
+        if before is None:
+            before, after = after, None
+        t = (render_tick - before.tick) / (after.tick - before.tick) if after else 0
+        entities = before.entities
+        targets = after.entities if after else {name: {} for name, _ in SNAPSHOT_KINDS}
+        previous = self.replicas
+        replicas = {}
+
+        players = []
+        for eid, record in entities["players"].items():
+            _, num, _, _, _, health, max_health, score, powerups = PLAYER_RECORD.unpack(record)
+            player = previous.get(eid) or Player(0, 0, num)
+            player.eid = eid
+            player.x, player.y, player.angle = interpolate_pose("players", record, targets["players"].get(eid), t)
+            player.health, player.max_health, player.score = health, max_health, score
+            player.shield_active = bool(powerups & 1)
+            player.rapid_fire = bool(powerups & 2)
+            player.spread_shot = bool(powerups & 4)
+            player.damage_boost = bool(powerups & 8)
+            if num == self.local_player and self.predicted is not None:
+                player.x, player.y, player.angle = self.predicted.x, self.predicted.y, self.predicted.angle
+            players.append(player)
+            replicas[eid] = player
+        self.players = sorted(players, key=lambda p: p.player_num)
+
+        self.enemies.restore(entities["enemies"], targets["enemies"], t)
 
-                        self.enemies.remove(enemy)
-                    break
+        self.boss = None
+        for eid, record in entities["boss"].items():
+            _, _, _, _, health, max_health, entering = BOSS_RECORD.unpack(record)
+            boss = previous.get(eid) or Boss(self.wave)
+            boss.eid = eid
+            boss.x, boss.y, boss.angle = interpolate_pose("boss", record, targets["boss"].get(eid), t)
+            boss.health, boss.max_health, boss.entering = health, max_health, bool(entering)
+            self.boss = replicas[eid] = boss
+
+        powerups = []
+        for eid, record in entities["powerups"].items():
+            kind = record[4]
+            powerup = previous.get(eid) or PowerUp(0, 0, 0, PowerUp.TYPES[kind])
+            powerup.eid = eid
+            powerup.x, powerup.y, powerup.angle = interpolate_pose("powerups", record, targets["powerups"].get(eid), t)
+            powerups.append(powerup)
+            replicas[eid] = powerup
+        self.powerups = powerups
+        # New replicas start drawn where they are, not lerped in from their placeholder position
+        for eid, entity in replicas.items():
+            if eid not in previous:
+                entity.prev_x, entity.prev_y = entity.x, entity.y
+        self.replicas = replicas
+
+        # Bullet records extrapolate exactly, so take the newer snapshot's set
+        for name in ("bullets", "enemy_bullets"):
+            records = dict(entities[name])
+            records.update(targets[name])
+            getattr(self, name).restore(records.values(), render_tick)
+
+    def apply_world(self, snapshot):
+        """Client side: wave and game over follow the newest snapshot"""
+        for record in snapshot.entities["world"].values():
+            _, self.wave, game_over = WORLD_RECORD.unpack(record)
+            if game_over:
+                self.state = "game_over"
+                records = [PLAYER_RECORD.unpack(r) for r in snapshot.entities["players"].values()]
+                self.finish_run([r[7] for r in records if r[1] == self.local_player])
+                self.finish_recording()
+                self.leave_online()
 
-            if self.boss and bullet in self.bullets:
-                dist = math.hypot(bullet.x - self.boss.x, bullet.y - self.boss.y)
-                if dist < bullet.radius + self.boss.radius:
-                    self.boss.health -= bullet.damage
-                    self.bullets.remove(bullet)
+    def check_collisions(self):
+        current_time = self.clock.get_ticks()
+        enemies = self.enemies
+        n = enemies.count
+        ex, ey, er = enemies.x[:n], enemies.y[:n], enemies.radius[:n]
+        health, kinds = enemies.health, enemies.kind
+
+        # Hits are marked here and removed in one pass at the end
+        dead_enemies = set()
+
+        # The boss, if any, is the last target so enemies are tried first
+        boss_index = n
+        spent_bullets = []
+        bullets = self.bullets
+        if self.boss:
+            hits = bullets.overlaps(np.append(ex, self.boss.x), np.append(ey, self.boss.y),
+                                    np.append(er, self.boss.radius))
+        else:
+            hits = bullets.overlaps(ex, ey, er)
+        for bi, candidates in hits:
+            for ti in candidates:
+                if ti == boss_index:
+                    if not self.boss:
+                        continue
+                    self.boss.health -= int(bullets.damage[bi])
+                    spent_bullets.append(bi)
 
                     if self.boss.health <= 0:
                         self.create_explosion(self.boss.x, self.boss.y, PURPLE, 30)
                         for p in self.players:
                             p.score += self.boss.points
+                        self.timers.cancel(self.boss.pattern_switch)
                         self.boss = None
+                        self.run_boss_kills += 1
+                    break
 
-        for bullet in self.enemy_bullets[:]:
-            for player in self.players:
+                if ti in dead_enemies:
+                    continue
+                health[ti] -= int(bullets.damage[bi])
+                spent_bullets.append(bi)
+
+                if health[ti] <= 0:
+                    kind = ENEMY_KINDS[kinds[ti]]
+                    x, y = float(ex[ti]), float(ey[ti])
+                    self.create_explosion(x, y, kind["color"])
+                    for p in self.players:
+                        p.score += kind["points"]
+
+                    if self.rng.random() < 0.2:
+                        powerup = PowerUp(x, y, current_time, rng=self.rng)
+                        powerup.despawn = self.timers.call_at(current_time + powerup.lifetime,
+                                                              self.despawn_powerup, powerup)
+                        self.powerups.append(powerup)
+
+                    dead_enemies.add(ti)
+                    self.run_kills += 1
+                break
+
+        players = self.players
+        spent_enemy_bullets = []
+        enemy_bullets = self.enemy_bullets
+        hits = enemy_bullets.overlaps([p.x for p in players], [p.y for p in players],
+                                      [p.radius for p in players])
+        for bi, candidates in hits:
+            for pi in candidates:
+                player = players[pi]
                 if player.health <= 0:
                     continue
-                dist = math.hypot(bullet.x - player.x, bullet.y - player.y)
-                if dist < bullet.radius + player.radius:
-                    player.take_damage(bullet.damage)
-                    if bullet in self.enemy_bullets:
-                        self.enemy_bullets.remove(bullet)
-                    break
+                player.take_damage(int(enemy_bullets.damage[bi]))
+                spent_enemy_bullets.append(bi)
+                break
 
-        for player in self.players:
-            if player.health <= 0:
-                continue
-            for enemy in self.enemies:
-                dist = math.hypot(player.x - enemy.x, player.y - enemy.y)
-                if dist < player.radius + enemy.radius:
+        if n:
+            alive = np.ones(n, bool)
+            alive[list(dead_enemies)] = False
+            for player in self.players:
+                if player.health <= 0:
+                    continue
+                dx, dy = player.x - ex, player.y - ey
+                reach = player.radius + er
+                for _ in range(int(np.count_nonzero((dx * dx + dy * dy < reach * reach) & alive))):
                     player.take_damage(20)
 
+        powerups = self.powerups
+        powerup_grid = self.powerup_grid
+        powerup_grid.build(powerups)
+        collected = set()
         for player in self.players:
             if player.health <= 0:
                 continue
-            for powerup in self.powerups[:]:
-                dist = math.hypot(player.x - powerup.x, player.y - powerup.y)
-                if dist < player.radius + powerup.radius:
-                    player.apply_powerup(powerup.type)
-                    self.powerups.remove(powerup)
+            px, py, pr = player.x, player.y, player.radius
+            for pi in powerup_grid.query(px, py, pr):
+                if pi in collected:
+                    continue
+                powerup = powerups[pi]
+                dx, dy = px - powerup.x, py - powerup.y
+                reach = pr + powerup.radius
+                if dx * dx + dy * dy < reach * reach:
+                    player.apply_powerup(powerup.type, current_time, self.timers)
+                    self.timers.cancel(powerup.despawn)
+                    collected.add(pi)
+
+        bullets.kill(spent_bullets)
+        enemy_bullets.kill(spent_enemy_bullets)
+        enemies.kill(dead_enemies)
+        if collected:
+            self.powerups = [p for i, p in enumerate(powerups) if i not in collected]
 
     def update_game_over(self, events, keys):
         for event in events:
@@ -1203,25 +3720,29 @@ class Game:
                     self.state = "menu"
                     self.menu_selection = 0
 
-    def draw(self):
-        # Draw nebula background
-        screen.blit(self.background, (0, 0))
-
-        # Draw stars
-        for star in self.stars:
-            star.draw(screen)
-
-        # Draw debris
-        for debris in self.debris:
-            debris.draw(screen)
+    def draw(self, alpha=1.0):
+        """Render the current state; alpha (0..1] poses moving things between the last two ticks"""
+        if self.headless:
+            return
 
-        # Draw planet
-        screen.blit(self.planet, (self.planet_x - 60, self.planet_y - 60))
+        # Draw nebula, parallax stars, debris and planet
+        profiler = self.profiler
+        renderer = self.renderer
+        if renderer:
+            if self.state != self.drawn_state:
+                renderer.invalidate()
+                self.drawn_state = self.state
+            renderer.begin(screen, self.background.backdrop())
+            self.background.draw_debris(screen, renderer.current, self.quality.settings["debris"], alpha)
+        else:
+            settings = self.quality.settings
+            self.background.draw(screen, settings["stars"], settings["debris"], alpha)
+        profiler.lap("draw.background")
 
         if self.state == "menu":
             self.draw_menu()
         elif self.state == "playing":
-            self.draw_playing()
+            self.draw_playing(alpha)
         elif self.state == "shop":
             self.draw_shop()
         elif self.state == "game_over":
@@ -1230,116 +3751,155 @@ class Game:
             self.draw_multiplayer_menu()
         elif self.state == "join_game":
             self.draw_join_game()
+        profiler.lap("draw." + self.state)
 
-        pygame.display.flip()
+        overlay = profiler.draw(screen)
+        if overlay:
+            self.mark(overlay)
+        profiler.lap("draw.profiler")
+
+        if renderer:
+            renderer.present()
+        else:
+            pygame.display.flip()
+        profiler.lap("draw.present")
 
     def draw_menu(self):
-        title = large_font.render("SPACE SHOOTER 2D", True, CYAN)
-        screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 100))
+        title = text_cache.render(large_font, "SPACE SHOOTER 2D", True, CYAN)
+        self.mark(screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 100)))
 
-        subtitle = font.render("Classic Arcade Edition", True, WHITE)
-        screen.blit(subtitle, (WIDTH // 2 - subtitle.get_width() // 2, 170))
+        subtitle = text_cache.render(font, "Classic Arcade Edition", True, WHITE)
+        self.mark(screen.blit(subtitle, (WIDTH // 2 - subtitle.get_width() // 2, 170)))
 
         options = ["Single Player", "Local Co-op (2P)", "Local Co-op (3P)", "Online Multiplayer", "Shop", "Quit"]
 
         for i, option in enumerate(options):
             color = YELLOW if i == self.menu_selection else WHITE
-            text = font.render(option, True, color)
+            text = text_cache.render(font, option, True, color)
             y = 260 + i * 50
-            screen.blit(text, (WIDTH // 2 - text.get_width() // 2, y))
+            self.mark(screen.blit(text, (WIDTH // 2 - text.get_width() // 2, y)))
 
             if i == self.menu_selection:
-                pygame.draw.polygon(screen, YELLOW, [
+                self.mark(pygame.draw.polygon(screen, YELLOW, [
                     (WIDTH // 2 - text.get_width() // 2 - 30, y + 10),
                     (WIDTH // 2 - text.get_width() // 2 - 15, y + 5),
                     (WIDTH // 2 - text.get_width() // 2 - 15, y + 15)
-                ])
+                ]))
 
-        credits_text = small_font.render(f"Credits: {self.credits}", True, GREEN)
-        screen.blit(credits_text, (10, HEIGHT - 30))
+        self.mark(text_cache.draw(screen, small_font, f"Credits: {self.credits}", GREEN, (10, HEIGHT - 30)))
 
-        controls = small_font.render("Arrow Keys to Navigate | Enter to Select", True, WHITE)
-        screen.blit(controls, (WIDTH // 2 - controls.get_width() // 2, HEIGHT - 30))
+        controls = text_cache.render(small_font, "Arrow Keys to Navigate | Enter to Select", True, WHITE)
+        self.mark(screen.blit(controls, (WIDTH // 2 - controls.get_width() // 2, HEIGHT - 30)))
 
     def draw_multiplayer_menu(self):
-        title = large_font.render("ONLINE MULTIPLAYER", True, CYAN)
-        screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 100))
+        title = text_cache.render(large_font, "ONLINE MULTIPLAYER", True, CYAN)
+        self.mark(screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 100)))
 
         options = ["Host Game", "Join Game", "Back"]
 
         for i, option in enumerate(options):
             color = YELLOW if i == self.menu_selection else WHITE
-            text = font.render(option, True, color)
+            text = text_cache.render(font, option, True, color)
             y = 250 + i * 60
-            screen.blit(text, (WIDTH // 2 - text.get_width() // 2, y))
+            self.mark(screen.blit(text, (WIDTH // 2 - text.get_width() // 2, y)))
 
     def draw_join_game(self):
-        title = large_font.render("JOIN GAME", True, CYAN)
-        screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 100))
+        title = text_cache.render(large_font, "JOIN GAME", True, CYAN)
+        self.mark(screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 100)))
 
-        prompt = font.render("Enter Host IP Address:", True, WHITE)
-        screen.blit(prompt, (WIDTH // 2 - prompt.get_width() // 2, 250))
+        prompt = text_cache.render(font, "Enter Host IP Address:", True, WHITE)
+        self.mark(screen.blit(prompt, (WIDTH // 2 - prompt.get_width() // 2, 250)))
 
         box_width = 300
         box_x = WIDTH // 2 - box_width // 2
-        pygame.draw.rect(screen, WHITE, (box_x, 300, box_width, 50), 2)
+        self.mark(pygame.draw.rect(screen, WHITE, (box_x, 300, box_width, 50), 2))
 
-        ip_text = font.render(self.ip_input + "_", True, CYAN)
-        screen.blit(ip_text, (box_x + 10, 310))
+        ip_text = text_cache.render(font, self.ip_input + "_", True, CYAN)
+        self.mark(screen.blit(ip_text, (box_x + 10, 310)))
 
-        hint = small_font.render("Press Enter to connect | Escape to go back", True, WHITE)
-        screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, 400))
+        hint = text_cache.render(small_font, "Press Enter to connect | Escape to go back", True, WHITE)
+        self.mark(screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, 400)))
 
     def draw_shop(self):
-        title = large_font.render("UPGRADE SHOP", True, YELLOW)
-        screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 50))
+        title = text_cache.render(large_font, "UPGRADE SHOP", True, YELLOW)
+        self.mark(screen.blit(title, (WIDTH // 2 - title.get_width() // 2, 50)))
 
-        credits_text = font.render(f"Credits: {self.credits}", True, GREEN)
-        screen.blit(credits_text, (WIDTH // 2 - credits_text.get_width() // 2, 120))
+        self.mark(text_cache.draw(screen, font, f"Credits: {self.credits}", GREEN, (WIDTH // 2, 120), centered=True))
 
         for i, item in enumerate(self.shop_items):
             color = YELLOW if i == self.shop_selection else WHITE
-            text = font.render(f"{item['name']} - {item['cost']} credits", True, color)
             y = 200 + i * 60
-            screen.blit(text, (WIDTH // 2 - text.get_width() // 2, y))
+            level = self.upgrades[item["stat"]]
+            self.mark(text_cache.draw(screen, font, f"{item['name']} (Lv {level}) - {item['cost']} credits", color,
+                                      (WIDTH // 2, y), centered=True))
+
+        hint = text_cache.render(small_font, "Enter to Buy | Escape to Return", True, WHITE)
+        self.mark(screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT - 50)))
 
-        hint = small_font.render("Enter to Buy | Escape to Return", True, WHITE)
-        screen.blit(hint, (WIDTH // 2 - hint.get_width() // 2, HEIGHT - 50))
+    def mark(self, rect):
+        """Record a drawn area for the dirty-rect renderer, if enabled"""
+        if self.renderer:
+            self.renderer.mark(rect)
+        return rect
+
+    def draw_playing(self, alpha=1.0):
+        dirty = self.renderer.current if self.renderer else None
+        profiler = self.profiler
 
-    def draw_playing(self):
         # Draw particles
-        for particle in self.particles:
-            particle.draw(screen)
+        self.particles.draw(screen, dirty, alpha)
+        profiler.lap("draw.particles")
 
         # Draw power-ups
         for powerup in self.powerups:
-            powerup.draw(screen)
+            self.mark(powerup.draw(screen, alpha))
+        profiler.lap("draw.powerups")
 
         # Draw enemies
-        for enemy in self.enemies:
-            enemy.draw(screen)
+        self.enemies.draw(screen, dirty, alpha)
+        profiler.lap("draw.enemies")
 
         # Draw boss
         if self.boss:
-            self.boss.draw(screen)
+            self.mark(self.boss.draw(screen, alpha))
+        profiler.lap("draw.boss")
 
         # Draw bullets
-        for bullet in self.bullets:
-            bullet.draw(screen)
-        for bullet in self.enemy_bullets:
-            bullet.draw(screen)
+        self.bullets.draw(screen, dirty, alpha)
+        self.enemy_bullets.draw(screen, dirty, alpha)
+        profiler.lap("draw.bullets")
 
         # Draw players
+        detail = self.quality.settings["ship_detail"]
         for player in self.players:
             if player.health > 0:
-                player.draw(screen)
+                self.mark(player.draw(screen, detail, alpha))
+        profiler.lap("draw.players")
 
         # Draw HUD
         self.draw_hud()
+        profiler.lap("draw.hud")
+
+    def entity_counts(self):
+        return {
+            "players": sum(1 for p in self.players if p.health > 0),
+            "enemies": len(self.enemies),
+            "boss": 1 if self.boss else 0,
+            "bullets": len(self.bullets),
+            "enemy_bullets": len(self.enemy_bullets),
+            "powerups": len(self.powerups),
+            "particles": len(self.particles)
+        }
 
     def draw_hud(self):
-        wave_text = font.render(f"Wave: {self.wave}", True, WHITE)
-        screen.blit(wave_text, (WIDTH // 2 - wave_text.get_width() // 2, 10))
+        # Text values refresh once per hud_interval ticks; bars stay live
+        block = self.tick // self.quality.settings["hud_interval"]
+        text = self.hud_text
+        if text is None or block != self.hud_block or len(text[1]) != len(self.players):
+            text = self.hud_text = (f"Wave: {self.wave}", [f"Score: {player.score}" for player in self.players])
+            self.hud_block = block
+        wave_text, score_texts = text
+        self.mark(text_cache.draw(screen, font, wave_text, WHITE, (WIDTH // 2, 10), centered=True))
 
         for i, player in enumerate(self.players):
             x = 10 + i * 200
@@ -1349,54 +3909,83 @@ class Game:
             bar_height = 15
             health_pct = max(0, player.health / player.max_health)
 
-            pygame.draw.rect(screen, (50, 50, 50), (x, y, bar_width, bar_height))
-            pygame.draw.rect(screen, CYAN, (x, y, bar_width * health_pct, bar_height))
-            pygame.draw.rect(screen, WHITE, (x, y, bar_width, bar_height), 1)
+            self.mark(pygame.draw.rect(screen, (50, 50, 50), (x, y, bar_width, bar_height)))
+            self.mark(pygame.draw.rect(screen, CYAN, (x, y, bar_width * health_pct, bar_height)))
+            self.mark(pygame.draw.rect(screen, WHITE, (x, y, bar_width, bar_height), 1))
 
-            label = small_font.render(f"P{i + 1}", True, CREAM)
-            screen.blit(label, (x, y - 20))
+            label = text_cache.render(small_font, f"P{i + 1}", True, CREAM)
+            self.mark(screen.blit(label, (x, y - 20)))
 
-            score_text = small_font.render(f"Score: {player.score}", True, WHITE)
-            screen.blit(score_text, (x, y + 20))
+            self.mark(text_cache.draw(screen, small_font, score_texts[i], WHITE, (x, y + 20)))
 
     def draw_game_over(self):
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        screen.blit(overlay, (0, 0))
+        if self.overlay is None:
+            self.overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+            self.overlay.fill((0, 0, 0, 180))
+        self.mark(screen.blit(self.overlay, (0, 0)))
 
-        game_over_text = large_font.render("GAME OVER", True, RED)
-        screen.blit(game_over_text, (WIDTH // 2 - game_over_text.get_width() // 2, 150))
+        game_over_text = text_cache.render(large_font, "GAME OVER", True, RED)
+        self.mark(screen.blit(game_over_text, (WIDTH // 2 - game_over_text.get_width() // 2, 150)))
 
         total_score = sum(p.score for p in self.players)
-        score_text = font.render(f"Total Score: {total_score}", True, WHITE)
-        screen.blit(score_text, (WIDTH // 2 - score_text.get_width() // 2, 250))
-
-        wave_text = font.render(f"Reached Wave: {self.wave}", True, WHITE)
-        screen.blit(wave_text, (WIDTH // 2 - wave_text.get_width() // 2, 300))
+        self.mark(text_cache.draw(screen, font, f"Total Score: {total_score}", WHITE, (WIDTH // 2, 250), centered=True))
+        self.mark(text_cache.draw(screen, font, f"Reached Wave: {self.wave}", WHITE, (WIDTH // 2, 300), centered=True))
 
         credits_earned = total_score // 10
-        credits_text = font.render(f"Credits Earned: {credits_earned}", True, GREEN)
-        screen.blit(credits_text, (WIDTH // 2 - credits_text.get_width() // 2, 350))
+        self.mark(text_cache.draw(screen, font, f"Credits Earned: {credits_earned}", GREEN, (WIDTH // 2, 350),
+                                  centered=True))
 
-        continue_text = font.render("Press Enter to Continue", True, YELLOW)
-        screen.blit(continue_text, (WIDTH // 2 - continue_text.get_width() // 2, 450))
+        continue_text = text_cache.render(font, "Press Enter to Continue", True, YELLOW)
+        self.mark(screen.blit(continue_text, (WIDTH // 2 - continue_text.get_width() // 2, 450)))
 
 
 async def main():
-    game = Game()
+    init_display()
+    dirty_rects = os.environ.get("SPACE_SHOOTER_DIRTY_RECTS", "1" if sys.platform == "emscripten" else "0")
+    profiler = Profiler(trace_path=os.environ.get("SPACE_SHOOTER_PROFILE"))
+    # "auto" adapts detail to frame time; 0 (best) to 3 pins a level
+    quality_level = os.environ.get("SPACE_SHOOTER_QUALITY", "auto")
+    quality = QualityScaler(None if quality_level == "auto" else int(quality_level))
+    # The game clock only moves with simulated ticks, so a stall pauses gameplay instead of skipping it
+    game = Game(clock=SimClock(pygame.time.get_ticks()), record_dir=os.environ.get("SPACE_SHOOTER_RECORD_DIR"),
+                dirty_rects=dirty_rects == "1", profiler=profiler, quality=quality)
     running = True
+    accumulator = 0.0
+    last = time.perf_counter()
+    pending = []
 
     while running:
+        profiler.begin_frame()
+        frame_start = time.perf_counter()
         events = pygame.event.get()
         for event in events:
             if event.type == pygame.QUIT:
                 running = False
-
-        game.update(events)
-        game.draw()
-        clock.tick(FPS)
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle()
+        profiler.lap("events")
+        pending.extend(events)
+
+        # Fixed-step simulation: run every whole tick that real time owes, up to MAX_CATCHUP_TICKS,
+        # then draw between the last two ticks by the leftover fraction
+        now = time.perf_counter()
+        accumulator = min(accumulator + (now - last) * 1000, MAX_CATCHUP_TICKS * TICK_MS)
+        last = now
+        while accumulator >= TICK_MS:
+            game.step(InputState.poll(pending))
+            pending = []
+            accumulator -= TICK_MS
+        game.draw(accumulator / TICK_MS)
+        # Events, simulation and drawing only: the tick's sleep and the browser's frame wait are not work
+        quality.record((time.perf_counter() - frame_start) * 1000)
+        clock.tick(MAX_RENDER_FPS)
         await asyncio.sleep(0)
+        profiler.lap("idle")
+        profiler.end_frame(game.entity_counts)
 
+    profiler.close_trace()
+    if game.store:
+        game.store.close()
     pygame.quit()
 
 
@@ -0,0 +1,255 @@
+"""Run many seeded headless games across a process pool and aggregate stats
+
+Run with: python simulate.py --games 200 --ai scripted [--waves waves.json] [--output stats.json]
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import signal
+import statistics
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame  # noqa: E402
+
+import main  # noqa: E402
+
+# Per local player slot: (up, down, left, right) movement keys
+MOVE_KEYS = [
+    (pygame.K_w, pygame.K_s, pygame.K_a, pygame.K_d),
+    (pygame.K_i, pygame.K_k, pygame.K_j, pygame.K_l),
+    (pygame.K_t, pygame.K_g, pygame.K_f, pygame.K_h),
+]
+# Keyboard aim keys for slots without a mouse
+AIM_KEYS = [
+    None,
+    (pygame.K_UP, pygame.K_DOWN, pygame.K_LEFT, pygame.K_RIGHT),
+    (pygame.K_KP8, pygame.K_KP2, pygame.K_KP4, pygame.K_KP6),
+]
+FIRE_KEYS = [None, pygame.K_SPACE, pygame.K_b]
+
+DEFAULT_MAX_TICKS = main.FPS * 60 * 30
+# Live entity counts tracked per wave, as peaks
+PEAK_COUNTS = ("enemies", "enemy_bullets", "bullets", "particles")
+
+
+def press_direction(pressed, keys, dx, dy, dead_zone=0.3):
+    """Add the keys approximating direction (dx, dy) to the pressed set"""
+    up, down, left, right = keys
+    length = math.hypot(dx, dy)
+    if length == 0:
+        return
+    dx, dy = dx / length, dy / length
+    if dy < -dead_zone: pressed.add(up)
+    if dy > dead_zone: pressed.add(down)
+    if dx < -dead_zone: pressed.add(left)
+    if dx > dead_zone: pressed.add(right)
+
+
+class RandomAI:
+    """Wanders in random directions and fires at random points"""
+    def __init__(self, slot, rng):
+        self.slot = slot
+        self.rng = rng
+        self.move = (0, 0)
+        self.aim = (main.WIDTH // 2, 0)
+        self.hold = 0
+
+    def control(self, game, player, pressed):
+        if self.hold <= 0:
+            self.move = (self.rng.uniform(-1, 1), self.rng.uniform(-1, 1))
+            self.aim = (self.rng.uniform(0, main.WIDTH), self.rng.uniform(0, main.HEIGHT))
+            self.hold = self.rng.randint(10, 60)
+        self.hold -= 1
+        press_direction(pressed, MOVE_KEYS[self.slot], *self.move)
+        return self.aim, True
+
+
+class ScriptedAI:
+    """Aims at the nearest enemy and backs away from anything too close"""
+    def __init__(self, slot, rng):
+        self.slot = slot
+        self.rng = rng
+
+    def control(self, game, player, pressed):
+        enemies = game.enemies
+        n = enemies.count
+        targets = list(zip(enemies.x[:n].tolist(), enemies.y[:n].tolist()))
+        if game.boss:
+            targets.append((game.boss.x, game.boss.y))
+        if not targets:
+            press_direction(pressed, MOVE_KEYS[self.slot],
+                            main.WIDTH // 2 - player.x, main.HEIGHT - 100 - player.y)
+            return (player.x, 0), False
+
+        tx, ty = min(targets, key=lambda t: math.hypot(t[0] - player.x, t[1] - player.y))
+        dx, dy = player.x - tx, player.y - ty
+        dist = math.hypot(dx, dy)
+
+        # Dodge the closest incoming enemy bullet, otherwise keep some distance
+        bullets = game.enemy_bullets
+        if bullets.count:
+            n = bullets.count
+            bx = bullets.x[:n] - player.x
+            by = bullets.y[:n] - player.y
+            closest = int((bx * bx + by * by).argmin())
+            if math.hypot(bx[closest], by[closest]) < 80:
+                press_direction(pressed, MOVE_KEYS[self.slot], by[closest], -bx[closest])
+                return (tx, ty), True
+
+        if dist < 200:
+            press_direction(pressed, MOVE_KEYS[self.slot], dx, dy)
+        return (tx, ty), True
+
+
+AIS = {"random": RandomAI, "scripted": ScriptedAI}
+
+
+def build_inputs(game, controllers):
+    pressed = set()
+    mouse_pos = (0, 0)
+    fire = False
+    for slot, controller in enumerate(controllers):
+        player = game.players[slot]
+        if player.health <= 0:
+            continue
+        aim, shoot = controller.control(game, player, pressed)
+        if slot == 0:
+            mouse_pos = (int(aim[0]), int(aim[1]))
+            fire = shoot
+        else:
+            press_direction(pressed, AIM_KEYS[slot], aim[0] - player.x, aim[1] - player.y)
+            if shoot:
+                pressed.add(FIRE_KEYS[slot])
+    return main.InputState(main.KeyState(pressed), mouse_pos, (fire, False, False))
+
+
+def init_worker():
+    # pygame.init() installs an SDL SIGTERM handler that Pool.terminate() can't get past
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+
+def run_game(job):
+    """Play one seeded headless game to game over (or max_ticks)"""
+    seed, ai, num_players, max_ticks, waves_path = job
+    rng = random.Random(seed)
+    game = main.Game(headless=True, waves=main.WaveTable.load(waves_path))
+    game.start_game(num_players, seed=seed)
+    controllers = [AIS[ai](slot, rng) for slot in range(num_players)]
+
+    boss_kills = {}
+    boss_seen = set()
+    boss_wave = boss_start = None
+    wave_peaks = {}
+    ticks = 0
+    while game.state == "playing" and ticks < max_ticks:
+        game.step(build_inputs(game, controllers))
+        ticks += 1
+
+        peaks = wave_peaks.setdefault(game.wave, dict.fromkeys(PEAK_COUNTS, 0))
+        for name in PEAK_COUNTS:
+            peaks[name] = max(peaks[name], len(getattr(game, name)))
+
+        now = game.clock.get_ticks()
+        if game.boss and boss_start is None:
+            boss_wave, boss_start = game.wave, now
+            boss_seen.add(boss_wave)
+        elif boss_start is not None and not game.boss:
+            boss_kills[boss_wave] = now - boss_start
+            boss_wave = boss_start = None
+
+    score = sum(p.score for p in game.players)
+    return {
+        "seed": seed,
+        "wave": game.wave,
+        "score": score,
+        "credits": score // 10,
+        "died": game.state == "game_over",
+        "time_to_death": game.clock.get_ticks() if game.state == "game_over" else None,
+        "ticks": ticks,
+        "boss_seen": sorted(boss_seen),
+        "boss_kills": boss_kills,
+        "wave_peaks": wave_peaks,
+    }
+
+
+def describe(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "median": statistics.median(ordered),
+        "min": ordered[0],
+        "max": ordered[-1],
+        "p90": ordered[min(len(ordered) - 1, int(len(ordered) * 0.9))],
+    }
+
+
+def aggregate(results):
+    bosses = {}
+    peaks = {}
+    for result in results:
+        for wave, counts in result["wave_peaks"].items():
+            for name, peak in counts.items():
+                peaks.setdefault(int(wave), {}).setdefault(name, []).append(peak)
+        for wave in result["boss_seen"]:
+            bosses.setdefault(wave, {"encounters": 0, "kill_times": []})["encounters"] += 1
+        for wave, ms in result["boss_kills"].items():
+            bosses[wave]["kill_times"].append(ms)
+
+    return {
+        "games": len(results),
+        "wave": describe([r["wave"] for r in results]),
+        "score": describe([r["score"] for r in results]),
+        "credits": describe([r["credits"] for r in results]),
+        "time_to_death_ms": describe([r["time_to_death"] for r in results if r["died"]]),
+        "survived_to_cap": sum(not r["died"] for r in results),
+        "boss_kill_ms": {
+            str(wave): {
+                "encounters": info["encounters"],
+                "kills": len(info["kill_times"]),
+                "time": describe(info["kill_times"]),
+            }
+            for wave, info in sorted(bosses.items())
+        },
+        "wave_peaks": {
+            str(wave): {name: {"p90": describe(values)["p90"], "max": describe(values)["max"]}
+                        for name, values in counts.items()}
+            for wave, counts in sorted(peaks.items())
+        },
+    }
+
+
+def simulate(games=100, ai="scripted", num_players=1, seed=0, processes=None,
+             max_ticks=DEFAULT_MAX_TICKS, waves_path=main.WAVES_PATH):
+    """Run independent seeded games on every core and return aggregate stats"""
+    jobs = [(seed + i, ai, num_players, max_ticks, waves_path) for i in range(games)]
+    with multiprocessing.Pool(processes, init_worker) as pool:
+        results = list(pool.imap_unordered(run_game, jobs, chunksize=max(1, games // 64)))
+    results.sort(key=lambda r: r["seed"])
+    return {"summary": aggregate(results), "runs": results}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--ai", choices=sorted(AIS), default="scripted")
+    parser.add_argument("--players", type=int, choices=(1, 2, 3), default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max-ticks", type=int, default=DEFAULT_MAX_TICKS)
+    parser.add_argument("--waves", default=main.WAVES_PATH, help="wave table (.json or .toml) to play")
+    parser.add_argument("--output", help="write per-game results and summary as JSON")
+    args = parser.parse_args()
+
+    stats = simulate(args.games, args.ai, args.players, args.seed, args.processes, args.max_ticks, args.waves)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(stats, f, indent=2)
+    print(json.dumps(stats["summary"], indent=2))
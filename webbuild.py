@@ -0,0 +1,170 @@
+"""Stage a lean pygbag tree with a pre-rendered sprite atlas and hold the web build to its budgets
+
+Run with: python webbuild.py stage | check | all [--budget web_budget.json] [--stage build/space_shooter_2d]
+
+`stage` copies only the files the game needs at run time into the stage
+directory and writes assets.atlas next to them; pygbag then builds from
+there (`pygbag --build build/space_shooter_2d`). `check` reports the APK
+and bundle size and a breakdown of `import main` by module, and exits
+non-zero when any of them is over budget. Import times are measured with
+the local interpreter, so they rank modules rather than predict the
+browser's numbers.
+
+Not budgeted: the numpy wheel, which pygbag fetches from its own CDN
+before `import main` can run. It is likely the largest part of first
+paint, but it is not in the APK or the bundle, so it is listed under
+"excluded" in the budget file and printed with every report.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import zipfile
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame  # noqa: E402
+
+import main  # noqa: E402
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RUNTIME_FILES = ["main.py", "waves.json"]
+DEFAULT_STAGE = os.path.join(ROOT, "build", "space_shooter_2d")
+DEFAULT_BUDGET = os.path.join(ROOT, "web_budget.json")
+ATLAS_NAME = os.path.basename(main.ATLAS_PATH)
+
+
+def load_budget(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def prerender(nebulas):
+    """Surfaces for the atlas: planet, unrotated ship art and the first `nebulas` nebula variants"""
+    surfaces = {
+        "planet": main.create_planet(),
+        "ship": main.ShipSpriteCache().render_base(),
+    }
+    cache = main.NebulaCache()
+    for seed in range(min(nebulas, main.NEBULA_VARIANTS)):
+        surface = pygame.Surface((main.WIDTH, main.HEIGHT))
+        for _ in main.nebula_steps(surface, random.Random(seed)):
+            pass
+        surfaces[cache.name(seed)] = surface
+    return surfaces
+
+
+def stage(stage_dir, budget):
+    if os.path.isdir(stage_dir):
+        shutil.rmtree(stage_dir)
+    os.makedirs(stage_dir)
+    for name in RUNTIME_FILES:
+        shutil.copy2(os.path.join(ROOT, name), stage_dir)
+    surfaces = prerender(budget.get("atlas_nebulas", 0))
+    blob = main.Atlas.encode(surfaces)
+    with open(os.path.join(stage_dir, ATLAS_NAME), "wb") as f:
+        f.write(blob)
+    print(f"staged {len(RUNTIME_FILES) + 1} files in {stage_dir}")
+    print(f"  {ATLAS_NAME}: {len(surfaces)} sprites, {len(blob)} bytes")
+
+
+def tree_size(path):
+    return sum(os.path.getsize(os.path.join(folder, name))
+               for folder, _, names in os.walk(path) for name in names)
+
+
+def apk_estimate(stage_dir):
+    """Deflated size of the staged files, for trees pygbag hasn't built yet"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as apk:
+        for folder, dirs, names in os.walk(stage_dir):
+            dirs[:] = [d for d in dirs if d != "build"]
+            for name in names:
+                path = os.path.join(folder, name)
+                apk.write(path, os.path.relpath(path, stage_dir))
+    return buffer.tell()
+
+
+def import_times(stage_dir):
+    """(total us, [(module, cumulative us)]) for `import main` in the staged tree"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"],
+                            cwd=stage_dir, capture_output=True, text=True, check=True)
+    total = 0
+    direct = []
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 1:
+            children.append((name, int(cumulative)))
+        elif depth == 0:
+            if name == "main":
+                total = int(cumulative)
+                direct = children
+            children = []
+    direct.sort(key=lambda entry: entry[1], reverse=True)
+    return total, direct
+
+
+def check(stage_dir, budget, top=10):
+    """Print the size and import report; return the list of exceeded budgets"""
+    over = []
+
+    def measure(label, value, limit, unit):
+        status = "ok" if limit is None or value <= limit else "OVER"
+        bound = "" if limit is None else f" / {limit} {unit}"
+        print(f"  {label:<22} {value:>10} {unit}{bound}  {status}")
+        if status == "OVER":
+            over.append(label)
+
+    web = os.path.join(stage_dir, "build", "web")
+    apk = os.path.join(web, os.path.basename(stage_dir) + ".apk")
+    print("bundle:")
+    if os.path.exists(apk):
+        measure("apk", os.path.getsize(apk), budget.get("apk_bytes"), "bytes")
+        measure("bundle", tree_size(web), budget.get("bundle_bytes"), "bytes")
+    else:
+        measure("apk (estimated)", apk_estimate(stage_dir), budget.get("apk_bytes"), "bytes")
+    atlas = os.path.join(stage_dir, ATLAS_NAME)
+    if os.path.exists(atlas):
+        measure("atlas", os.path.getsize(atlas), budget.get("atlas_bytes"), "bytes")
+
+    total, direct = import_times(stage_dir)
+    print("import main:")
+    measure("total", total // 1000, budget.get("import_ms"), "ms")
+    module_limit = budget.get("module_import_ms")
+    for name, cumulative in direct[:top]:
+        measure(name, cumulative // 1000, module_limit, "ms")
+    for name, cumulative in direct[top:]:
+        if module_limit is not None and cumulative // 1000 > module_limit:
+            measure(name, cumulative // 1000, module_limit, "ms")
+    for note in budget.get("excluded", []):
+        print(f"  not budgeted: {note}")
+    return over
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=("stage", "check", "all"))
+    parser.add_argument("--budget", default=DEFAULT_BUDGET, help="JSON file of size and import-time budgets")
+    parser.add_argument("--stage", default=DEFAULT_STAGE, help="directory pygbag builds from")
+    args = parser.parse_args()
+
+    budget = load_budget(args.budget)
+    if args.command in ("stage", "all"):
+        stage(args.stage, budget)
+    if args.command in ("check", "all"):
+        over = check(args.stage, budget)
+        if over:
+            print(f"over budget: {', '.join(over)}")
+            sys.exit(1)